@@ -0,0 +1,5 @@
+# Host-side collector for a fleet of devices: finds them, scrapes /get_data of every zone over
+# pooled keep-alive connections and appends the new readings to a compressed columnar store.
+#
+#   python -m fleet.run collect devices.txt --store fleet-data
+#   python -m fleet.standin --devices 200 --days 3     against local stand-in devices
@@ -0,0 +1,120 @@
+# HTTP/1.1 client for the devices: one kept-alive connection per device, reused across zones and rounds
+import asyncio
+import json
+
+IDLE_TIMEOUT = 10  # seconds, below the KEEP_ALIVE_TIMEOUT of the firmware so the device never closes first
+TIMEOUT = 10  # seconds for a whole request
+
+
+class StatusError(OSError):
+    """A whole response other than 200, not worth a retry"""
+
+
+class Connection:
+    def __init__(self, reader, writer, now):
+        self.reader = reader
+        self.writer = writer
+        self.used = now
+
+    def close(self):
+        self.writer.close()
+
+
+class Pool:
+    """Idle connections by (host, port). A device serves a few requests at once, so at most one each."""
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, timeout=TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.idle = {}
+        self.opened = 0
+        self.reused = 0
+        self.received = 0  # body bytes
+
+    def prune(self):
+        now = asyncio.get_running_loop().time()
+        for key, connection in list(self.idle.items()):
+            if now - connection.used > self.idle_timeout:
+                del self.idle[key]
+                connection.close()
+
+    def close(self):
+        for connection in self.idle.values():
+            connection.close()
+        self.idle.clear()
+
+    async def get(self, host, port, path):
+        """Body of a 200 response to GET path, raises OSError for anything else"""
+        return await asyncio.wait_for(self.__get(host, port, path), self.timeout)
+
+    async def __get(self, host, port, path):
+        loop = asyncio.get_running_loop()
+        connection = self.idle.pop((host, port), None)
+        if connection is not None and loop.time() - connection.used > self.idle_timeout:
+            connection.close()
+            connection = None
+        if connection is not None:
+            self.reused += 1
+            try:
+                return await self.__request(connection, host, port, path)
+            except StatusError:
+                raise
+            except (OSError, EOFError, asyncio.IncompleteReadError, ValueError):
+                # Closed by the device meanwhile (reboot, KEEP_ALIVE_MAX), retry on a new connection
+                connection.close()
+        reader, writer = await asyncio.open_connection(host, port)
+        self.opened += 1
+        connection = Connection(reader, writer, loop.time())
+        try:
+            return await self.__request(connection, host, port, path)
+        except (EOFError, asyncio.IncompleteReadError, ValueError) as e:
+            connection.close()
+            raise OSError("bad response from {}:{}: {}".format(host, port, e))
+        except BaseException:
+            connection.close()
+            raise
+
+    async def __request(self, connection, host, port, path):
+        connection.writer.write("GET {} HTTP/1.1\r\nHost: {}\r\n\r\n".format(path, host).encode())
+        await connection.writer.drain()
+        status, headers, body = await read_response(connection.reader)
+        self.received += len(body)
+        if status != 200:
+            connection.close()
+            raise StatusError("{}:{}{} answered {}".format(host, port, path, status))
+        if headers.get("connection") == "keep-alive":
+            connection.used = asyncio.get_running_loop().time()
+            self.idle[(host, port)] = connection
+        else:
+            connection.close()
+        return body
+
+    async def get_json(self, host, port, path):
+        return json.loads(await self.get(host, port, path))
+
+
+async def read_response(reader):
+    """Status, lower case headers and body of one response"""
+    line = await reader.readline()
+    if not line:
+        raise EOFError("connection closed")
+    status = int(line.split()[1])
+    headers = {}
+    while True:
+        line = (await reader.readline()).decode("latin-1").strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+    if headers.get("transfer-encoding") == "chunked":
+        body = bytearray()
+        while True:
+            size = int(await reader.readline(), 16)
+            chunk = await reader.readexactly(size + 2)
+            if size == 0:
+                break
+            body += chunk[:-2]
+        return status, headers, bytes(body)
+    if "content-length" in headers:
+        return status, headers, await reader.readexactly(int(headers["content-length"]))
+    return status, headers, await reader.read()
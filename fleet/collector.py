@@ -0,0 +1,190 @@
+# Scrapes /get_data of many devices at once into a Store
+import asyncio
+import ipaddress
+import json
+import re
+import time
+
+from fleet.client import Pool
+from fleet.packed import decode, is_packed
+from fleet.store import SCALE
+
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+CLOCK_SKEW = 600  # seconds a device clock may run ahead of the collector
+MAX_ZONES = 16
+
+
+class Device:
+    def __init__(self, host, port=80):
+        self.host = host
+        self.port = port
+        self.name = "{}_{}".format(re.sub(r"[^A-Za-z0-9.-]", "_", host), port)
+        self.zones = None  # found on the first scrape
+        self.failures = 0
+
+    def __repr__(self):
+        return "{}:{}".format(self.host, self.port)
+
+
+def parse_devices(lines, port=80):
+    """host or host:port per line, # comments"""
+    devices = []
+    for line in lines:
+        line = line.split("#")[0].strip()
+        if line:
+            host, _, number = line.rpartition(":") if ":" in line else (line, "", "")
+            devices.append(Device(host, int(number) if number else port))
+    return devices
+
+
+async def discover(network, port=80, concurrency=64, timeout=2):
+    """Devices of a subnet answering /metrics with the firmware counters"""
+    pool = Pool(timeout=timeout)
+    limit = asyncio.Semaphore(concurrency)
+
+    async def probe(host):
+        async with limit:
+            try:
+                body = await pool.get(host, port, "/metrics")
+            except (OSError, asyncio.TimeoutError, ValueError):
+                return None
+        return Device(host, port) if b"spw_readings" in body else None
+
+    found = await asyncio.gather(*[probe(str(host)) for host in ipaddress.ip_network(network, strict=False).hosts()])
+    pool.close()
+    return [device for device in found if device is not None]
+
+
+def to_epochs(timestamps, reference):
+    """The page timestamps are "Mon/10:00:00" in the device clock (UTC). Walking back from the newest,
+    each one is the latest moment at or before the next newer reading with that weekday and time."""
+    epochs = [0] * len(timestamps)
+    reference = int(reference) + CLOCK_SKEW
+    for i in range(len(timestamps) - 1, -1, -1):
+        day, _, clock = timestamps[i].partition("/")
+        hours, minutes, seconds = clock.split(":")
+        # 1970-01-01 was a Thursday
+        of_week = DAYS.index(day) * 86400 + int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+        reference_of_week = (reference + 3 * 86400) % (7 * 86400)
+        reference -= (reference_of_week - of_week) % (7 * 86400)
+        epochs[i] = reference
+    return epochs
+
+
+def to_rows(data, epochs, after_epoch):
+    """Store rows of a /get_data answer whose timestamps are epochs, without the readings already stored.
+    Only the packed answer flags the waterings, a JSON one stores them as 0."""
+    first_seq = data["seq"] - len(epochs) + 1
+    water = data.get("water")
+    rows = []
+    for i, epoch in enumerate(epochs):
+        if epoch > after_epoch:
+            rows.append((epoch, first_seq + i, round(data["soil_moisture"][i] * SCALE),
+                         round(data["air_humidity"][i] * SCALE), round(data["air_temperature"][i] * SCALE),
+                         1 if water and water[i] else 0))
+    return rows
+
+
+class Collector:
+    """Scrapes every device at most concurrency at a time, over pooled keep-alive connections.
+    The newest stored reading of each zone is both the cursor (?since=<its seq>) and the dedupe
+    watermark: after a reboot the device renumbers its readings and the whole history is fetched
+    again, only the readings newer than the watermark epoch are kept."""
+
+    def __init__(self, store, devices, concurrency=64, pool=None):
+        self.store = store
+        self.devices = devices
+        self.pool = pool or Pool()
+        self.limit = asyncio.Semaphore(concurrency)
+        self.rows = 0
+        self.failures = 0
+
+    async def fetch(self, device, path):
+        """A /get_data answer and the epochs of its readings. The packed history carries them, the JSON
+        of a firmware without ?format=bin only has weekday and time."""
+        body = await self.pool.get(device.host, device.port, path + "&format=bin")
+        if is_packed(body):
+            data = decode(body)
+            return data, data["epoch"]
+        data = json.loads(body)
+        return data, to_epochs(data["timestamps"], time.time())
+
+    async def scrape_zone(self, device, zone):
+        """Store the new readings of a zone, None when the device has no such zone"""
+        last = self.store.state(device.name)["last"].get(str(zone))
+        path = "/get_data?zone={}".format(zone)
+        # From the newest stored reading on, which tells whether the device still numbers readings the same way
+        data, epochs = await self.fetch(device, path + ("&since={}".format(last[0] - 1) if last else ""))
+        if data.get("zone", 0) != zone:
+            return None
+        if last and not data["full"] and (not epochs or epochs[0] != last[1]):
+            # Renumbered by a reboot since the last scrape, take the whole history
+            data, epochs = await self.fetch(device, path)
+        rows = to_rows(data, epochs, last[1] if last else 0)
+        if rows:
+            self.store.append(device.name, zone, rows)
+            self.rows += len(rows)
+        elif last and epochs and epochs[-1] == last[1] and data["seq"] != last[0]:
+            # Nothing new, but follow the numbering of the device
+            self.store.state(device.name)["last"][str(zone)] = [data["seq"], last[1]]
+            self.store.save_state(device.name)
+        return len(rows)
+
+    async def scrape(self, device):
+        """New readings of every zone of a device, None when it could not be reached"""
+        async with self.limit:
+            try:
+                if device.zones is None:
+                    device.zones = self.store.state(device.name)["zones"]
+                if device.zones is None:
+                    # Zones are numbered from 0, asking for one past the last answers zone 0
+                    zone = 0
+                    while zone < MAX_ZONES and await self.scrape_zone(device, zone) is not None:
+                        zone += 1
+                    device.zones = zone
+                    self.store.state(device.name)["zones"] = zone
+                    self.store.save_state(device.name)
+                else:
+                    for zone in range(device.zones):
+                        await self.scrape_zone(device, zone)
+                device.failures = 0
+                return True
+            except (OSError, asyncio.TimeoutError, ValueError, KeyError) as e:
+                device.failures += 1
+                self.failures += 1
+                print("{}: {!r}".format(device, e))
+                return None
+
+    async def round(self):
+        """Scrape all devices once, returns how many answered"""
+        self.pool.prune()
+        answers = await asyncio.gather(*[self.scrape(device) for device in self.devices])
+        return sum(1 for answer in answers if answer)
+
+    async def run(self, interval, rounds=None):
+        loop = asyncio.get_running_loop()
+        done = 0
+        while rounds is None or done < rounds:
+            start = loop.time()
+            answered = await self.round()
+            done += 1
+            print("round {}: {}/{} devices in {:.1f} s, {} rows stored".format(
+                done, answered, len(self.devices), loop.time() - start, self.rows))
+            if rounds is None or done < rounds:
+                await asyncio.sleep(max(0, interval - (loop.time() - start)))
+
+
+if __name__ == "__main__":
+    print("Test collector")
+    now = 1760000000  # Thu 2025-10-09 08:53:20 UTC
+    assert to_epochs(["Thu/08:53:20"], now) == [now]
+    epochs = [now - 1800 * i for i in range(400, -1, -1)]
+    stamps = ["{}/{}".format(DAYS[time.gmtime(epoch).tm_wday], time.strftime("%H:%M:%S", time.gmtime(epoch))) for epoch in epochs]
+    assert to_epochs(stamps, now) == epochs
+    # The device clock a little ahead of the collector
+    assert to_epochs(stamps, now - 300) == epochs
+    data = {"timestamps": stamps[-3:], "soil_moisture": [1.5, 2, 3], "air_humidity": [4, 5, 6],
+            "air_temperature": [-1, 0, 1.25], "seq": 90, "count": 50, "full": False}
+    assert to_rows(data, epochs[-3:], epochs[-2]) == [(epochs[-1], 90, 300, 600, 125, 0)]
+    assert [device.name for device in parse_devices(["10.0.0.7  # bench 1", "", "pico.lan:8080"])] == ["10.0.0.7_80", "pico.lan_8080"]
+    print("collector OK")
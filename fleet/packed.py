@@ -0,0 +1,85 @@
+# Decoder of the packed /get_data?format=bin history, the layout is described in src/binStream.py
+import struct
+import sys
+from array import array
+
+MAGIC = b"SPWB"
+VERSION = 1
+HEADER = "<4sBBBBIIHH7H"
+HEADER_SIZE = struct.calcsize(HEADER)
+FULL_FLAG = 0x01
+SERIES = ("soil_moisture", "air_humidity", "air_temperature")
+
+
+def is_packed(body):
+    return body[:4] == MAGIC
+
+
+def column(body, offset, typecode, n):
+    values = array(typecode)
+    values.frombytes(body[offset:offset + values.itemsize * n])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def decode(body):
+    """The /get_data JSON fields, with the epoch seconds of the device clock instead of the timestamps
+    and the water flag of every reading. Raises ValueError for a body it cannot read."""
+    if len(body) < HEADER_SIZE or not is_packed(body):
+        raise ValueError("not a packed history")
+    magic, version, flags, zone, label, seq, count, n, scale, *water_week = struct.unpack_from(HEADER, body)
+    if version != VERSION:
+        raise ValueError("packed history version {}".format(version))
+    offset = HEADER_SIZE + label
+    if len(body) != offset + n * 10 + (n + 7) // 8:
+        raise ValueError("packed history of {} bytes for {} readings".format(len(body), n))
+    data = {"zone": zone, "seq": seq, "count": count, "full": bool(flags & FULL_FLAG), "water_week": water_week,
+            "last_water": body[HEADER_SIZE:offset].decode("ascii")}
+    epochs = []
+    epoch = 0
+    for delta in column(body, offset, "I", n):
+        epoch = (epoch + delta) & 0xFFFFFFFF
+        epochs.append(epoch)
+    data["epoch"] = epochs
+    offset += 4 * n
+    for key in SERIES:
+        data[key] = [value / scale for value in column(body, offset, "h", n)]
+        offset += 2 * n
+    data["water"] = [body[offset + i // 8] >> (i % 8) & 1 == 1 for i in range(n)]
+    return data
+
+
+if __name__ == "__main__":
+    print("Test packed")
+    import os
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+    from binStream import packed_pieces
+    from historyBuffer import HistoryBuffer
+
+    class Reading:
+        def __init__(self, epoch, value, water=False):
+            self.epoch = epoch
+            self.soil_moisture = value
+            self.air_humidity = value / 3
+            self.air_temperature = value - 40
+            self.water = water
+
+    history = HistoryBuffer(40)
+    for i in range(57):
+        history.append(Reading(1760000000 + i * 600 - (86400 if i > 50 else 0), i * 0.37, i % 6 == 0))
+    for start in (0, 17, 40):
+        body = b"".join(piece.encode() if isinstance(piece, str) else bytes(piece)
+                        for piece in packed_pieces(history, [3] * 7, "Sat/06:00:00", start, 1))
+        data = decode(body)
+        assert data["epoch"] == [history.epoch(i) for i in range(start, 40)]
+        assert data["air_temperature"] == [history.air_temperature(i) for i in range(start, 40)]
+        assert data["water"] == [history.water(i) for i in range(start, 40)]
+        assert (data["seq"], data["count"], data["zone"], data["full"], data["last_water"]) == (57, 40, 1, start == 0, "Sat/06:00:00")
+    for bad in (b"", b'{"seq": 1}', body[:-1]):
+        try:
+            decode(bad)
+            assert False
+        except ValueError:
+            pass
+    print("packed OK")
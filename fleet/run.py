@@ -0,0 +1,52 @@
+# Collect the history of many devices into a columnar store
+#   python -m fleet.run scan 192.168.1.0/24 > devices.txt
+#   python -m fleet.run collect devices.txt --store fleet-data --interval 600
+#   python -m fleet.run show --store fleet-data
+import argparse
+import asyncio
+import sys
+
+from fleet.collector import Collector, discover, parse_devices
+from fleet.store import Store
+
+parser = argparse.ArgumentParser(description="Scrape SmartPlantWatering devices into a columnar store")
+commands = parser.add_subparsers(dest="command", required=True)
+scan = commands.add_parser("scan", help="list the devices of a subnet")
+scan.add_argument("network", help="e.g. 192.168.1.0/24")
+scan.add_argument("--port", type=int, default=80)
+scan.add_argument("--concurrency", type=int, default=64)
+collect = commands.add_parser("collect", help="scrape devices periodically")
+collect.add_argument("devices", help="file with host or host:port per line, - for stdin")
+collect.add_argument("--store", default="fleet-data")
+collect.add_argument("--interval", type=int, default=600, help="seconds between two rounds, well below the history duration")
+collect.add_argument("--rounds", type=int, default=None, help="stop after this many rounds")
+collect.add_argument("--concurrency", type=int, default=64, help="devices scraped at once")
+collect.add_argument("--port", type=int, default=80, help="port of the hosts given without one")
+show = commands.add_parser("show", help="summary of a store")
+show.add_argument("--store", default="fleet-data")
+
+
+def summary(store):
+    for device in store.devices():
+        state = store.state(device)
+        days = store.days(device)
+        rows = sum(len(store.read(device, zone)["epoch"]) for zone in range(state["zones"] or 1))
+        print("{:<24} {} zones {:>7} rows {:>3} days {:>9} B".format(device, state["zones"], rows, len(days),
+                                                                    store.size(device)))
+
+
+def main(args):
+    if args.command == "scan":
+        for device in asyncio.run(discover(args.network, args.port, args.concurrency)):
+            print(repr(device))
+    elif args.command == "collect":
+        with (sys.stdin if args.devices == "-" else open(args.devices)) as f:
+            devices = parse_devices(f, args.port)
+        collector = Collector(Store(args.store), devices, args.concurrency)
+        asyncio.run(collector.run(args.interval, args.rounds))
+    else:
+        summary(Store(args.store))
+
+
+if __name__ == "__main__":
+    main(parser.parse_args())
@@ -0,0 +1,154 @@
+# End to end run of the collector against stand-in devices: WebServer instances of the firmware on
+# the simulator, one port each, fed with synthetic readings on the virtual clock. Some of them
+# reboot halfway, so their readings are renumbered and sent again. Every reading must end up in
+# the store exactly once.
+#   python -m fleet.standin --devices 200 --days 3
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import sim
+
+parser = argparse.ArgumentParser(description="Scrape stand-in devices into a store and check it")
+parser.add_argument("--devices", type=int, default=50)
+parser.add_argument("--days", type=float, default=2)
+parser.add_argument("--interval", type=int, default=1800, help="reading_interval of the devices")
+parser.add_argument("--history", type=int, default=48, help="max_reading of the devices")
+parser.add_argument("--scrape", type=int, default=6 * 3600, help="seconds between two collector rounds")
+parser.add_argument("--concurrency", type=int, default=64)
+parser.add_argument("--port", type=int, default=18000, help="first port, one per device")
+parser.add_argument("--store", default=None, help="store directory, a temporary one by default")
+
+
+def reading(device, zone, epoch):
+    # Hundredths, like the history keeps them
+    step = epoch // 1800
+    return (4000 + (device * 7 + zone * 13 + step) % 3000, 5000 + (device + step) % 2000, 1800 + step % 700)
+
+
+class StandIn:
+    def __init__(self, index, zones, port, log_dir, history):
+        self.index = index
+        self.zones = zones
+        self.port = port
+        self.log_dir = log_dir
+        self.history = history
+        self.web_server = None
+
+    async def start(self):
+        from webServer import WebServer
+        from zone import Zone
+        zones = [Zone(z, "Pot {}".format(z + 1), "GP26", z, "GP{}".format(2 + z), self.history, self.log_dir)
+                 for z in range(self.zones)]
+        self.web_server = WebServer(zones)
+        self.web_server.max_reading = self.history
+        await self.web_server.start("127.0.0.1", self.port)
+
+    async def reboot(self):
+        self.web_server.flush_log()
+        self.web_server.server.close()
+        await self.web_server.server.wait_closed()
+        await self.start()
+
+
+async def session(world, args, store_dir):
+    from sensorManager import Data
+    from fleet.collector import Collector, Device
+    from fleet.store import Store
+    devices = []
+    for i in range(args.devices):
+        log_dir = os.path.join(world.log_dir, "device{}".format(i))
+        os.makedirs(log_dir)
+        devices.append(StandIn(i, 1 + i % 3, args.port + i, log_dir, args.history))
+        await devices[-1].start()
+    expected = {}
+    end = time.time() + args.days * 86400
+
+    async def feed():
+        rebooted = False
+        while time.time() < end:
+            epoch = time.time()
+            for device in devices:
+                for zone in device.web_server.zones:
+                    soil, humidity, temperature = reading(device.index, zone.index, epoch)
+                    water = (device.index + zone.index + int(epoch) // args.interval) % 6 == 0
+                    device.web_server.add_reading(zone, Data(soil / 100, humidity / 100, temperature / 100, water, epoch))
+                    expected.setdefault((device.index, zone.index), []).append((epoch, soil, humidity, temperature, water))
+            if not rebooted and time.time() >= end - args.days * 43200:
+                rebooted = True
+                for device in devices[3::7]:
+                    await device.reboot()
+            await asyncio.sleep(args.interval)
+
+    store = Store(store_dir)
+    collector = Collector(store, [Device("127.0.0.1", device.port) for device in devices], args.concurrency)
+    rounds = []
+    feeder = asyncio.ensure_future(feed())
+    await asyncio.sleep(1)
+    while not feeder.done():
+        start = time.perf_counter()
+        await collector.round()
+        rounds.append(time.perf_counter() - start)
+        await asyncio.sleep(args.scrape)
+    await collector.round()
+    for device in devices:
+        device.web_server.server.close()
+    collector.pool.close()
+    # Connections the devices still keep open
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return devices, expected, store, collector, rounds
+
+
+def check(devices, expected, store):
+    missing = duplicated = wrong = 0
+    for device in devices:
+        name = "127.0.0.1_{}".format(device.port)
+        assert store.state(name)["zones"] == device.zones, (name, store.state(name))
+        for zone in range(device.zones):
+            data = store.read(name, zone)
+            stored = list(zip(data["epoch"], [round(v * 100) for v in data["soil_moisture"]],
+                              [round(v * 100) for v in data["air_humidity"]], [round(v * 100) for v in data["air_temperature"]],
+                              data["water"]))
+            want = expected[(device.index, zone)]
+            duplicated += len(stored) - len(set(stored))
+            missing += len(set(want) - set(stored))
+            wrong += len(set(stored) - set(want))
+    return missing, duplicated, wrong
+
+
+def main(args):
+    world = sim.install(log_dir=tempfile.mkdtemp(prefix="spw-fleet-"))
+    world.clock.sync()
+    loop = sim.new_loop()
+    loop.set_exception_handler(lambda loop, context: None if isinstance(context.get("exception"), asyncio.CancelledError)
+                               else loop.default_exception_handler(context))
+    store_dir = args.store or os.path.join(world.log_dir, "store")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        devices, expected, store, collector, rounds = loop.run_until_complete(session(world, args, store_dir))
+    wall = time.perf_counter() - start
+    missing, duplicated, wrong = check(devices, expected, store)
+    readings = sum(len(epochs) for epochs in expected.values())
+    rounds.sort()
+    print("{} devices, {} zones, {} readings over {:.1f} days in {:.1f} s".format(
+        len(devices), len(expected), readings, args.days, wall))
+    print("Rounds: {}, median {:.2f} s, slowest {:.2f} s, failures {}".format(
+        len(rounds), rounds[len(rounds) // 2], rounds[-1], collector.failures))
+    print("Connections opened: {}, reused: {}".format(collector.pool.opened, collector.pool.reused))
+    print("Received {} B of history, store {} B on disk ({:.1f} B/reading)".format(
+        collector.pool.received, store.size(), store.size() / max(readings, 1)))
+    print("Stored {}, missing {}, duplicated {}, wrong {}".format(collector.rows, missing, duplicated, wrong))
+    loop.close()
+    assert missing == duplicated == wrong == 0
+    print("fleet OK")
+
+
+if __name__ == "__main__":
+    main(parser.parse_args())
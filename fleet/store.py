@@ -0,0 +1,209 @@
+# Columnar on-disk store of the collected readings, partitioned by device, day and zone.
+#
+#   <root>/<device>/<YYYY-MM-DD>/zone<N>.spwc    chunks of rows, appended by every scrape
+#   <root>/<device>/state.json                   zones and the newest stored reading of each
+#
+# A chunk holds each column on its own: delta encoded int32, bytes shuffled into planes so the
+# mostly zero high bytes sit together, then zlib. Sensor values are hundredths like in the
+# firmware HistoryBuffer, water is 1 for a reading the pump ran for. Scrapes append small chunks; once a day is over its chunks are merged
+# into one, which compresses far better.
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+MAGIC = b"SPWC"
+CHUNK = "<4sII"  # magic, rows, payload bytes
+CHUNK_SIZE = struct.calcsize(CHUNK)
+COLUMNS = ("epoch", "seq", "soil_moisture", "air_humidity", "air_temperature", "water")
+SERIES = COLUMNS[2:5]
+SCALE = 100  # HISTORY_SCALE of the firmware
+
+
+def day_of(epoch):
+    return time.strftime("%Y-%m-%d", time.gmtime(epoch))
+
+
+def encode_column(values):
+    deltas = array("i", [0] * len(values))
+    previous = 0
+    for i, value in enumerate(values):
+        deltas[i] = value - previous
+        previous = value
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    raw = deltas.tobytes()
+    shuffled = b"".join(raw[plane::4] for plane in range(4))
+    return zlib.compress(shuffled, 9)
+
+
+def decode_column(data, rows):
+    shuffled = zlib.decompress(data)
+    raw = bytearray(rows * 4)
+    for plane in range(4):
+        raw[plane::4] = shuffled[plane * rows:(plane + 1) * rows]
+    deltas = array("i")
+    deltas.frombytes(bytes(raw))
+    if sys.byteorder == "big":
+        deltas.byteswap()
+    values = []
+    previous = 0
+    for delta in deltas:
+        previous += delta
+        values.append(previous)
+    return values
+
+
+def encode_chunk(columns):
+    rows = len(columns["epoch"])
+    payload = b""
+    for name in COLUMNS:
+        data = encode_column(columns[name])
+        payload += struct.pack("<I", len(data)) + data
+    return struct.pack(CHUNK, MAGIC, rows, len(payload)) + payload
+
+
+def read_chunks(path):
+    """Columns of every whole chunk in a partition file, a torn last chunk is skipped"""
+    columns = {name: [] for name in COLUMNS}
+    chunks = 0
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return columns, 0
+    offset = 0
+    while offset + CHUNK_SIZE <= len(data):
+        magic, rows, size = struct.unpack_from(CHUNK, data, offset)
+        if magic != MAGIC or offset + CHUNK_SIZE + size > len(data):
+            break
+        position = offset + CHUNK_SIZE
+        for name in COLUMNS:
+            length = struct.unpack_from("<I", data, position)[0]
+            position += 4
+            columns[name].extend(decode_column(data[position:position + length], rows))
+            position += length
+        offset += CHUNK_SIZE + size
+        chunks += 1
+    return columns, chunks
+
+
+class Store:
+    def __init__(self, root):
+        self.root = root
+        self.states = {}
+        self.written = 0  # bytes appended since opened
+
+    def device_dir(self, device):
+        return os.path.join(self.root, device)
+
+    def partition(self, device, day, zone):
+        return os.path.join(self.root, device, day, "zone{}.spwc".format(zone))
+
+    def state(self, device):
+        """{"zones": count or None, "last": {zone: [seq, epoch]}} of the newest stored readings"""
+        if device not in self.states:
+            try:
+                with open(os.path.join(self.device_dir(device), "state.json")) as f:
+                    self.states[device] = json.load(f)
+            except (OSError, ValueError):
+                self.states[device] = {"zones": None, "last": {}}
+        return self.states[device]
+
+    def save_state(self, device):
+        directory = self.device_dir(device)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "state.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.states[device], f)
+        os.replace(path + ".tmp", path)
+
+    def append(self, device, zone, rows):
+        """rows: (epoch, seq, soil_moisture, air_humidity, air_temperature, water) with values already in
+        hundredths and water 0 or 1, oldest first and newer than what is stored. One chunk per day they cover."""
+        state = self.state(device)
+        last = state["last"].get(str(zone))
+        days = {}
+        for row in rows:
+            days.setdefault(day_of(row[0]), []).append(row)
+        for day in sorted(days):
+            if last is not None and day > day_of(last[1]):
+                # The previous day is complete now
+                self.compact(device, day_of(last[1]), zone)
+            columns = {name: [row[i] for row in days[day]] for i, name in enumerate(COLUMNS)}
+            path = self.partition(device, day, zone)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            chunk = encode_chunk(columns)
+            with open(path, "ab") as f:
+                f.write(chunk)
+            self.written += len(chunk)
+            last = [days[day][-1][1], days[day][-1][0]]
+        if rows:
+            state["last"][str(zone)] = last
+            self.save_state(device)
+
+    def compact(self, device, day, zone):
+        """Merge the chunks of a partition into one"""
+        path = self.partition(device, day, zone)
+        columns, chunks = read_chunks(path)
+        if chunks <= 1:
+            return
+        with open(path + ".tmp", "wb") as f:
+            f.write(encode_chunk(columns))
+        os.replace(path + ".tmp", path)
+
+    def devices(self):
+        try:
+            return sorted(name for name in os.listdir(self.root) if os.path.isdir(self.device_dir(name)))
+        except FileNotFoundError:
+            return []
+
+    def days(self, device):
+        return sorted(name for name in os.listdir(self.device_dir(device)) if name[:1].isdigit())
+
+    def read(self, device, zone, first_day="", last_day="9999"):
+        """Columns of a zone over a range of days, values back in sensor units and water as booleans"""
+        result = {name: [] for name in COLUMNS}
+        for day in self.days(device):
+            if first_day <= day <= last_day:
+                columns, _ = read_chunks(self.partition(device, day, zone))
+                for name in COLUMNS:
+                    result[name].extend(columns[name])
+        for name in SERIES:
+            result[name] = [value / SCALE for value in result[name]]
+        result["water"] = [value == 1 for value in result["water"]]
+        return result
+
+    def size(self, device=None):
+        """Bytes on disk of a device, or of the whole store"""
+        total = 0
+        for directory, _, files in os.walk(self.device_dir(device) if device else self.root):
+            total += sum(os.path.getsize(os.path.join(directory, name)) for name in files if name.endswith(".spwc"))
+        return total
+
+
+if __name__ == "__main__":
+    print("Test Store")
+    import random
+    import tempfile
+    for values in ([], [0], [1760000000 + 1800 * i for i in range(100)], [random.randint(-5000, 5000) for _ in range(77)]):
+        assert decode_column(encode_column(values), len(values)) == values
+    store = Store(tempfile.mkdtemp(prefix="spw-store-"))
+    epoch = 1760000000 - 1760000000 % 86400 + 80000
+    rows = [(epoch + 600 * i, i + 1, 5000 - i, 6000 + i % 7, 2100 + i % 3, 1 if i % 11 == 0 else 0) for i in range(300)]
+    for start in range(0, 300, 7):
+        store.append("pico", 1, rows[start:start + 7])
+    data = store.read("pico", 1)
+    assert data["epoch"] == [row[0] for row in rows] and data["soil_moisture"][-1] == 47.01
+    assert data["water"] == [row[5] == 1 for row in rows]
+    assert store.state("pico")["last"]["1"] == [300, rows[-1][0]]
+    days = store.days("pico")
+    # Closed days are one chunk, the current one still takes appends
+    assert [read_chunks(store.partition("pico", day, 1))[1] for day in days[:-1]] == [1] * (len(days) - 1)
+    second = store.read("pico", 1, days[1], days[1])["epoch"]
+    assert day_of(second[0]) == day_of(second[-1]) == days[1] and second[0] % 86400 < 600
+    print(len(rows), "rows in", store.size(), "bytes, raw", len(rows) * 4 * len(COLUMNS))
+    print("Store OK")
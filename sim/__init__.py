@@ -0,0 +1,138 @@
+# Host-side simulator: stand-ins for the MicroPython hardware modules, a plant model and a
+# virtual clock, so Main runs on Linux and weeks of operation replay in seconds.
+#
+#   import sim
+#   world = sim.install()          # before any firmware module is imported
+#   from main import Main
+import gc
+import os
+import sys
+import tempfile
+
+from sim.clock import VirtualClock, VirtualLoop
+from sim.plant import Plant
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = os.path.join(ROOT, "sim", "modules")
+SRC = os.path.join(ROOT, "src")
+
+world = None
+
+
+class Reset(BaseException):
+    """Raised by machine.reset(), not an Exception so the firmware handlers cannot swallow it"""
+
+
+# Everything the stand-in modules share: clock, plants, pins and what happened on the buses
+class World:
+    def __init__(self, clock, plants, log_dir, port, wifi_delay, ntp_failures, wifi_outage=0):
+        self.clock = clock
+        self.plants = plants  # one per zone, all in the same room
+        self.plant = plants[0]  # the room the DHT11 measures
+        self.log_dir = log_dir
+        self.port = port
+        self.wifi_delay = wifi_delay  # seconds between WLAN.connect() and the association
+        self.wifi_outage = wifi_outage  # seconds after the start during which the access point is down
+        self.ntp_failures = ntp_failures  # ntptime.settime() calls that fail before one succeeds
+        self.relay_pins = {}  # relay pin id: zone
+        self.soil_channels = {}  # (ADC pin id, multiplexer channel): zone
+        self.mux_pins = []
+        self.mux_channel = 0
+        self.pump_started = {}  # zone: epoch
+        self.relay_pulses = []  # (epoch, seconds, zone) of every watering
+        self.pumps_peak = 0  # most pumps running at once
+        self.i2c_bytes = 0
+        self.i2c_writes = 0
+        self.i2c_byte_time = 0.0  # virtual seconds the bus takes per byte, 0 for an instant bus
+        self.adc_reads = 0
+        self.dht_reads = 0
+        self.dht_failures = 0
+        self.resets = 0
+        self.soil_range = [100.0, 0.0]
+
+    def now(self):
+        """Physical time: the real epoch, whatever the device RTC says"""
+        return self.clock.real_epoch + self.clock.monotonic
+
+    def wire(self, zones, mux_pins):
+        """Connect the sensors and relays of the firmware ZONES to the plants"""
+        self.relay_pins = {zone[3]: i for i, zone in enumerate(zones)}
+        self.soil_channels = {(zone[1], zone[2]): i for i, zone in enumerate(zones)}
+        self.mux_pins = list(mux_pins)
+
+    def pin_written(self, pin):
+        if pin.id in self.mux_pins:
+            bit = 1 << self.mux_pins.index(pin.id)
+            self.mux_channel = self.mux_channel | bit if pin.value() else self.mux_channel & ~bit
+            return
+        zone = self.relay_pins.get(pin.id)
+        if zone is None:
+            return
+        # The relay module is active low
+        on = pin.value() == 0
+        epoch = self.now()
+        self.plants[zone].set_pump(epoch, on)
+        if on and zone not in self.pump_started:
+            self.pump_started[zone] = epoch
+            self.pumps_peak = max(self.pumps_peak, len(self.pump_started))
+        elif not on and zone in self.pump_started:
+            started = self.pump_started.pop(zone)
+            self.relay_pulses.append((started, epoch - started, zone))
+
+    def soil_adc(self, pin, dry, wet):
+        self.adc_reads += 1
+        zone = self.soil_channels.get((pin, None))
+        if zone is None:
+            zone = self.soil_channels.get((pin, self.mux_channel), 0)
+        plant = self.plants[zone]
+        value = plant.soil_adc(self.now(), dry, wet)
+        self.soil_range[0] = min(self.soil_range[0], plant.soil_moisture)
+        self.soil_range[1] = max(self.soil_range[1], plant.soil_moisture)
+        return value
+
+    def reboot(self):
+        self.resets += 1
+        self.clock.reboot()
+
+
+def install(real_epoch=1760000000, plant=None, log_dir=None, port=8080, wifi_delay=3, ntp_failures=0,
+            zones=1, pumps=None, wifi_outage=0):
+    """Patch time, put the stand-in modules and src on sys.path and point the firmware at
+    log_dir and port. With several zones the pots sit behind a soil multiplexer, each drying
+    at its own pace. Must run before any firmware module is imported."""
+    global world
+    clock = VirtualClock(real_epoch)
+    clock.patch_time_module()
+    if not hasattr(gc, "mem_free"):
+        # The heap of a Pico, with nothing allocated from it
+        gc.mem_alloc = lambda: 0
+        gc.mem_free = lambda: 192 * 1024
+    if log_dir is None:
+        log_dir = tempfile.mkdtemp(prefix="spw-sim-")
+    plants = [plant or Plant()] + [Plant(drying_per_hour=0.4 + 0.1 * i, seed=1 + i) for i in range(1, zones)]
+    world = World(clock, plants, log_dir, port, wifi_delay, ntp_failures, wifi_outage)
+    for path in (SRC, MODULES):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    import constant
+    constant.WEB_PORT = port
+    constant.LOG_DIR = log_dir
+    constant.ROLLUP_FILE = log_dir + "/rollup.bin"
+    constant.STATIC_DIR = SRC + "/static"
+    # A CPython gc.collect() over the whole interpreter costs milliseconds of real time, sample less often
+    constant.METRICS_INTERVAL = 60000
+    constant.METRICS_GC_INTERVAL = 600000
+    if zones > 1:
+        constant.SOIL_MUX_PINS = ("GP10", "GP11", "GP12", "GP13")
+        constant.ZONES = tuple(("Pot {}".format(i + 1), "GP26", i, "GP{}".format(2 + i)) for i in range(zones))
+    if pumps is not None:
+        constant.MAX_PUMPS = pumps
+    world.wire(constant.ZONES, constant.SOIL_MUX_PINS)
+    return world
+
+
+def new_loop():
+    import asyncio
+    loop = VirtualLoop(world.clock)
+    asyncio.set_event_loop(loop)
+    return loop
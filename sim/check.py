@@ -0,0 +1,176 @@
+# Host checks of the firmware on the simulator, for what a run on the device cannot assert
+#   python -m sim.check               all of them
+#   python -m sim.check display_bytes one of them
+import argparse
+import contextlib
+import io
+import tempfile
+
+import sim
+
+CHECKS = {}
+
+
+def check(function):
+    CHECKS[function.__name__] = function
+    return function
+
+
+@check
+def display_bytes(world, loop):
+    """Changing one field sends the dirty window of its row over I2C, not the 1 KB frame"""
+    from displayManager import DisplayManager
+    from sensorManager import Data
+    display = DisplayManager()
+    epoch = world.now()
+    display.show_data(Data(42.5, 55, 21, epoch=epoch), "Mon/10:00:00", [1] * 7)
+    before = world.i2c_bytes
+    display.show_data(Data(43.75, 55, 21, epoch=epoch), "Mon/10:00:00", [1] * 7)
+    sent = world.i2c_bytes - before
+    # Six window commands of two bytes, then the data of one page as wide as the row text,
+    # each transfer with its address byte
+    window = 8 * len("Solid:43.75%")
+    assert sent == 6 * 3 + 1 + 1 + window, sent
+    full = display.display.width * display.display.height // 8
+    print("one field: {} B over I2C, the full frame is {} B".format(sent, full))
+
+
+@check
+def display_coalescing(world, loop):
+    """Posting costs the same whatever the bus speed, the posts during a frame become one flush"""
+    from time import ticks_us, ticks_diff
+    import uasyncio as asyncio
+    from constant import DISPLAY_FRAME_INTERVAL
+    from displayManager import DisplayManager
+    from sensorManager import Data
+
+    async def run(byte_time):
+        world.i2c_byte_time = byte_time
+        display = DisplayManager()
+        shows = [0]
+        show = display.display.show
+
+        def counted():
+            shows[0] += 1
+            show()
+        display.display.show = counted
+        task = asyncio.ensure_future(display.run())
+        worst = 0
+        start = world.clock.monotonic
+        posts = 400
+        for i in range(posts):
+            data = Data(i % 100, 50, 20)
+            before = ticks_us()
+            display.post_data(data, "", [i % 3] * 7)
+            worst = max(worst, ticks_diff(ticks_us(), before))
+            await asyncio.sleep_ms(5)
+        await asyncio.sleep_ms(2 * DISPLAY_FRAME_INTERVAL)
+        task.cancel()
+        elapsed = (world.clock.monotonic - start) * 1000
+        # The last post is on the screen
+        assert display.display.buffer == drawn(data, i), byte_time
+        return worst, shows[0], elapsed
+
+    def drawn(data, i):
+        reference = DisplayManager()
+        reference.show_data(data, "", [i % 3] * 7)
+        return reference.display.buffer
+
+    try:
+        for byte_time in (0, 0.000025, 0.001):
+            worst, shows, elapsed = loop.run_until_complete(run(byte_time))
+            assert worst == 0, (byte_time, worst)
+            assert shows <= elapsed / DISPLAY_FRAME_INTERVAL + 1, (byte_time, shows, elapsed)
+            print("{:.0f} us per byte: 400 posts drawn in {} flushes over {:.0f} ms, worst post {} us".format(
+                byte_time * 1e6, shows, elapsed, worst))
+    finally:
+        world.i2c_byte_time = 0
+
+
+@check
+def soil_sampling(world, loop):
+    """A noisy, spiky ADC trace: the trimmed bursts vary less than single reads, the spikes are dropped
+    and no await holds the loop longer than one DHT read"""
+    import random
+    from time import ticks_us, ticks_diff
+    import uasyncio as asyncio
+    from constant import SOIL_SAMPLES, SOIL_TRIM, SOIL_SENSOR_DRY, SOIL_SENSOR_WET
+    from sensorManager import SensorManager
+
+    rng = random.Random(11)
+    level = SOIL_SENSOR_DRY + (SOIL_SENSOR_WET - SOIL_SENSOR_DRY) // 2  # 50 %
+    noise = 400
+
+    def burst():
+        # Up to SOIL_TRIM spikes of 8 sigma among the samples of one reading
+        samples = [level + rng.gauss(0, noise) for _ in range(SOIL_SAMPLES)]
+        for i in rng.sample(range(SOIL_SAMPLES), rng.randint(0, SOIL_TRIM)):
+            samples[i] += rng.choice((-1, 1)) * 8 * noise
+        return [min(65535, max(0, int(value))) for value in samples]
+
+    def trace():
+        while True:
+            yield from burst()
+    samples = trace()
+    soil_adc = world.soil_adc
+    world.soil_adc = lambda pin, dry, wet: next(samples)
+
+    def variance(values):
+        mean = sum(values) / len(values)
+        return sum((value - mean) ** 2 for value in values) / len(values)
+
+    async def run():
+        sensor = SensorManager()
+        gaps = [0]
+        done = [False]
+
+        async def ticker():
+            last = ticks_us()
+            while not done[0]:
+                await asyncio.sleep_ms(1)
+                now = ticks_us()
+                gaps[0] = max(gaps[0], ticks_diff(now, last))
+                last = now
+        task = asyncio.ensure_future(ticker())
+        single = []
+        trimmed = []
+        for _ in range(200):
+            single.append(sensor._map(sensor.soil_sensor.read_u16(), SOIL_SENSOR_DRY, SOIL_SENSOR_WET, 0, 100))
+            trimmed.append((await sensor.acquire())[0].soil_moisture)
+        done[0] = True
+        await task
+        return single, trimmed, gaps[0]
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            single, trimmed, gap = loop.run_until_complete(run())
+    finally:
+        world.soil_adc = soil_adc
+    assert variance(trimmed) * 10 < variance(single), (variance(trimmed), variance(single))
+    # A spike is 11 % off, what gets through the trim is the noise only
+    assert max(abs(value - 50) for value in trimmed) <= 2, sorted(trimmed)
+    assert max(abs(value - 50) for value in single) >= 8
+    # The soil burst yields between samples, the only blocking part is the 25 ms DHT read (plus the tick)
+    assert gap <= 26000, gap
+    print("variance {:.2f} single, {:.2f} trimmed, longest time between yields {} us".format(
+        variance(single), variance(trimmed), gap))
+
+
+def main(names):
+    world = sim.install(log_dir=tempfile.mkdtemp(prefix="spw-check-"))
+    world.clock.sync()
+    for name in names or CHECKS:
+        loop = sim.new_loop()
+        CHECKS[name](world, loop)
+        loop.close()
+        print(name, "OK")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host checks of the firmware on the simulator")
+    parser.add_argument("names", nargs="*", help="checks to run, all by default: " + ", ".join(CHECKS))
+    args = parser.parse_args()
+    for name in args.names:
+        if name not in CHECKS:
+            parser.error("unknown check " + name)
+    main(args.names)
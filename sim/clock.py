@@ -0,0 +1,101 @@
+# Virtual clock and an asyncio event loop that jumps over idle time
+import asyncio
+import selectors
+import time
+
+PICO_EPOCH = 1609459200  # 2021-01-01 00:00:00 UTC, the RTC value of a Pico before NTP
+
+
+class VirtualClock:
+    def __init__(self, real_epoch, boot_epoch=PICO_EPOCH):
+        self.real_epoch = real_epoch  # what NTP answers at monotonic 0
+        self.monotonic = 0.0  # seconds since boot
+        self.offset = boot_epoch  # epoch = offset + monotonic
+
+    def advance(self, seconds):
+        if seconds > 0:
+            self.monotonic += seconds
+
+    def epoch(self):
+        return self.offset + self.monotonic
+
+    def sync(self):
+        """NTP: the RTC jumps to the real time"""
+        self.offset = self.real_epoch
+
+    def reboot(self):
+        """A reset brings the RTC back to its power-on value"""
+        self.offset = PICO_EPOCH - self.monotonic
+
+    # MicroPython flavoured time functions
+    def time(self):
+        return int(self.epoch())
+
+    def localtime(self, secs=None):
+        return tuple(time.gmtime(self.time() if secs is None else secs))[:8]
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def sleep_ms(self, ms):
+        self.advance(ms / 1000)
+
+    def ticks_ms(self):
+        return int(self.monotonic * 1000)
+
+    def ticks_us(self):
+        return int(self.monotonic * 1000000)
+
+    def ticks_add(self, ticks, delta):
+        return ticks + delta
+
+    def ticks_diff(self, a, b):
+        return a - b
+
+    def patch_time_module(self):
+        # The firmware modules do "from time import ...", so this must run before they are imported
+        for name in ("time", "localtime", "sleep", "sleep_ms", "ticks_ms", "ticks_us", "ticks_add", "ticks_diff"):
+            setattr(time, name, getattr(self, name))
+
+
+class VirtualSelector(selectors.BaseSelector):
+    """Polls the real selector without blocking and, when nothing is ready, advances the
+    virtual clock to the next timer instead of waiting for it"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.selector = selectors.DefaultSelector()
+
+    def register(self, fileobj, events, data=None):
+        return self.selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self.selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self.selector.modify(fileobj, events, data)
+
+    def select(self, timeout=None):
+        ready = self.selector.select(0)
+        if ready or timeout == 0:
+            return ready
+        if timeout is None:
+            # No timers at all: only real I/O can wake the loop
+            return self.selector.select(None)
+        self.clock.advance(timeout)
+        return []
+
+    def close(self):
+        self.selector.close()
+
+    def get_map(self):
+        return self.selector.get_map()
+
+
+class VirtualLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock):
+        super().__init__(VirtualSelector(clock))
+        self.clock = clock
+
+    def time(self):
+        return self.clock.monotonic
@@ -0,0 +1,28 @@
+# Stand-in for the dht module, values come from the plant model
+import sim
+
+
+class DHT11:
+    def __init__(self, pin):
+        self.pin = pin
+        self.values = (0, 0)
+
+    def measure(self):
+        world = sim.world
+        world.dht_reads += 1
+        world.clock.advance(0.025)  # the bit-banged read blocks for about 25 ms
+        if world.plant.dht_fails():
+            world.dht_failures += 1
+            raise OSError(110, "ETIMEDOUT")
+        epoch = world.now()
+        self.values = (int(round(world.plant.air_humidity(epoch))), int(round(world.plant.air_temperature(epoch))))
+
+    def humidity(self):
+        return self.values[0]
+
+    def temperature(self):
+        return self.values[1]
+
+
+class DHT22(DHT11):
+    pass
@@ -0,0 +1,97 @@
+# Stand-in for framebuf: an in-memory MONO_VLSB framebuffer in pure Python.
+# Text uses placeholder glyphs derived from the character code, enough to see what changed.
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+RGB565 = 1
+GS2_HMSB = 5
+GS4_HMSB = 2
+GS8 = 6
+
+
+class FrameBuffer:
+    def __init__(self, buffer, width, height, format, stride=None):
+        self.buf = buffer
+        self.fb_width = width
+        self.fb_height = height
+
+    def __set(self, x, y, c):
+        if 0 <= x < self.fb_width and 0 <= y < self.fb_height:
+            index = (y >> 3) * self.fb_width + x
+            if c:
+                self.buf[index] |= 1 << (y & 7)
+            else:
+                self.buf[index] &= ~(1 << (y & 7)) & 0xFF
+
+    def fill(self, c):
+        value = 0xFF if c else 0
+        for i in range(len(self.buf)):
+            self.buf[i] = value
+
+    def pixel(self, x, y, c=None):
+        if c is None:
+            if 0 <= x < self.fb_width and 0 <= y < self.fb_height:
+                return (self.buf[(y >> 3) * self.fb_width + x] >> (y & 7)) & 1
+            return 0
+        self.__set(x, y, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        for yy in range(max(y, 0), min(y + h, self.fb_height)):
+            for xx in range(max(x, 0), min(x + w, self.fb_width)):
+                self.__set(xx, yy, c)
+
+    def rect(self, x, y, w, h, c, fill=False):
+        if fill:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        steps = max(abs(x2 - x1), abs(y2 - y1), 1)
+        for i in range(steps + 1):
+            self.__set(x1 + (x2 - x1) * i // steps, y1 + (y2 - y1) * i // steps, c)
+
+    def ellipse(self, x, y, xr, yr, c, fill=False, m=0xF):
+        for yy in range(-yr, yr + 1):
+            for xx in range(-xr, xr + 1):
+                if xx * xx * yr * yr + yy * yy * xr * xr <= xr * xr * yr * yr:
+                    self.__set(x + xx, y + yy, c)
+
+    def poly(self, x, y, coords, c, fill=False):
+        points = list(zip(coords[::2], coords[1::2]))
+        for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]):
+            self.line(x + x1, y + y1, x + x2, y + y2, c)
+
+    def text(self, s, x, y, c=1):
+        for n, char in enumerate(s):
+            code = ord(char)
+            for column in range(8):
+                bits = 0 if char == " " or column == 7 else (code * (column + 3) * 37) & 0x7F
+                for row in range(8):
+                    if bits >> row & 1:
+                        self.__set(x + n * 8 + column, y + row, c)
+
+    def scroll(self, xstep, ystep):
+        pixels = [[self.pixel(x, y) for x in range(self.fb_width)] for y in range(self.fb_height)]
+        for y in range(self.fb_height):
+            for x in range(self.fb_width):
+                sx = x - xstep
+                sy = y - ystep
+                if 0 <= sx < self.fb_width and 0 <= sy < self.fb_height:
+                    self.__set(x, y, pixels[sy][sx])
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for yy in range(fbuf.fb_height):
+            for xx in range(fbuf.fb_width):
+                c = fbuf.pixel(xx, yy)
+                if c != key:
+                    self.__set(x + xx, y + yy, c)
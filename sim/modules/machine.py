@@ -0,0 +1,112 @@
+# Stand-in for the machine module: pins feed the world, the ADC reads the plant model
+import sim
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self.level = 0
+        if value is not None:
+            self.value(value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        self.mode = mode
+        if value is not None:
+            self.value(value)
+
+    def value(self, value=None):
+        if value is None:
+            return self.level
+        self.level = 1 if value else 0
+        sim.world.pin_written(self)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def toggle(self):
+        self.value(not self.level)
+
+
+class ADC:
+    def __init__(self, pin):
+        self.pin = pin
+
+    def read_u16(self):
+        import constant
+        # The plant of the zone wired to this pin, or to the selected multiplexer channel
+        return sim.world.soil_adc(self.pin.id, constant.SOIL_SENSOR_DRY, constant.SOIL_SENSOR_WET)
+
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):
+        self.devices = [0x3C]
+
+    def scan(self):
+        return list(self.devices)
+
+    def __transfer(self, size):
+        world = sim.world
+        world.i2c_bytes += size
+        world.i2c_writes += 1
+        world.clock.advance(size * world.i2c_byte_time)
+
+    def writeto(self, addr, buf, stop=True):
+        self.__transfer(len(buf) + 1)
+        return len(buf)
+
+    def writevto(self, addr, vector, stop=True):
+        self.__transfer(sum(len(buf) for buf in vector) + 1)
+        return 1
+
+
+class SPI:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def write(self, buf):
+        sim.world.i2c_bytes += len(buf)
+
+
+def reset():
+    raise sim.Reset()
+
+
+def soft_reset():
+    raise sim.Reset()
+
+
+def reset_cause():
+    return PWRON_RESET if sim.world.resets == 0 else SOFT_RESET
+
+
+def unique_id():
+    return b"\x53\x49\x4d\x00\x00\x00\x00\x01"
+
+
+def freq(hz=None):
+    return 150000000
+
+
+def idle():
+    pass
+
+
+PWRON_RESET = 1
+WDT_RESET = 3
+SOFT_RESET = 5
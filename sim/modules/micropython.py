@@ -0,0 +1,7 @@
+# Stand-in for the MicroPython micropython module
+def const(value):
+    return value
+
+
+def mem_info(*args):
+    pass
@@ -0,0 +1,39 @@
+# Stand-in for the network module: the station associates wifi_delay seconds after connect(), or
+# after the access point is back from its outage
+import sim
+
+STA_IF = 0
+AP_IF = 1
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_GOT_IP = 3
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self.is_active = False
+        self.connected_at = None
+
+    def active(self, is_active=None):
+        if is_active is None:
+            return self.is_active
+        self.is_active = bool(is_active)
+
+    def connect(self, ssid=None, key=None, **kwargs):
+        if sim.world.wifi_delay is not None:
+            self.connected_at = max(sim.world.clock.monotonic, sim.world.wifi_outage) + sim.world.wifi_delay
+
+    def disconnect(self):
+        self.connected_at = None
+
+    def isconnected(self):
+        return self.is_active and self.connected_at is not None and sim.world.clock.monotonic >= self.connected_at
+
+    def status(self, *args):
+        if self.isconnected():
+            return STAT_GOT_IP
+        return STAT_CONNECTING if self.connected_at is not None else STAT_IDLE
+
+    def ifconfig(self, *args):
+        return ("127.0.0.1", "255.0.0.0", "127.0.0.1", "127.0.0.1")
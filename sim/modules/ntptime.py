@@ -0,0 +1,19 @@
+# Stand-in for ntptime: sets the virtual RTC to the real time
+import sim
+
+host = "pool.ntp.org"
+timeout = 1
+
+
+def time():
+    world = sim.world
+    if world.ntp_failures > 0:
+        world.ntp_failures -= 1
+        world.clock.advance(timeout)
+        raise OSError(110, "ETIMEDOUT")
+    return int(world.clock.real_epoch + world.clock.monotonic)
+
+
+def settime():
+    time()
+    sim.world.clock.sync()
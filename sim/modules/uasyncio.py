@@ -0,0 +1,6 @@
+# Stand-in for MicroPython uasyncio on top of CPython asyncio
+from asyncio import *
+
+
+async def sleep_ms(ms):
+    await sleep(ms / 1000)
@@ -0,0 +1,3 @@
+# Credentials of the simulated network
+SSID = "simulator"
+PASSWORD = "simulator"
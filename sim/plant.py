@@ -0,0 +1,64 @@
+# Scripted plant and room model driving the simulated sensors
+import math
+import random
+
+DAY = 86400
+
+
+class Plant:
+    def __init__(self, soil_moisture=60.0, drying_per_hour=0.6, water_per_second=2.5,
+                 temperature=(17.0, 27.0), humidity=(40.0, 70.0), adc_noise=400, adc_spike=0.03,
+                 dht_failure_rate=0.02, seed=1):
+        self.soil_moisture = soil_moisture  # %
+        self.drying_per_hour = drying_per_hour  # % lost per hour at the mean temperature
+        self.water_per_second = water_per_second  # % gained per second of pumping
+        self.temperature = temperature  # daily min/max, coldest at 05:00
+        self.humidity = humidity  # daily min/max, lowest when it is warmest
+        self.adc_noise = adc_noise  # standard deviation in ADC counts
+        self.adc_spike = adc_spike  # probability of a spike sample
+        self.dht_failure_rate = dht_failure_rate
+        self.random = random.Random(seed)
+        self.pumping = False
+        self.pumped_seconds = 0.0
+        self.updated = None
+
+    def day_phase(self, epoch):
+        # 0 at 05:00, 1 at 17:00
+        return (1 - math.cos(2 * math.pi * ((epoch - 5 * 3600) % DAY) / DAY)) / 2
+
+    def air_temperature(self, epoch):
+        low, high = self.temperature
+        return low + (high - low) * self.day_phase(epoch)
+
+    def air_humidity(self, epoch):
+        low, high = self.humidity
+        return high - (high - low) * self.day_phase(epoch)
+
+    def update(self, epoch):
+        """Integrate drying and watering up to epoch"""
+        if self.updated is None or epoch < self.updated:
+            self.updated = epoch
+            return
+        elapsed = epoch - self.updated
+        self.updated = epoch
+        low, high = self.temperature
+        heat = self.air_temperature(epoch) / ((low + high) / 2)
+        self.soil_moisture -= self.drying_per_hour * heat * elapsed / 3600
+        if self.pumping:
+            self.soil_moisture += self.water_per_second * elapsed
+            self.pumped_seconds += elapsed
+        self.soil_moisture = min(100.0, max(0.0, self.soil_moisture))
+
+    def set_pump(self, epoch, on):
+        self.update(epoch)
+        self.pumping = on
+
+    def soil_adc(self, epoch, dry, wet):
+        self.update(epoch)
+        value = dry + (wet - dry) * self.soil_moisture / 100 + self.random.gauss(0, self.adc_noise)
+        if self.random.random() < self.adc_spike:
+            value += self.random.choice((-1, 1)) * 8 * self.adc_noise
+        return min(65535, max(0, int(value)))
+
+    def dht_fails(self):
+        return self.random.random() < self.dht_failure_rate
@@ -0,0 +1,174 @@
+# Run Main on the simulator for a number of virtual days and print what happened
+#   python -m sim.run --days 14 --interval 1800 --pollers 2
+#   python -m sim.run --days 7 --zones 8 --pumps 2
+#   python -m sim.run --days 1 --wifi-outage 3600 --ntp-failures 5
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+import sim
+
+parser = argparse.ArgumentParser(description="Replay SmartPlantWatering on a simulated plant")
+parser.add_argument("--days", type=float, default=7, help="virtual days to run")
+parser.add_argument("--interval", type=int, default=None, help="reading_interval in seconds")
+parser.add_argument("--pollers", type=int, default=0, help="dashboards polling /get_data every 3 s")
+parser.add_argument("--subscribers", type=int, default=0, help="dashboards following /events")
+parser.add_argument("--zones", type=int, default=1, help="pots behind a soil multiplexer")
+parser.add_argument("--pumps", type=int, default=None, help="MAX_PUMPS, pumps running at once")
+parser.add_argument("--wifi-delay", type=float, default=3, help="seconds the station takes to associate")
+parser.add_argument("--wifi-outage", type=float, default=0, help="seconds the access point is down after the start")
+parser.add_argument("--ntp-failures", type=int, default=0, help="NTP requests that time out before one succeeds")
+parser.add_argument("--port", type=int, default=8080)
+parser.add_argument("--log-dir", default=None, help="flash log directory, a temporary one by default")
+parser.add_argument("--verbose", action="store_true", help="show the firmware prints")
+
+
+async def read_response(reader):
+    """One response off a kept-alive connection, False when the server closes it"""
+    headers = {}
+    await reader.readline()
+    while True:
+        line = (await reader.readline()).decode().strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int(await reader.readline(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    else:
+        await reader.read()
+    return headers.get("connection") == "keep-alive"
+
+
+async def poller(port, polls):
+    # A dashboard over a loopback keep-alive connection, like the page's updateChart()
+    writer = None
+    while True:
+        await asyncio.sleep(3)
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                polls[2] += 1
+            writer.write(b"GET /get_data HTTP/1.1\r\nHost: sim\r\n\r\n")
+            await writer.drain()
+            if not await read_response(reader):
+                writer.close()
+                writer = None
+            polls[0] += 1
+        except (OSError, EOFError):
+            polls[1] += 1
+            writer = None
+
+
+async def subscriber(port, events):
+    # A dashboard following the event stream, reconnecting like EventSource does
+    while True:
+        await asyncio.sleep(3)
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            events[2] += 1
+            writer.write(b"GET /events HTTP/1.1\r\nHost: sim\r\n\r\n")
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                events[1] += len(line)
+                if line.startswith(b"event: "):
+                    events[0] += 1
+            writer.close()
+        except OSError:
+            pass
+
+
+async def session(main, world, seconds, pollers, polls, subscribers, events):
+    tasks = [asyncio.ensure_future(poller(world.port, polls)) for _ in range(pollers)]
+    tasks += [asyncio.ensure_future(subscriber(world.port, events)) for _ in range(subscribers)]
+    try:
+        await asyncio.wait_for(main.run(), seconds)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def seconds_after(ms, boot):
+    return "never" if not ms else "{:.2f} s".format(ms / 1000 - boot)
+
+
+def run(days, interval=None, pollers=0, port=8080, log_dir=None, verbose=False, subscribers=0, zones=1, pumps=None,
+        wifi_delay=3, wifi_outage=0, ntp_failures=0):
+    world = sim.install(port=port, log_dir=log_dir, zones=zones, pumps=pumps, wifi_delay=wifi_delay,
+                        wifi_outage=wifi_outage, ntp_failures=ntp_failures)
+    loop = sim.new_loop()
+    # Connections still open when the run ends are cancelled, that is not worth a traceback
+    loop.set_exception_handler(lambda loop, context: None if isinstance(context.get("exception"), asyncio.CancelledError)
+                               else loop.default_exception_handler(context))
+    from main import Main
+    end = days * 86400
+    polls = [0, 0, 0]
+    events = [0, 0, 0]
+    start = time.perf_counter()
+    main = None
+    first_boot = None
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output:
+        while world.clock.monotonic < end:
+            try:
+                boot = world.clock.monotonic
+                main = Main()
+                if interval is not None:
+                    main.web_server.reading_interval = interval
+                loop.run_until_complete(session(main, world, end - world.clock.monotonic, pollers, polls,
+                                                    subscribers, events))
+            except asyncio.TimeoutError:
+                break
+            except sim.Reset:
+                world.reboot()
+            finally:
+                if first_boot is None and main is not None:
+                    first_boot = (boot, main.metrics)
+                if main is not None and main.web_server.server is not None:
+                    main.web_server.server.close()
+                tasks = asyncio.all_tasks(loop)
+                for task in tasks:
+                    task.cancel()
+                loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    wall = time.perf_counter() - start
+    print("Simulated {:.1f} days in {:.1f} s ({:.0f}x)".format(world.clock.monotonic / 86400, wall,
+                                                            world.clock.monotonic / max(wall, 1e-9)))
+    boot, metrics = first_boot
+    print("First boot: first reading after {}, clock set after {}, web server after {}".format(
+        seconds_after(metrics.first_reading_ms, boot), seconds_after(metrics.clock_ms, boot),
+        seconds_after(metrics.boot_ms, boot)))
+    for zone, plant in zip(main.zones, world.plants):
+        readings = zone.readings
+        prefix = zone.name + ": " if len(main.zones) > 1 else ""
+        print("{}Readings in history: {} (last_seq {}), waterings: {}, pumped: {:.0f} s".format(
+            prefix, len(readings), readings.last_seq, sum(1 for pulse in world.relay_pulses if pulse[2] == zone.index),
+            plant.pumped_seconds))
+    print("Soil moisture range: {:.1f}-{:.1f} %, now {:.1f} %".format(
+        world.soil_range[0], world.soil_range[1], world.plant.soil_moisture))
+    if len(main.zones) > 1:
+        print("Waterings: {}, most pumps at once: {} (MAX_PUMPS {})".format(
+            len(world.relay_pulses), world.pumps_peak, main.pumps.size))
+    print("ADC samples: {}, DHT reads: {} ({} failed), I2C: {} bytes in {} writes".format(
+        world.adc_reads, world.dht_reads, world.dht_failures, world.i2c_bytes, world.i2c_writes))
+    print("Resets: {}, dashboard polls: {} ({} failed) over {} connections".format(world.resets, polls[0], polls[1],
+                                                                               polls[2]))
+    print("Events received: {} ({} B) over {} connections".format(events[0], events[1], events[2]))
+    loop.close()
+    return world, main
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    run(args.days, args.interval, args.pollers, args.port, args.log_dir, args.verbose, args.subscribers, args.zones,
+        args.pumps, args.wifi_delay, args.wifi_outage, args.ntp_failures)
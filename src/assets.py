@@ -0,0 +1,6 @@
+# Generated by tools/buildAssets.py from web/, do not edit
+# URL path: (file in STATIC_DIR, content type, gzip size, ETag)
+ASSETS = {
+    '/static/app.js': ('app.js.gz', 'application/javascript', 1757, '"e7847aa471eca0d3"'),
+    '/static/style.css': ('style.css.gz', 'text/css', 515, '"6788cb02a874e4e7"'),
+}
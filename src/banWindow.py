@@ -0,0 +1,53 @@
+from constant import *
+
+
+def seconds_of_day(text):
+    """'HH:MM' to seconds since midnight"""
+    hours, minutes = text.split(":")
+    return int(hours) * 3600 + int(minutes) * 60
+
+
+# Time of day when the pump must stay off, from start (included) to finish (excluded) in local time.
+# A window whose start is after its finish crosses midnight, start == finish bans nothing.
+# Built once when the settings change, checking it is two comparisons.
+class BanWindow:
+    def __init__(self, start="00:00", finish="00:00", utc_offset=UTC_OFFSET):
+        self.start = seconds_of_day(start)
+        self.finish = seconds_of_day(finish)
+        self.utc_offset = utc_offset
+
+    def local_seconds(self, epoch):
+        return (int(epoch) + self.utc_offset) % 86400
+
+    def banned(self, epoch):
+        t = self.local_seconds(epoch)
+        if self.start <= self.finish:
+            return self.start <= t < self.finish
+        return t >= self.start or t < self.finish
+
+    def allowed_at(self, epoch):
+        """First epoch from epoch on when watering is allowed"""
+        if not self.banned(epoch):
+            return epoch
+        return epoch + (self.finish - self.local_seconds(epoch)) % 86400
+
+
+if __name__ == "__main__":
+    print("Test BanWindow")
+    day = 1760000000 - 1760000000 % 86400  # a UTC midnight
+    night = BanWindow("23:30", "09:00", 0)
+    assert night.banned(day) and night.banned(day + 23 * 3600 + 1800) and night.banned(day + 9 * 3600 - 1)
+    assert not night.banned(day + 9 * 3600) and not night.banned(day + 23 * 3600 + 1799)
+    assert night.allowed_at(day + 3600) == day + 9 * 3600 and night.allowed_at(day + 23 * 3600 + 1800) == day + 86400 + 9 * 3600
+    assert night.allowed_at(day + 12 * 3600) == day + 12 * 3600
+    # Not crossing midnight, which the old finish < now < start check could not express
+    noon = BanWindow("12:00", "16:00", 0)
+    assert noon.banned(day + 13 * 3600) and not noon.banned(day + 11 * 3600) and not noon.banned(day + 16 * 3600)
+    assert not BanWindow("10:00", "10:00", 0).banned(day + 10 * 3600)
+    # Local time: 23:30 in UTC+2 is 21:30 UTC
+    local = BanWindow("23:30", "09:00", 7200)
+    assert local.banned(day + 21 * 3600 + 1800) and not local.banned(day + 21 * 3600 + 1799)
+    assert local.allowed_at(day) == day + 7 * 3600
+    for t in range(0, 86400 * 2, 60):
+        assert not night.banned(night.allowed_at(day + t))
+    print("BanWindow OK")
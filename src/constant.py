@@ -4,6 +4,11 @@ SOIL_SENSOR_PIN = "GP28"
 RELAY_PIN = "GP20" 
 I2C_SCL_PIN = "GP17"
 I2C_SDA_PIN = "GP16"
+# Zones, one pot each: name, soil sensor ADC pin, channel of the soil multiplexer on that pin
+# (None when the sensor is wired straight to it) and relay pin. The Pico has three ADC pins,
+# more pots go through an analog multiplexer (CD74HC4067) whose select pins are SOIL_MUX_PINS.
+ZONES = (("Pot 1", SOIL_SENSOR_PIN, None, RELAY_PIN),)
+SOIL_MUX_PINS = ()  # S0 first
 
 # Configuration Constants
 MAX_ATTEMPTS = 100
@@ -13,19 +18,56 @@ MAX_READINGS = 336
 READING_INTERVAL = 1800
 NEEDED_SOIL_MOISTURE = 50
 TIME_WATER = 5  
+MAX_PUMPS = 1  # pumps running at once, what the power supply can feed
 FINISH_BAN_TIME="09:00"
 START_BAN_TIME="23:30"
+UTC_OFFSET = 0  # seconds east of UTC of the ban times, 3600 for CET (no daylight saving)
+WEB_PORT = 80
 
 # Code Constants
 MAX_ATTEMPTS = 25
-CHUNK_SIZE = 512
+CHUNK_SIZE = 512  # bytes per send of every response, up to 65535: one buffer of this size serves all connections
+REQUEST_TIMEOUT = 5  # seconds a client may stall a read or write
+MAX_REQUEST_HEAD = 1024  # bytes of request line and headers
+MAX_REQUEST_BODY = 512  # bytes, the settings form is the only body
+KEEP_ALIVE_TIMEOUT = 15  # seconds an idle connection is kept, a dashboard polls every 3 s
+KEEP_ALIVE_MAX = 100  # requests served on one connection before it is closed
+SSE_MAX_CLIENTS = 4  # /events subscribers at once
+SSE_QUEUE = 4  # events per zone waiting for one subscriber before it is dropped as too slow
+SSE_PING_INTERVAL = 20  # seconds of silence before a keep-alive comment is sent
+SSE_RETRY = 5000  # ms the browser waits before reconnecting
+DISPLAY_FRAME_INTERVAL = 500  # ms between two screen refreshes
+DISPLAY_ZONES_PER_ROW = 2  # soil moisture of several zones on one screen row
+SOIL_SAMPLES = 15  # ADC samples per soil moisture reading
+SOIL_SAMPLE_SPACING = 1  # ms between two ADC samples
+SOIL_TRIM = 4  # lowest and highest samples dropped before averaging
+DHT_MIN_INTERVAL = 1000  # ms, the DHT11 cannot be read faster
+DHT_RETRIES = 3
+DHT_RETRY_DELAY = 1000  # ms, doubled after every failed read
 DAY = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+HISTORY_SCALE = 100  # sensor values are stored in the history as int16 hundredths
+LOG_DIR = "/log"
+LOG_BATCH = 8  # readings written to flash at once
+LOG_FLUSH_INTERVAL = 60  # seconds, slow sampling still reaches the flash right away
+ROLLUP_HOURS = 336  # hourly buckets kept, two weeks
+ROLLUP_DAYS = 366  # daily buckets kept, a year
+ROLLUP_FILE = LOG_DIR + "/rollup.bin"
+METRICS_INTERVAL = 10000  # ms between two event loop lag probes when nothing else is scheduled
+METRICS_GC_INTERVAL = 10000  # ms between two timed gc.collect()
+STATIC_DIR = "/static"  # gzipped assets built by tools/buildAssets.py
+STATIC_MAX_AGE = 31536000  # seconds, asset URLs change with their content
+WIFI_CONNECT_TIMEOUT = 15000  # ms one association attempt may take
+WIFI_POLL_INTERVAL = 250  # ms between two looks at the association
+WIFI_CHECK_INTERVAL = 30  # seconds between two checks that the station is still associated
+BOOT_RETRY_MIN = 1  # seconds before retrying WiFi, NTP or the server bind, doubled after every failure
+BOOT_RETRY_MAX = 300  # seconds, the longest wait between two retries
+VALID_EPOCH = 1704067200  # 2024-01-01, the RTC reads less until NTP set it
 
 # Limit Constants
 MIN_MAX_READINGS = 1
 MAX_MAX_READINGS = 500
 
-MIN_READING_INTERVAL = 4  #await asyncio.sleep(4) when read sensors
+MIN_READING_INTERVAL = 4  # seconds, a reading with DHT retries takes a few, one running over skips the next deadline
 MAX_READING_INTERVAL = 86400
 
 MIN_NEEDED_SOIL_MOISTURE = 20
@@ -0,0 +1,49 @@
+from constant import *
+from historyBuffer import format_iso
+
+CSV_HEADER = "time,zone,soil_moisture,air_humidity,air_temperature,water\r\n"
+
+
+def fixed_text(value):
+    # Hundredths as a decimal without going through a float
+    sign = "-" if value < 0 else ""
+    value = abs(value)
+    return f"{sign}{value // HISTORY_SCALE}.{value % HISTORY_SCALE:02d}"
+
+
+def csv_pieces(rows, zone=0, start_epoch=0, end_epoch=0xFFFFFFFF):
+    """One str piece per CSV line of the rows (epoch, soil_moisture, air_humidity, air_temperature, water)
+    from HistoryBuffer.rows() or FlashLog.records(), only those from start_epoch to end_epoch"""
+    yield CSV_HEADER
+    for epoch, soil_moisture, air_humidity, air_temperature, water in rows:
+        if start_epoch <= epoch <= end_epoch:
+            yield (f"{format_iso(epoch)},{zone},{fixed_text(soil_moisture)},{fixed_text(air_humidity)},"
+                   f"{fixed_text(air_temperature)},{1 if water else 0}\r\n")
+
+
+if __name__ == "__main__":
+    print("Test csvStream")
+    from historyBuffer import HistoryBuffer
+
+    class Reading:
+        def __init__(self, epoch, value, water=False):
+            self.epoch = epoch
+            self.soil_moisture = value
+            self.air_humidity = value / 3
+            self.air_temperature = value - 40
+            self.water = water
+
+    assert [fixed_text(v) for v in (0, 5, -5, 1234, -219, 32767)] == ["0.00", "0.05", "-0.05", "12.34", "-2.19", "327.67"]
+    history = HistoryBuffer(MAX_MAX_READINGS)
+    for i in range(MAX_MAX_READINGS + 20):
+        history.append(Reading(1760000000 + i * 1800, i * 0.07, i % 9 == 0))
+    lines = "".join(csv_pieces(history.rows(), 1)).split("\r\n")
+    assert lines[0] + "\r\n" == CSV_HEADER and lines[-1] == "" and len(lines) == MAX_MAX_READINGS + 2
+    epoch = history.epoch(0)
+    assert lines[1] == "{},1,{},{},{},{}".format(format_iso(epoch), fixed_text(history.fixed(0, 0)),
+                                                 fixed_text(history.fixed(1, 0)), fixed_text(history.fixed(2, 0)),
+                                                 1 if history.water(0) else 0)
+    assert sum(1 for line in lines[1:-1] if line.endswith(",1")) == sum(1 for i in range(len(history)) if history.water(i))
+    inside = list(csv_pieces(history.rows(), 0, history.epoch(10), history.epoch(19)))
+    assert len(inside) == 11 and inside[1].startswith(format_iso(history.epoch(10)))
+    print(lines[1], "OK")
@@ -0,0 +1,158 @@
+from array import array
+
+
+# Some readings of a HistoryBuffer seen as a history of their own: history_pieces and packed_pieces
+# stream a Selection like the whole buffer. indexes is a range or an array of increasing indexes.
+class Selection:
+    def __init__(self, readings, indexes):
+        self.__readings = readings
+        self.__indexes = indexes
+
+    def __len__(self):
+        return len(self.__indexes)
+
+    @property
+    def last_seq(self):
+        return self.__readings.last_seq
+
+    def epoch(self, i):
+        return self.__readings.epoch(self.__indexes[i])
+
+    def timestamp(self, i):
+        return self.__readings.timestamp(self.__indexes[i])
+
+    def soil_moisture(self, i):
+        return self.__readings.soil_moisture(self.__indexes[i])
+
+    def air_humidity(self, i):
+        return self.__readings.air_humidity(self.__indexes[i])
+
+    def air_temperature(self, i):
+        return self.__readings.air_temperature(self.__indexes[i])
+
+    def water(self, i):
+        return self.__readings.water(self.__indexes[i])
+
+    def fixed(self, series, i):
+        return self.__readings.fixed(series, self.__indexes[i])
+
+
+def lttb(readings, first, stop, points):
+    """Readings first..stop-1 reduced to about points with Largest-Triangle-Three-Buckets.
+    The first and last readings are kept, then from every bucket the one making the largest triangle
+    with the reading kept before it and the mean of the next bucket, the areas of the three series
+    added up. Watered readings are always kept, on top of points. Every reading is read twice: for
+    the mean of its bucket, then when its bucket is scanned. The kept indexes are the only memory."""
+    length = stop - first
+    if points >= length or points < 3:
+        return Selection(readings, range(first, stop))
+    kept = array('H', [first])
+    # Bucket b holds first+1+b*(length-2)//(points-2) up to the next bound, in integers so that the
+    # last one ends exactly at stop-1 and every reading in between falls in a bucket
+    span = length - 2
+    buckets = points - 2
+    # x relative to the first reading keeps epochs within float precision on the Pico
+    origin = readings.epoch(first)
+    previous = first
+    for bucket in range(points - 2):
+        start = first + 1 + bucket * span // buckets
+        end = first + 1 + (bucket + 1) * span // buckets
+        following = first + 1 + (bucket + 2) * span // buckets if bucket < buckets - 1 else stop
+        # Mean of the next bucket, the last one is the last reading
+        count = following - end
+        x = y0 = y1 = y2 = 0
+        for j in range(end, following):
+            x += readings.epoch(j) - origin
+            y0 += readings.fixed(0, j)
+            y1 += readings.fixed(1, j)
+            y2 += readings.fixed(2, j)
+        x /= count
+        y0 /= count
+        y1 /= count
+        y2 /= count
+        ax = readings.epoch(previous) - origin
+        a0 = readings.fixed(0, previous)
+        a1 = readings.fixed(1, previous)
+        a2 = readings.fixed(2, previous)
+        best = start
+        largest = -1
+        watered = False
+        for j in range(start, end):
+            dx = readings.epoch(j) - origin - ax
+            area = (abs((ax - x) * (readings.fixed(0, j) - a0) - dx * (a0 - y0))
+                    + abs((ax - x) * (readings.fixed(1, j) - a1) - dx * (a1 - y1))
+                    + abs((ax - x) * (readings.fixed(2, j) - a2) - dx * (a2 - y2)))
+            if area > largest:
+                largest = area
+                best = j
+            if readings.water(j):
+                watered = True
+        if watered:
+            for j in range(start, end):
+                if j == best or readings.water(j):
+                    kept.append(j)
+        else:
+            kept.append(best)
+        previous = best
+    kept.append(stop - 1)
+    return Selection(readings, kept)
+
+
+if __name__ == "__main__":
+    print("Test decimate")
+    from historyBuffer import HistoryBuffer
+
+    class Reading:
+        def __init__(self, epoch, value, water=False):
+            self.epoch = epoch
+            self.soil_moisture = value
+            self.air_humidity = 50
+            self.air_temperature = 20
+            self.water = water
+
+    history = HistoryBuffer(500)
+    for i in range(600):
+        # A slow sawtooth with one spike, watered every 97 readings
+        history.append(Reading(1700000000 + i * 600, (i % 100) / 4 + (60 if i == 333 else 0), i % 97 == 0))
+    assert history.bisect(0) == 0 and history.bisect(1800000000) == 500
+    assert history.epoch(history.bisect(1700000000 + 250 * 600)) == 1700000000 + 250 * 600
+    assert history.bisect(1700000000 + 250 * 600 + 1) == 151
+
+    whole = lttb(history, 0, len(history), 1000)
+    assert len(whole) == 500 and whole.epoch(7) == history.epoch(7) and whole.last_seq == 600
+    selection = lttb(history, 0, len(history), 50)
+    epochs = [selection.epoch(i) for i in range(len(selection))]
+    assert epochs == sorted(set(epochs)) and epochs[0] == history.epoch(0) and epochs[-1] == history.epoch(-1)
+    waterings = [history.epoch(i) for i in range(len(history)) if history.water(i)]
+    assert all(epoch in epochs for epoch in waterings)
+    assert len(selection) <= 50 + len(waterings)
+    # The spike and the sawtooth peaks survive
+    assert max(selection.soil_moisture(i) for i in range(len(selection))) == 68.25
+    assert sum(1 for i in range(len(selection)) if selection.soil_moisture(i) >= 24) >= 4
+    part = lttb(history, history.bisect(1700000000 + 300 * 600), history.bisect(1700000000 + 400 * 600), 20)
+    assert part.epoch(0) == 1700000000 + 300 * 600 and part.epoch(len(part) - 1) == 1700000000 + 399 * 600
+
+    class Trace:
+        # A zigzag of length readings, watered at one index
+        def __init__(self, length, watered):
+            self.length = length
+            self.watered = watered
+
+        def epoch(self, i):
+            return 1700000000 + i * 600
+
+        def fixed(self, series, i):
+            return (i * (series + 3)) % 7
+
+        def water(self, i):
+            return i == self.watered
+
+    # Every reading falls in a bucket: a watering anywhere is kept, whatever the length and points
+    for length in range(3, 60):
+        for points in range(3, length):
+            for watered in range(length):
+                kept = lttb(Trace(length, watered), 0, length, points)
+                indexes = [(kept.epoch(i) - 1700000000) // 600 for i in range(len(kept))]
+                assert watered in indexes, (length, points, watered)
+                assert indexes == sorted(set(indexes)) and len(indexes) <= points + 1, (length, points, watered)
+    print(len(selection), "of", len(history), "readings kept OK")
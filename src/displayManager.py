@@ -1,31 +1,97 @@
 from machine import Pin, I2C
 import ssd1306
 from sensorManager import Data
-from time import sleep, localtime
+from time import sleep, localtime, ticks_ms, ticks_diff
+import uasyncio as asyncio
 from constant import *
 
 # Class for managing the SSD1306 screen
 class DisplayManager:
-    def __init__(self, scl=I2C_SCL_PIN, sda=I2C_SDA_PIN):
+    def __init__(self, scl=I2C_SCL_PIN, sda=I2C_SDA_PIN, zones=len(ZONES)):
         i2c = I2C(0, scl=Pin(scl), sda=Pin(sda))
         self.display = ssd1306.SSD1306_I2C(128, 64, i2c)
+        self.__rows = [""] * ((self.display.height + 9) // 10)  # text shown on every 10 px row
+        # One-slot mailbox: producers overwrite the latest state, the display task draws it
+        self.__message = None
+        self.__data = [None] * zones  # latest reading of every zone
+        self.__clients = 0
+        self.__updated = asyncio.Event()
         
-    def show_message(self, message:str):
-        self.display.fill(0)
-        lines = [message[i:i+16] for i in range(0, len(message), 16)]
-        for i, line in enumerate(lines):
-            self.display.text(line, 0, i*10)
+    def __draw(self, lines):
+        # Only the rows whose text changed are redrawn, so the driver sends just their pages
+        for i, shown in enumerate(self.__rows):
+            line = lines[i] if i < len(lines) else ""
+            if line != shown:
+                self.display.fill_rect(0, i*10, 8*max(len(line), len(shown)), 8, 0)
+                self.display.text(line, 0, i*10)
+                self.__rows[i] = line
         self.display.show()
+
+    def show_message(self, message:str):
+        self.__draw([message[i:i+16] for i in range(0, len(message), 16)])
             
-    def show_data(self, data:Data, last_water:str="", water_week=[0]*7):
-        self.display.fill(0)
-        self.display.text(f"Solid:{data.soil_moisture:.2f}%", 0, 0)
-        self.display.text(f"Air  :{data.air_humidity:.2f}%", 0, 10)
-        self.display.text(f"Temp :{data.air_temperature:.2f}C", 0, 20)
-        self.display.text(f"DT:{data.timestamp}", 0, 30)
-        self.display.text(f"LT:{last_water}", 0, 40)
-        self.display.text(f"{','.join(map(str, water_week))}", 0, 50)
-        self.display.show()
+    def show_data(self, data:Data, last_water:str="", water_week=[0]*7, clients=0):
+        week = ','.join(map(str, water_week))
+        self.__draw([f"Solid:{data.soil_moisture:.2f}%",
+                     f"Air  :{data.air_humidity:.2f}%",
+                     f"Temp :{data.air_temperature:.2f}C",
+                     f"DT:{data.timestamp}",
+                     f"LT:{last_water}",
+                     f"{week} {clients}" if clients else week])
+
+    def show_zones(self, zones, clients=0):
+        # Several pots do not fit the single pot layout: air once, then the soil moisture of
+        # DISPLAY_ZONES_PER_ROW zones per row, * marking the ones watered at their last reading
+        latest = None
+        cells = []
+        for i, zone in enumerate(zones):
+            if zone is None:
+                cells.append(f"{i + 1}:  -% ")
+                continue
+            data = zone[0]
+            if latest is None or data.epoch > latest.epoch:
+                latest = data
+            cells.append(f"{i + 1}:{data.soil_moisture:3.0f}%{'*' if data.water else ' '}")
+        lines = [f"Air:{latest.air_humidity:.0f}% {latest.air_temperature:.1f}C"]
+        for i in range(0, len(cells), DISPLAY_ZONES_PER_ROW):
+            lines.append(" ".join(cells[i:i + DISPLAY_ZONES_PER_ROW]))
+        lines.append(f"DT:{latest.timestamp}")
+        if clients:
+            lines.append(f"Clients: {clients}")
+        self.__draw(lines)
+
+############################ASYNC MAILBOX##############################
+    def post_message(self, message:str):
+        self.__message = message
+        self.__updated.set()
+
+    def post_data(self, data:Data, last_water:str="", water_week=[0]*7, zone=0):
+        self.__message = None
+        self.__data[zone] = (data, last_water, water_week)
+        self.__updated.set()
+
+    def post_clients(self, clients:int):
+        if clients != self.__clients:
+            self.__clients = clients
+            self.__updated.set()
+
+    async def run(self):
+        # Never draws faster than DISPLAY_FRAME_INTERVAL, a burst of posts becomes one flush
+        last_frame = ticks_ms() - DISPLAY_FRAME_INTERVAL
+        while True:
+            await self.__updated.wait()
+            wait = DISPLAY_FRAME_INTERVAL - ticks_diff(ticks_ms(), last_frame)
+            if wait > 0:
+                await asyncio.sleep_ms(wait)
+            self.__updated.clear()
+            last_frame = ticks_ms()
+            if self.__message is not None:
+                self.show_message(self.__message)
+            elif len(self.__data) > 1:
+                if any(self.__data):
+                    self.show_zones(self.__data, self.__clients)
+            elif self.__data[0] is not None:
+                self.show_data(*self.__data[0], clients=self.__clients)
         
 if __name__ == "__main__":
     print("Test DisplayManager")
@@ -34,4 +100,21 @@ if __name__ == "__main__":
         display.show_data(Data(i, i*2, i*4)) 
         sleep(2)
         
-    display.show_message("This device reads the temperature and humidity, depending on whether it waters or not.")
\ No newline at end of file
+    display.show_message("This device reads the temperature and humidity, depending on whether it waters or not.")
+    sleep(2)
+
+    async def producer():
+        # Posting must cost the same whatever the I2C bus speed, drawing happens in run()
+        worst = 0
+        for i in range(200):
+            start = ticks_ms()
+            display.post_data(Data(i, i*2, i*4), "", [i % 3]*7)
+            worst = max(worst, ticks_diff(ticks_ms(), start))
+            await asyncio.sleep_ms(5)
+        print("Worst post latency:", worst, "ms")
+
+    async def test():
+        asyncio.create_task(display.run())
+        await producer()
+
+    asyncio.run(test())
@@ -0,0 +1,81 @@
+import uasyncio as asyncio
+from constant import *
+
+
+# One /events client: a short queue of encoded events and the flag its connection task waits on
+class Subscriber:
+    def __init__(self, size):
+        self.size = size
+        self.queue = []
+        self.dropped = False
+        self.ready = asyncio.Event()
+
+    def push(self, event):
+        if len(self.queue) >= self.size:
+            # Too slow to keep up: drop the subscriber, not the events, the page catches up on reconnect
+            self.dropped = True
+        else:
+            self.queue.append(event)
+        self.ready.set()
+
+    def pop(self):
+        events = self.queue
+        self.queue = []
+        self.ready.clear()
+        return events
+
+
+# Server-Sent Events fan-out. An event is encoded once and the same bytes are queued for every
+# subscriber, so the cost follows the rate of new data and not the number of open dashboards.
+class EventHub:
+    def __init__(self, zones=len(ZONES)):
+        # Every zone publishes its reading in the same pass
+        self.queue = SSE_QUEUE * zones
+        self.subscribers = []
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self):
+        """New subscriber, None when SSE_MAX_CLIENTS are already listening"""
+        if len(self.subscribers) >= SSE_MAX_CLIENTS:
+            return None
+        subscriber = Subscriber(self.queue)
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+            if subscriber.dropped:
+                self.dropped += 1
+
+    def publish(self, name, data):
+        """Queue event name with data (a single line, JSON here) for every subscriber"""
+        if not self.subscribers:
+            return
+        event = "event: {}\ndata: {}\n\n".format(name, data).encode("utf-8")
+        self.published += 1
+        for subscriber in self.subscribers:
+            subscriber.push(event)
+
+
+if __name__ == "__main__":
+    print("Test EventHub")
+    hub = EventHub(len(ZONES) + 2)
+    assert hub.queue == SSE_QUEUE * (len(ZONES) + 2)
+    hub.publish("reading", "{}")
+    assert hub.published == 0
+    fast = hub.subscribe()
+    slow = hub.subscribe()
+    for i in range(hub.queue):
+        hub.publish("reading", '{"i": %d}' % i)
+        assert fast.pop() == [("event: reading\ndata: {\"i\": %d}\n\n" % i).encode()]
+    assert len(slow.queue) == hub.queue and not slow.dropped
+    hub.publish("water", "{}")
+    assert slow.dropped and len(fast.pop()) == 1
+    hub.unsubscribe(slow)
+    assert hub.dropped == 1 and hub.subscribers == [fast]
+    while hub.subscribe() is not None:
+        pass
+    assert len(hub.subscribers) == SSE_MAX_CLIENTS
+    print("EventHub OK")
@@ -0,0 +1,369 @@
+import os
+import struct
+from time import time
+from constant import *
+from historyBuffer import to_fixed
+
+# epoch, soil moisture, air humidity, air temperature (HISTORY_SCALE fixed point), flags, check
+RECORD = "<IhhhBB"
+RECORD_SIZE = struct.calcsize(RECORD)
+# magic, version, current segment, records in it, needed_soil_moisture, reading_interval,
+# time_water, max_reading, finish_ban_time and start_ban_time (minutes of the day), check
+HEADER = "<4sBBIHIHHHHH"
+HEADER_SIZE = struct.calcsize(HEADER)
+MAGIC = b"SPWL"
+VERSION = 1
+WATER_FLAG = 0x01
+
+
+def checksum(buffer, start, end):
+    total = 0
+    for i in range(start, end):
+        total += buffer[i]
+    return total
+
+
+def file_size(path):
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return 0
+
+
+# Append-only log of the readings and the settings on the flash filesystem.
+# Readings are written in batches to two segment files used in turns, each holding up to
+# max_reading records, so the newest max_reading readings are the current segment plus the
+# tail of the other one. A small checkpoint header keeps the current segment, its length
+# and the settings, so boot seeks straight to the records it needs.
+class FlashLog:
+    def __init__(self, directory=LOG_DIR):
+        self.__directory = directory
+        try:
+            os.mkdir(directory)
+        except OSError:
+            pass  # already exists
+        self.__batch = bytearray(RECORD_SIZE * LOG_BATCH)
+        self.__pending = 0
+        self.__last_flush = 0
+        self.__segment = 0
+        self.__count = 0  # records flushed to the current segment
+        self.__capacity = MAX_READINGS
+        self.__config = None
+        self.__unstamped = None  # [segment, first record, rotations since] of the records flushed before the clock was set
+
+    def __path(self, name):
+        return self.__directory + "/" + name
+
+    def __segment_path(self, segment):
+        return self.__path("seg{}.bin".format(segment))
+
+    @property
+    def pending(self):
+        return self.__pending
+
+    @property
+    def current_path(self):
+        return self.__segment_path(self.__segment)
+
+########################################BOOT########################################
+    def load_config(self):
+        """Read the checkpoint header, returns the saved settings tuple or None"""
+        try:
+            with open(self.__path("log.hdr"), "rb") as f:
+                header = f.read()
+        except OSError:
+            return None
+        if len(header) != HEADER_SIZE or checksum(header, 0, HEADER_SIZE - 2) & 0xFFFF != struct.unpack_from("<H", header, HEADER_SIZE - 2)[0]:
+            print("Log header corrupted, ignoring it")
+            return None
+        fields = struct.unpack(HEADER, header)
+        if fields[0] != MAGIC or fields[1] != VERSION:
+            return None
+        self.__segment = fields[2] & 1
+        self.__count = fields[3]
+        self.__config = fields[4:10]
+        self.__capacity = self.__config[3]
+        return self.__config
+
+    def restore(self, history):
+        """Load the newest readings into history, after load_config. Returns the number restored"""
+        current = self.__segment_path(self.__segment)
+        self.__count = self.__recover(current, self.__count)
+        wanted = history.capacity
+        if wanted > self.__count:
+            previous = self.__segment_path(1 - self.__segment)
+            total = file_size(previous) // RECORD_SIZE
+            self.__load(previous, max(0, total - (wanted - self.__count)), total, history)
+        self.__load(current, max(0, self.__count - wanted), self.__count, history)
+        return len(history)
+
+    def __recover(self, path, committed):
+        # Records up to the checkpoint are trusted, the ones written after it are checked
+        # until the first torn one, which is cut off with everything after it
+        size = file_size(path)
+        valid = min(committed, size // RECORD_SIZE)
+        record = bytearray(RECORD_SIZE)
+        if valid * RECORD_SIZE < size:
+            with open(path, "rb") as f:
+                f.seek(valid * RECORD_SIZE)
+                while f.readinto(record) == RECORD_SIZE and self.__valid(record, 0):
+                    valid += 1
+        if valid * RECORD_SIZE != size:
+            print("Log segment torn, keeping", valid, "records")
+            self.__truncate(path, valid * RECORD_SIZE)
+        return valid
+
+    def __truncate(self, path, size):
+        # MicroPython files cannot be truncated, copy the good part through the batch buffer
+        copy = path + ".tmp"
+        with open(path, "rb") as source, open(copy, "wb") as target:
+            while size > 0:
+                n = source.readinto(self.__batch)
+                if not n:
+                    break
+                n = min(n, size)
+                target.write(memoryview(self.__batch)[:n])
+                size -= n
+        os.rename(copy, path)
+
+    def __load(self, path, first, last, history):
+        if first >= last:
+            return
+        view = memoryview(self.__batch)
+        with open(path, "rb") as f:
+            f.seek(first * RECORD_SIZE)
+            while first < last:
+                n = min(LOG_BATCH, last - first)
+                n = f.readinto(view[:n * RECORD_SIZE]) // RECORD_SIZE
+                if n == 0:
+                    break
+                for i in range(n):
+                    offset = i * RECORD_SIZE
+                    if self.__valid(self.__batch, offset):
+                        epoch, soil_moisture, air_humidity, air_temperature, flags, _ = struct.unpack_from(RECORD, self.__batch, offset)
+                        history.append_fixed(epoch, soil_moisture, air_humidity, air_temperature, flags & WATER_FLAG)
+                first += n
+
+    def records(self):
+        """(epoch, soil_moisture, air_humidity, air_temperature, water) of every reading on flash, oldest
+        first: the previous segment, then the current one, up to twice max_reading readings. Read through
+        a small buffer of its own, a rotation meanwhile cuts the older ones short."""
+        buffer = bytearray(RECORD_SIZE * LOG_BATCH)
+        view = memoryview(buffer)
+        segments = ((self.__segment_path(1 - self.__segment), None), (self.__segment_path(self.__segment), self.__count))
+        for path, last in segments:
+            try:
+                f = open(path, "rb")
+            except OSError:
+                continue
+            with f:
+                left = file_size(path) // RECORD_SIZE if last is None else last
+                while left > 0:
+                    n = f.readinto(view[:min(LOG_BATCH, left) * RECORD_SIZE]) // RECORD_SIZE
+                    if n == 0:
+                        break
+                    for i in range(n):
+                        offset = i * RECORD_SIZE
+                        if self.__valid(buffer, offset):
+                            epoch, soil_moisture, air_humidity, air_temperature, flags, _ = struct.unpack_from(RECORD, buffer, offset)
+                            yield epoch, soil_moisture, air_humidity, air_temperature, flags & WATER_FLAG == WATER_FLAG
+                    left -= n
+
+    def __valid(self, buffer, offset):
+        return checksum(buffer, offset, offset + RECORD_SIZE - 1) & 0xFF == buffer[offset + RECORD_SIZE - 1]
+
+########################################WRITE########################################
+    def append(self, data):
+        """Queue a reading, the batch is written when full or LOG_FLUSH_INTERVAL after the last write.
+        A reading taken before the clock was set waits in the batch for restamp() unless it is full."""
+        offset = self.__pending * RECORD_SIZE
+        epoch = int(data.epoch)
+        struct.pack_into(RECORD, self.__batch, offset, epoch, to_fixed(data.soil_moisture),
+                         to_fixed(data.air_humidity), to_fixed(data.air_temperature),
+                         WATER_FLAG if data.water else 0, 0)
+        self.__batch[offset + RECORD_SIZE - 1] = checksum(self.__batch, offset, offset + RECORD_SIZE - 1) & 0xFF
+        self.__pending += 1
+        if self.__pending == LOG_BATCH or (epoch >= VALID_EPOCH and time() - self.__last_flush >= LOG_FLUSH_INTERVAL):
+            self.flush()
+
+    def restamp(self, delta):
+        """Move the readings of this boot taken before the clock was set by delta seconds, the queued ones
+        and the ones a full batch wrote already"""
+        for offset in range(0, self.__pending * RECORD_SIZE, RECORD_SIZE):
+            self.__shift(self.__batch, offset, delta)
+        if self.__unstamped is not None:
+            segment, first, rotations = self.__unstamped
+            self.__unstamped = None
+            if rotations:
+                other = self.__segment_path(1 - self.__segment)
+                self.__patch(other, first if rotations == 1 else 0, file_size(other) // RECORD_SIZE, delta)
+                first = 0
+            self.__patch(self.current_path, first, self.__count, delta)
+
+    def __shift(self, buffer, offset, delta):
+        epoch = struct.unpack_from("<I", buffer, offset)[0]
+        if epoch >= VALID_EPOCH:
+            return False
+        struct.pack_into("<I", buffer, offset, epoch + delta)
+        buffer[offset + RECORD_SIZE - 1] = checksum(buffer, offset, offset + RECORD_SIZE - 1) & 0xFF
+        return True
+
+    def __patch(self, path, first, last, delta):
+        # Rewritten in place record by record, a torn one fails its check and is skipped like any other
+        record = bytearray(RECORD_SIZE)
+        with open(path, "r+b") as f:
+            for offset in range(first * RECORD_SIZE, last * RECORD_SIZE, RECORD_SIZE):
+                f.seek(offset)
+                if f.readinto(record) == RECORD_SIZE and self.__valid(record, 0) and self.__shift(record, 0, delta):
+                    f.seek(offset)
+                    f.write(record)
+
+    def flush(self):
+        if self.__pending == 0:
+            return
+        view = memoryview(self.__batch)
+        start = 0
+        while start < self.__pending:
+            if self.__count >= self.__capacity:
+                self.__rotate()
+            if self.__unstamped is None and start == 0 and self.__held():
+                self.__unstamped = [self.__segment, self.__count, 0]
+            n = min(self.__pending - start, self.__capacity - self.__count)
+            with open(self.__segment_path(self.__segment), "ab") as f:
+                f.write(view[start * RECORD_SIZE:(start + n) * RECORD_SIZE])
+            self.__count += n
+            start += n
+        self.__pending = 0
+        self.__last_flush = time()
+        self.__write_header()
+
+    def __held(self):
+        # Whether the batch has readings taken before the clock was set
+        for offset in range(0, self.__pending * RECORD_SIZE, RECORD_SIZE):
+            if struct.unpack_from("<I", self.__batch, offset)[0] < VALID_EPOCH:
+                return True
+        return False
+
+    def __rotate(self):
+        self.__segment = 1 - self.__segment
+        self.__count = 0
+        if self.__unstamped is not None:
+            self.__unstamped[2] += 1
+        open(self.__segment_path(self.__segment), "wb").close()
+        self.__write_header()
+
+    def save_config(self, config):
+        """Checkpoint the settings tuple (needed_soil_moisture, reading_interval, time_water,
+        max_reading, finish_ban_minutes, start_ban_minutes)"""
+        if config == self.__config:
+            return
+        self.__config = tuple(config)
+        self.__capacity = self.__config[3]
+        self.__write_header()
+
+    def __write_header(self):
+        if self.__config is None:
+            return
+        header = bytearray(HEADER_SIZE)
+        struct.pack_into(HEADER, header, 0, MAGIC, VERSION, self.__segment, self.__count, *self.__config, 0)
+        struct.pack_into("<H", header, HEADER_SIZE - 2, checksum(header, 0, HEADER_SIZE - 2) & 0xFFFF)
+        # Written aside and renamed, so a reset never leaves a half written header
+        with open(self.__path("log.tmp"), "wb") as f:
+            f.write(header)
+        os.rename(self.__path("log.tmp"), self.__path("log.hdr"))
+
+
+if __name__ == "__main__":
+    print("Test FlashLog")
+    import sys
+    try:
+        from time import ticks_ms, ticks_diff
+    except ImportError:
+        from time import perf_counter
+
+        def ticks_ms():
+            return int(perf_counter() * 1000)
+
+        def ticks_diff(a, b):
+            return a - b
+    from historyBuffer import HistoryBuffer
+
+    class Reading:
+        def __init__(self, epoch, value, water=False):
+            self.epoch = epoch
+            self.soil_moisture = value
+            self.air_humidity = value / 2
+            self.air_temperature = value / 4
+            self.water = water
+
+    # A directory of its own, removed at the end: a temporary one on the host, logtest on the device
+    if len(sys.argv) > 1:
+        directory = sys.argv[1]
+    else:
+        try:
+            import tempfile
+            directory = tempfile.mkdtemp(prefix="spw-log-")
+        except ImportError:
+            directory = "logtest"
+
+    def clear():
+        for name in ("log.hdr", "seg0.bin", "seg1.bin"):
+            try:
+                os.remove(directory + "/" + name)
+            except OSError:
+                pass
+    clear()
+    config = (50, 4, 5, MAX_MAX_READINGS, 540, 1410)
+    log = FlashLog(directory)
+    log.save_config(config)
+    for i in range(MAX_MAX_READINGS * 5 // 2):
+        log.append(Reading(1000 + i, i % 100, i % 7 == 0))
+    log.flush()
+
+    # Full log restore time
+    start = ticks_ms()
+    log = FlashLog(directory)
+    assert log.load_config() == config
+    history = HistoryBuffer(MAX_MAX_READINGS)
+    assert log.restore(history) == MAX_MAX_READINGS
+    print("restored", len(history), "readings in", ticks_diff(ticks_ms(), start), "ms")
+    last = 1000 + MAX_MAX_READINGS * 5 // 2 - 1
+    assert history.epoch(-1) == last and history.epoch(0) == last - MAX_MAX_READINGS + 1
+    assert history.water_week() != [0] * 7
+    # Both segments: the full one before and the current one
+    epochs = [record[0] for record in log.records()]
+    assert epochs == list(range(last - MAX_MAX_READINGS * 3 // 2 + 1, last + 1))
+
+    # Torn write: a whole unchecked record plus half of another one
+    log.append(Reading(last + 1, 1))
+    log.flush()
+    segment = log.current_path
+    with open(segment, "ab") as f:
+        f.write(b"\x01\x02\x03\x04\x05\x06\x07\x08\x09\x0a\x0b\x0c\x0d\x0e")
+    log = FlashLog(directory)
+    log.load_config()
+    history = HistoryBuffer(10)
+    log.restore(history)
+    assert history.epoch(-1) == last + 1 and len(history) == 10
+    assert file_size(segment) % RECORD_SIZE == 0
+    log.append(Reading(last + 2, 2))
+    log.flush()
+    history = HistoryBuffer(3)
+    log = FlashLog(directory)
+    log.load_config()
+    log.restore(history)
+    assert [history.epoch(i) for i in range(3)] == [last, last + 1, last + 2]
+
+    # Readings before the clock was set wait for their restamp, the ones a full batch wrote are patched on flash
+    held = MAX_MAX_READINGS + 3
+    for i in range(held):
+        log.append(Reading(VALID_EPOCH - 1000 + i, 3))
+    assert log.pending == held % LOG_BATCH
+    log.restamp(10000)
+    log.flush()
+    epochs = [record[0] for record in log.records()]
+    assert epochs[-held:] == list(range(VALID_EPOCH + 9000, VALID_EPOCH + 9000 + held)), epochs[-held:][:3]
+    clear()
+    if len(sys.argv) < 2:
+        os.rmdir(directory)
+    print("OK")
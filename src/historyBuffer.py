@@ -0,0 +1,245 @@
+from array import array
+from time import localtime
+from constant import *
+
+
+def format_timestamp(epoch):
+    t = localtime(epoch)
+    return f"{DAY[t[6]]}/{t[3]:02d}:{t[4]:02d}:{t[5]:02d}"
+
+
+def format_date(epoch):
+    t = localtime(epoch)
+    return f"{t[0]:04d}-{t[1]:02d}-{t[2]:02d}"
+
+
+def format_iso(epoch):
+    # The device clock runs on UTC once NTP has set it
+    t = localtime(epoch)
+    return f"{t[0]:04d}-{t[1]:02d}-{t[2]:02d}T{t[3]:02d}:{t[4]:02d}:{t[5]:02d}Z"
+
+
+def to_fixed(value):
+    # Clamp to the int16 range instead of wrapping around
+    return max(-32768, min(32767, round(value * HISTORY_SCALE)))
+
+
+# Fixed-capacity ring buffer that stores the sensor history column by column.
+# Sensor values are kept as fixed point (value * HISTORY_SCALE) in int16 columns,
+# so a reading costs 12 bytes instead of a whole Data object with its dict and strings.
+class HistoryBuffer:
+    def __init__(self, capacity=MAX_READINGS):
+        self.__last_seq = 0  # sequence number of the newest reading, the first one gets 1
+        self.__allocate(capacity)
+
+    def __allocate(self, capacity):
+        self.__capacity = capacity
+        self.__epoch = array('I', [0] * capacity)
+        self.__soil_moisture = array('h', [0] * capacity)
+        self.__air_humidity = array('h', [0] * capacity)
+        self.__air_temperature = array('h', [0] * capacity)
+        self.__series = (self.__soil_moisture, self.__air_humidity, self.__air_temperature)
+        self.__water = bytearray(capacity)
+        self.__weekday = bytearray(capacity)
+        self.__water_week = array('H', [0] * 7)  # watered readings per weekday, kept incrementally
+        self.__head = 0  # physical index of the oldest reading
+        self.__length = 0
+
+    def __len__(self):
+        return self.__length
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    @property
+    def last_seq(self):
+        return self.__last_seq
+
+    def seq(self, i):
+        if i < 0:
+            i += self.__length
+        return self.__last_seq - self.__length + 1 + i
+
+    def index_after(self, seq):
+        """Index of the first reading newer than seq, or None if readings after seq were evicted"""
+        if seq > self.__last_seq:
+            return None
+        start = seq - self.__last_seq + self.__length
+        return start if start >= 0 else None
+
+    def bisect(self, epoch):
+        """Index of the first reading at or after epoch, the readings being in time order"""
+        low = 0
+        high = self.__length
+        while low < high:
+            middle = (low + high) // 2
+            if self.__epoch[self.__index(middle)] < epoch:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def __index(self, i):
+        if i < 0:
+            i += self.__length
+        if not 0 <= i < self.__length:
+            raise IndexError("history index out of range")
+        i += self.__head
+        return i - self.__capacity if i >= self.__capacity else i
+
+    def append(self, data):
+        self.append_fixed(int(data.epoch), to_fixed(data.soil_moisture), to_fixed(data.air_humidity),
+                          to_fixed(data.air_temperature), data.water)
+
+    def append_fixed(self, epoch, soil_moisture, air_humidity, air_temperature, water):
+        """Append values already in HISTORY_SCALE fixed point"""
+        if self.__length < self.__capacity:
+            i = self.__head + self.__length
+            if i >= self.__capacity:
+                i -= self.__capacity
+            self.__length += 1
+        else:
+            # Full: overwrite the oldest reading
+            i = self.__head
+            if self.__water[i]:
+                self.__water_week[self.__weekday[i]] -= 1
+            self.__head = i + 1 if i + 1 < self.__capacity else 0
+        self.__last_seq += 1
+        self.__epoch[i] = epoch
+        self.__soil_moisture[i] = soil_moisture
+        self.__air_humidity[i] = air_humidity
+        self.__air_temperature[i] = air_temperature
+        self.__water[i] = 1 if water else 0
+        self.__weekday[i] = localtime(epoch)[6]
+        if water:
+            self.__water_week[self.__weekday[i]] += 1
+
+    def resize(self, capacity):
+        """Change the capacity keeping the newest readings"""
+        if capacity == self.__capacity:
+            return
+        keep = min(self.__length, capacity)
+        first = self.__length - keep
+        rows = [(self.__epoch[j], self.__soil_moisture[j], self.__air_humidity[j],
+                 self.__air_temperature[j], self.__water[j], self.__weekday[j])
+                for j in map(self.__index, range(first, self.__length))]
+        self.__allocate(capacity)
+        for i, row in enumerate(rows):
+            (self.__epoch[i], self.__soil_moisture[i], self.__air_humidity[i],
+             self.__air_temperature[i], self.__water[i], self.__weekday[i]) = row
+            if row[4]:
+                self.__water_week[row[5]] += 1
+        self.__length = keep
+
+    def restamp(self, first, delta):
+        """Move the readings first.. by delta seconds, the ones taken before the clock was set"""
+        for i in map(self.__index, range(first, self.__length)):
+            epoch = self.__epoch[i] + delta
+            self.__epoch[i] = epoch
+            if self.__water[i]:
+                self.__water_week[self.__weekday[i]] -= 1
+            self.__weekday[i] = localtime(epoch)[6]
+            if self.__water[i]:
+                self.__water_week[self.__weekday[i]] += 1
+
+    def clear(self):
+        self.__head = 0
+        self.__length = 0
+        for day in range(7):
+            self.__water_week[day] = 0
+
+    def water_week(self):
+        """Watered readings per weekday (Mon first) among the stored readings"""
+        return list(self.__water_week)
+
+    def rows(self, first=0, stop=None):
+        """(epoch, soil_moisture, air_humidity, air_temperature, water) of the readings first..stop-1,
+        values in fixed point like FlashLog.records()"""
+        for i in range(first, self.__length if stop is None else stop):
+            i = self.__index(i)
+            yield (self.__epoch[i], self.__soil_moisture[i], self.__air_humidity[i], self.__air_temperature[i],
+                   self.__water[i] == 1)
+
+##########################COLUMN ACCESS (0 is the oldest reading)##########################
+    def epoch(self, i):
+        return self.__epoch[self.__index(i)]
+
+    def timestamp(self, i):
+        return format_timestamp(self.__epoch[self.__index(i)])
+
+    def soil_moisture(self, i):
+        return self.__soil_moisture[self.__index(i)] / HISTORY_SCALE
+
+    def air_humidity(self, i):
+        return self.__air_humidity[self.__index(i)] / HISTORY_SCALE
+
+    def air_temperature(self, i):
+        return self.__air_temperature[self.__index(i)] / HISTORY_SCALE
+
+    def water(self, i):
+        return self.__water[self.__index(i)] == 1
+
+    def fixed(self, series, i):
+        """Stored fixed point value of series 0 to 2 (soil moisture, air humidity, air temperature)"""
+        return self.__series[series][self.__index(i)]
+
+    def weekday(self, i):
+        return self.__weekday[self.__index(i)]
+
+
+if __name__ == "__main__":
+    print("Test HistoryBuffer")
+
+    class Reading:
+        def __init__(self, epoch, value, water=False):
+            self.epoch = epoch
+            self.soil_moisture = value
+            self.air_humidity = value / 2
+            self.air_temperature = -value / 4
+            self.water = water
+
+    history = HistoryBuffer(5)
+    for i in range(12):
+        history.append(Reading(1000 + i, i * 1.25, i % 3 == 0))
+    assert len(history) == 5
+    assert [history.epoch(i) for i in range(5)] == [1007, 1008, 1009, 1010, 1011]
+    assert history.soil_moisture(-1) == 13.75 and history.air_temperature(0) == -2.19
+    assert history.water(2) and not history.water(3)
+    assert history.fixed(0, -1) == 1375 and history.fixed(2, 0) == -219
+    assert list(history.rows(3)) == [(1010, 1250, 625, -312, False), (1011, 1375, 688, -344, False)]
+    assert history.last_seq == 12 and history.seq(0) == 8 and history.seq(-1) == 12
+    assert history.index_after(12) == 5 and history.index_after(9) == 2 and history.index_after(7) == 0
+    assert history.index_after(6) is None and history.index_after(13) is None
+    history.resize(3)
+    assert [history.epoch(i) for i in range(len(history))] == [1009, 1010, 1011]
+    history.resize(8)
+    history.append(Reading(2000, 1))
+    assert [history.epoch(i) for i in range(len(history))] == [1009, 1010, 1011, 2000]
+    history.restamp(2, 86400 * 3)
+    assert [history.epoch(i) for i in range(len(history))] == [1009, 1010, 1011 + 86400 * 3, 2000 + 86400 * 3]
+    assert history.weekday(2) == localtime(1011 + 86400 * 3)[6] and history.bisect(86400) == 2
+
+    # The incremental counters must always match a full recount. A failure prints its seed,
+    # which replays the run when given as the first argument
+    import sys
+    import random
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else random.getrandbits(30)
+    random.seed(seed)
+    history = HistoryBuffer(20)
+    for step in range(5000):
+        action = random.randint(0, 40)
+        if action == 0:
+            history.resize(random.randint(1, 60))
+        elif action == 1:
+            history.clear()
+        elif action == 2:
+            history.restamp(random.randint(0, len(history)), random.randint(0, 1000000))
+        else:
+            history.append(Reading(random.randint(0, 2000000000), 1, random.randint(0, 2) == 0))
+        water_week = [0] * 7
+        for i in range(len(history)):
+            if history.water(i):
+                water_week[localtime(history.epoch(i))[6]] += 1
+        assert history.water_week() == water_week, (seed, step)
+    print(history.timestamp(-1) if len(history) else "empty", "seed", seed, "OK")
@@ -0,0 +1,169 @@
+import uasyncio as asyncio
+from constant import *
+
+HEX = "0123456789abcdefABCDEF"
+
+
+class HttpError(Exception):
+    def __init__(self, status):
+        super().__init__(status)
+        self.status = status
+
+
+def unquote(text):
+    """Percent-decoding of a query or form value, '+' is a space"""
+    if "%" not in text and "+" not in text:
+        return text
+    text = text.replace("+", " ")
+    parts = text.split("%")
+    decoded = bytearray(parts[0].encode("utf-8"))
+    for part in parts[1:]:
+        if len(part) >= 2 and part[0] in HEX and part[1] in HEX:
+            decoded.append(int(part[:2], 16))
+            decoded.extend(part[2:].encode("utf-8"))
+        else:
+            # A lone % is kept as it is
+            decoded.extend(b"%" + part.encode("utf-8"))
+    return decoded.decode("utf-8")
+
+
+def parse_query(query):
+    params = {}
+    for param in query.split("&"):
+        if param:
+            key, _, value = param.partition("=")
+            params[unquote(key)] = unquote(value)
+    return params
+
+
+class HttpRequest:
+    def __init__(self, method, target, version, headers, body=b""):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers  # lower case names
+        self.body = body
+        path, _, query = target.partition("?")
+        self.path = unquote(path)
+        self.params = parse_query(query)
+        if body and headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+            self.params.update(parse_query(body.decode("utf-8")))
+
+    def header(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    @property
+    def keep_alive(self):
+        connection = self.header("Connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+# Incremental parser of the requests of one connection. The head may arrive in any number of reads
+# and bytes past the end of a request are kept for the next one (pipelining). Heads are bounded by
+# MAX_REQUEST_HEAD and bodies by MAX_REQUEST_BODY, so a client cannot make the buffer grow.
+class RequestReader:
+    def __init__(self, reader):
+        self.__reader = reader
+        self.__pending = b""
+
+    async def __fill(self, timeout):
+        data = await asyncio.wait_for(self.__reader.read(MAX_REQUEST_HEAD), timeout)
+        if not data:
+            raise EOFError()
+        self.__pending += data
+
+    async def read(self, timeout=REQUEST_TIMEOUT):
+        """Next request, None when the client closed the connection between two requests.
+        Raises HttpError for a request that cannot be served and asyncio.TimeoutError when idle."""
+        while True:
+            end = self.__pending.find(b"\r\n\r\n")
+            if end >= 0:
+                break
+            if len(self.__pending) >= MAX_REQUEST_HEAD:
+                raise HttpError("431 Request Header Fields Too Large")
+            try:
+                await self.__fill(timeout)
+            except EOFError:
+                if self.__pending:
+                    raise HttpError("400 Bad Request")
+                return None
+        head = self.__pending[:end].decode("utf-8")
+        self.__pending = self.__pending[end + 4:]
+        lines = head.split("\r\n")
+        request_line = lines[0].split(" ")
+        if len(request_line) != 3 or not request_line[2].startswith("HTTP/1."):
+            raise HttpError("400 Bad Request")
+        headers = {}
+        for line in lines[1:]:
+            name, colon, value = line.partition(":")
+            if not colon:
+                raise HttpError("400 Bad Request")
+            headers[name.strip().lower()] = value.strip()
+        length = headers.get("content-length", "0")
+        if not length.isdigit():
+            raise HttpError("400 Bad Request")
+        length = int(length)
+        if length > MAX_REQUEST_BODY:
+            raise HttpError("413 Payload Too Large")
+        while len(self.__pending) < length:
+            try:
+                await self.__fill(timeout)
+            except EOFError:
+                raise HttpError("400 Bad Request")
+        body = self.__pending[:length]
+        self.__pending = self.__pending[length:]
+        return HttpRequest(request_line[0], request_line[1], request_line[2], headers, body)
+
+
+if __name__ == "__main__":
+    print("Test HttpRequest")
+
+    class FakeReader:
+        def __init__(self, pieces):
+            self.pieces = list(pieces)
+
+        async def read(self, n):
+            if not self.pieces:
+                return b""
+            piece = self.pieces.pop(0)
+            assert len(piece) <= n
+            return piece
+
+    async def requests(pieces):
+        reader = RequestReader(FakeReader(pieces))
+        found = []
+        while True:
+            request = await reader.read()
+            if request is None:
+                return found
+            found.append(request)
+
+    assert unquote("09%3A30") == "09:30" and unquote("a+b%20c") == "a b c" and unquote("100%") == "100%"
+    assert unquote("%C3%B1") == "ñ" and parse_query("a=1&b=&c") == {"a": "1", "b": "", "c": ""}
+
+    # Split at every byte, then two pipelined requests in one read
+    raw = b"GET /?humidity=55&start_ban_time=23%3A30 HTTP/1.1\r\nHost: pico\r\nConnection: keep-alive\r\n\r\n"
+    found = asyncio.run(requests([raw[i:i + 1] for i in range(len(raw))]))
+    assert len(found) == 1 and found[0].path == "/" and found[0].params["start_ban_time"] == "23:30"
+    assert found[0].keep_alive and found[0].header("host") == "pico"
+    found = asyncio.run(requests([raw + b"GET /get_data?since=4 HTTP/1.0\r\n\r\n"]))
+    assert [r.path for r in found] == ["/", "/get_data"] and found[1].params == {"since": "4"}
+    assert not found[1].keep_alive
+
+    # Form body with Content-Length, arriving after the head
+    body = b"humidity=60&finish_ban_time=08%3A15"
+    head = "POST / HTTP/1.1\r\nContent-Type: application/x-www-form-urlencoded\r\nContent-Length: {}\r\n\r\n"
+    found = asyncio.run(requests([head.format(len(body)).encode(), body[:5], body[5:]]))
+    assert found[0].params == {"humidity": "60", "finish_ban_time": "08:15"}
+
+    for pieces, status in (([b"GET / HTTP/1.1\r\nX: ", b"a" * MAX_REQUEST_HEAD], "431"),
+                           ([b"GET /\r\n\r\n"], "400"), ([b"GET / HTTP/1.1\r\nHost"], "400"),
+                           ([head.format(MAX_REQUEST_BODY + 1).encode()], "413")):
+        try:
+            asyncio.run(requests(pieces))
+            assert False, status
+        except HttpError as e:
+            assert e.status.startswith(status), e.status
+    print("HttpRequest OK")
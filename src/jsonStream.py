@@ -0,0 +1,133 @@
+import json
+from constant import *
+from historyBuffer import format_date, format_timestamp
+from rollup import SERIES
+
+
+def history_pieces(readings, water_week, last_water, start=0, zone=0):
+    """Small str pieces of the /get_data JSON, byte-identical to json.dumps of the dict.
+    Only the readings from index start are included; full tells the page whether to replace its chart."""
+    length = len(readings)
+    yield '{"timestamps": ['
+    for i in range(start, length):
+        yield '"' + readings.timestamp(i) + ('", ' if i < length - 1 else '"')
+    for key, column in (("soil_moisture", readings.soil_moisture),
+                        ("air_humidity", readings.air_humidity),
+                        ("air_temperature", readings.air_temperature)):
+        yield '], "' + key + '": ['
+        for i in range(start, length):
+            yield str(column(i)) + (', ' if i < length - 1 else '')
+    yield '], "water_week": ' + json.dumps(water_week)
+    yield ', "last_water": ' + json.dumps(last_water)
+    yield ', "seq": ' + str(readings.last_seq) + ', "count": ' + str(length)
+    yield ', "zone": ' + str(zone) + ', "full": ' + ('true' if start == 0 else 'false') + '}'
+
+
+def rollup_pieces(tier, water_week, last_water, zone=0):
+    """Pieces of the /get_data?resolution=hour|day JSON: mean, min and max of every series per bucket"""
+    length = len(tier)
+    label = format_timestamp if tier.seconds < 86400 else format_date
+    yield '{"resolution": "' + tier.name + '", "timestamps": ['
+    for i in range(length):
+        yield '"' + label(tier.epoch(i)) + ('", ' if i < length - 1 else '"')
+    for s, key in enumerate(SERIES):
+        for suffix, column in (("", tier.mean), ("_min", tier.minimum), ("_max", tier.maximum)):
+            yield '], "' + key + suffix + '": ['
+            for i in range(length):
+                yield str(column(s, i)) + (', ' if i < length - 1 else '')
+    yield '], "water": ['
+    for i in range(length):
+        yield str(tier.water(i)) + (', ' if i < length - 1 else '')
+    yield '], "water_week": ' + json.dumps(water_week)
+    yield ', "last_water": ' + json.dumps(last_water)
+    yield ', "count": ' + str(length) + ', "zone": ' + str(zone) + ', "full": true}'
+
+
+# MicroPython str has the buffer protocol: its UTF-8 bytes are copied without an encoded copy
+try:
+    memoryview("")
+    STR_BUFFER = True
+except TypeError:
+    STR_BUFFER = False
+
+
+def stream_chunks(pieces, buffer):
+    """Pack str or bytes pieces into the reused buffer, yielding a memoryview every time it is full.
+    The view is only valid until the generator is resumed."""
+    view = memoryview(buffer)
+    size = len(buffer)
+    used = 0
+    for piece in pieces:
+        if isinstance(piece, str):
+            piece = memoryview(piece) if STR_BUFFER else piece.encode("utf-8")
+        length = len(piece)
+        if length < size - used:
+            # Fast path: the piece fits without filling the buffer
+            view[used:used + length] = piece
+            used += length
+            continue
+        data = memoryview(piece)
+        start = 0
+        while start < length:
+            n = min(length - start, size - used)
+            view[used:used + n] = data[start:start + n]
+            used += n
+            start += n
+            if used == size:
+                yield view
+                used = 0
+    if used:
+        yield view[:used]
+
+
+if __name__ == "__main__":
+    print("Test jsonStream")
+    from historyBuffer import HistoryBuffer
+
+    class Reading:
+        def __init__(self, epoch, value, water=False):
+            self.epoch = epoch
+            self.soil_moisture = value
+            self.air_humidity = value / 3
+            self.air_temperature = value - 40
+            self.water = water
+
+    for size in (0, 1, 7, 500):
+        history = HistoryBuffer(max(size, 1))
+        for i in range(size):
+            history.append(Reading(1700000000 + i * 1800, i * 0.37, i % 5 == 0))
+        water_week = [i * size % 4 for i in range(7)]
+        for start in range(0, len(history) + 1, 3):
+            expected = json.dumps({
+                "timestamps": [history.timestamp(i) for i in range(start, len(history))],
+                "soil_moisture": [history.soil_moisture(i) for i in range(start, len(history))],
+                "air_humidity": [history.air_humidity(i) for i in range(start, len(history))],
+                "air_temperature": [history.air_temperature(i) for i in range(start, len(history))],
+                "water_week": water_week,
+                "last_water": "Mon/10:00:00",
+                "seq": history.last_seq,
+                "count": len(history),
+                "zone": size % 3,
+                "full": start == 0
+            }).encode("utf-8")
+            for chunk_size in (1, 13, CHUNK_SIZE):
+                pieces = history_pieces(history, water_week, "Mon/10:00:00", start, size % 3)
+                streamed = b"".join(bytes(chunk) for chunk in stream_chunks(pieces, bytearray(chunk_size)))
+                assert streamed == expected, (size, start, chunk_size)
+
+    from rollup import Rollup
+    rollup = Rollup()
+    for i in range(100):
+        rollup.add(1700000000 + i * 1800, (i, i * 3, -i), i % 4 == 0)
+    for tier in rollup.tiers:
+        label = format_timestamp if tier.seconds < 86400 else format_date
+        expected = {"resolution": tier.name, "timestamps": [label(tier.epoch(i)) for i in range(len(tier))]}
+        for s, key in enumerate(SERIES):
+            expected[key] = [tier.mean(s, i) for i in range(len(tier))]
+            expected[key + "_min"] = [tier.minimum(s, i) for i in range(len(tier))]
+            expected[key + "_max"] = [tier.maximum(s, i) for i in range(len(tier))]
+        expected.update({"water": [tier.water(i) for i in range(len(tier))], "water_week": [1] * 7,
+                         "last_water": "", "count": len(tier), "zone": 0, "full": True})
+        streamed = b"".join(bytes(chunk) for chunk in stream_chunks(rollup_pieces(tier, [1] * 7, ""), bytearray(CHUNK_SIZE)))
+        assert streamed == json.dumps(expected).encode("utf-8"), tier.name
+    print("OK")
@@ -1,13 +1,15 @@
 from machine import Pin, reset
-from time import sleep, time, localtime
+from time import sleep, time, localtime, ticks_ms, ticks_diff
 from collections import deque
 import uasyncio as asyncio
-import ntptime
 
-from relayManager import RelayManager
 from sensorManager import Data, SensorManager
+from historyBuffer import format_timestamp
+from zone import Zone, PumpPool
 from webServer import WebServer
+from networkManager import NetworkManager, backoff
 from displayManager import DisplayManager
+from scheduler import Scheduler
 from constant import *
 
 
@@ -15,59 +17,130 @@ class Main:
     def __init__(self):
         self.display_manager = DisplayManager()
         self.display_manager.show_message("Creating objet")
-        self.sensor_manager = SensorManager()
-        self.relay_manager = RelayManager()
+        self.zones = [Zone(i, *ZONES[i]) for i in range(len(ZONES))]
+        self.sensor_manager = SensorManager(DHT_PIN, [(zone.soil_pin, zone.mux_channel) for zone in self.zones])
+        self.pumps = PumpPool()
         self.display_manager.show_message("Generaring webServer")
-        self.web_server = WebServer()
-        ntptime.settime()
-        self.display_manager.show_message(f"Web in ip:       {self.web_server.get_IP()}")
-        self.last_reading_time = time()
+        self.web_server = WebServer(self.zones)
+        self.web_server.on_clients = self.display_manager.post_clients
+        self.metrics = self.web_server.metrics
+        # WiFi, NTP and the server bind run as tasks in run(), nothing here waits for the network
+        self.network_manager = NetworkManager()
+        self.display_manager.show_message("Connecting WiFi")
+        self.scheduler = Scheduler()
+        self.metrics.schedule(self.scheduler)
+        self.last_reading = None
+        self.reading_job = None
+        self.schedule_readings()
+        self.web_server.on_reading_interval = self.schedule_readings
 
+    def schedule_readings(self):
+        # Counted from the last reading, a new interval takes effect without waiting out the old one.
+        # The first reading is taken as soon as the loop runs
+        self.scheduler.cancel(self.reading_job)
+        interval = self.web_server.reading_interval * 1000
+        first = self.scheduler.now() if self.last_reading is None else self.last_reading + interval
+        self.reading_job = self.scheduler.every(interval, self.sensors, first)
+
+    def banned(self):
+        # Until NTP set the clock the time of day is unknown, the plants are watered when they need it
+        now = time()
+        return now >= VALID_EPOCH and self.web_server.ban_window.banned(now)
 
     async def sensors(self):
-        while True:
+        # All zones are read in one pass, the ones that need water are watered concurrently
+        try:
+            self.last_reading = self.scheduler.now()
+            start = ticks_ms()
+            readings = await self.sensor_manager.acquire()
+            self.metrics.sensor_read.observe(ticks_diff(ticks_ms(), start))
+            self.metrics.dht_failures = self.sensor_manager.dht_failures
+
+            banned = self.banned()
+            for zone, data in zip(self.zones, readings):
+                if zone.busy:
+                    # Still watering from the previous reading, which it records when done
+                    continue
+                if data.soil_moisture < zone.needed_soil_moisture and not banned:
+                    zone.busy = True
+                    asyncio.create_task(self.water(zone, data))
+                else:
+                    self.record(zone, data)
+        except Exception as e:
+            self.fail(e)
+
+    async def water(self, zone, data):
+        # Waits its turn when MAX_PUMPS pumps already run
+        try:
+            self.metrics.pumps_waiting += 1
+            await self.pumps.acquire()
+            self.metrics.pumps_waiting -= 1
             try:
-                current_time = time()
-                if current_time - self.last_reading_time >= self.web_server.reading_interval:
-                    data = self.sensor_manager.read_sensors()
-                    
-                    if data.soil_moisture < self.web_server.needed_soil_moisture:  
-                        finish_ban_seconds = self.web_server.time_to_seconds(self.web_server.finish_ban_time)
-                        start_ban_seconds = self.web_server.time_to_seconds(self.web_server.start_ban_time)
-                        if finish_ban_seconds <  current_time % 86400 < start_ban_seconds:
-                            self.relay_manager.on()
-                            await asyncio.sleep(self.web_server.time_water)
-                            self.relay_manager.off()
-                            self.web_server.last_water = f"{DAY[localtime()[6]]}/{localtime()[3]:02d}:{localtime()[4]:02d}:{localtime()[5]:02d}"
-                            data.water = True
-                        
-                    self.web_server.add_reading(data)
-                    self.display_manager.show_data(data, self.web_server.last_water, self.web_server.get_water_week())
-                    
-                    self.last_reading_time = current_time
-                await asyncio.sleep(4)
-            except Exception as e:
-                self.display_manager.show_message(str(e))
-                sleep(5)
-                reset()
+                # The wait may have run into the ban window
+                if not self.banned():
+                    start = ticks_ms()
+                    self.metrics.pumps = self.pumps.running
+                    self.web_server.publish_watering(zone, zone.time_water)
+                    zone.relay.on()
+                    await asyncio.sleep(zone.time_water)
+                    zone.relay.off()
+                    self.metrics.watering.observe(ticks_diff(ticks_ms(), start))
+                    zone.last_water = format_timestamp(time())
+                    data.water = True
+            finally:
+                self.pumps.release()
+                self.metrics.pumps = self.pumps.running
+            self.record(zone, data)
+        except Exception as e:
+            self.fail(e)
+        finally:
+            zone.busy = False
+
+    def record(self, zone, data):
+        self.web_server.add_reading(zone, data)
+        self.display_manager.post_data(data, zone.last_water, zone.water_week(), zone.index)
+        if not self.metrics.first_reading_ms:
+            self.metrics.first_reading_ms = ticks_ms()
+
+    def fail(self, e):
+        self.display_manager.show_message(str(e))
+        self.web_server.flush_log()
+        sleep(5)
+        reset()
+
+    async def network(self):
+        # WiFi first, then the clock, the web server and the WiFi watch side by side
+        try:
+            await self.network_manager.connect()
+            await asyncio.gather(self.sync_clock(), self.handle_web_server(), self.network_manager.watch())
+        except Exception as e:
+            self.fail(e)
+
+    async def sync_clock(self):
+        jump = await self.network_manager.sync_time()
+        self.metrics.clock_ms = ticks_ms()
+        for zone in self.zones:
+            zone.restamp(jump)
 
     async def handle_web_server(self):
+        delay = BOOT_RETRY_MIN
         while True:
             try:
-                client, addr = self.web_server.server.accept()
-                print(f"Client connected from: {addr}")
-                self.web_server.handle_request(client)
-            except OSError:
-                await asyncio.sleep(0.1)
-            except Exception as e:
-                self.display_manager.show_message(str(e))
-                sleep(5)
-                reset()
-        
+                server = await self.web_server.start()
+                break
+            except OSError as e:
+                print("Error while starting the server:", e, "retrying in", delay, "s")
+                await asyncio.sleep(delay)
+                delay = backoff(delay)
+        self.metrics.boot_ms = ticks_ms()
+        self.display_manager.post_message(f"Web in ip:       {self.network_manager.ip}")
+        await server.wait_closed()
+
     async def run(self):
         await asyncio.gather(
-            self.handle_web_server(),
-            self.sensors()
+            self.network(),
+            self.scheduler.run(),
+            self.display_manager.run()
         )
 
 # Ejecutar el programa
@@ -0,0 +1,160 @@
+import gc
+import machine
+from array import array
+from time import ticks_ms, ticks_diff
+from constant import *
+
+ROUTES = ("/", "/get_data", "/metrics", "/static", "/events", "/export.csv", "other")  # other: answered 404
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)  # ms
+WATERING_BUCKETS = (4000, 6000, 8000, 10000, 12000, 15000, 20000)  # ms, MIN_TIME_WATER..MAX_TIME_WATER
+RESET_CAUSES = (("PWRON_RESET", "power_on"), ("HARD_RESET", "hard"), ("WDT_RESET", "watchdog"),
+                ("DEEPSLEEP_RESET", "deepsleep"), ("SOFT_RESET", "soft"))
+
+
+def seconds(ms):
+    return "{}.{:03d}".format(ms // 1000, ms % 1000)
+
+
+# Prometheus histogram of millisecond durations, optionally one series per label value.
+# Counts and sums live in arrays allocated once, observing never allocates.
+class Histogram:
+    def __init__(self, name, help, buckets, label=None, values=("",)):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.values = values
+        self.__counts = array('I', [0] * ((len(buckets) + 1) * len(values)))
+        self.__sums = array('I', [0] * len(values))  # ms, wraps after 49 days of total duration
+        # Label strings are built once, rendering only formats the numbers
+        self.__labels = []
+        self.__series = []
+        for value in values:
+            prefix = '{}="{}",'.format(label, value) if label else ""
+            self.__labels.append(['{' + prefix + 'le="' + seconds(bound) + '"}' for bound in buckets] +
+                                 ['{' + prefix + 'le="+Inf"}'])
+            self.__series.append('{' + prefix[:-1] + '}' if label else "")
+
+    def observe(self, ms, series=0):
+        i = 0
+        while i < len(self.buckets) and ms > self.buckets[i]:
+            i += 1
+        self.__counts[series * (len(self.buckets) + 1) + i] += 1
+        self.__sums[series] += ms
+
+    def count(self, series=0):
+        start = series * (len(self.buckets) + 1)
+        return sum(self.__counts[start:start + len(self.buckets) + 1])
+
+    def pieces(self):
+        yield "# HELP {} {}\n# TYPE {} histogram\n".format(self.name, self.help, self.name)
+        for series, labels in enumerate(self.__labels):
+            total = 0
+            start = series * (len(self.buckets) + 1)
+            for i, label in enumerate(labels):
+                total += self.__counts[start + i]
+                yield "{}_bucket{} {}\n".format(self.name, label, total)
+            yield "{}_sum{} {}\n{}_count{} {}\n".format(self.name, self.__series[series], seconds(self.__sums[series]),
+                                                      self.name, self.__series[series], total)
+
+
+# Everything the device knows about its own health, rendered as Prometheus text at /metrics.
+# The number of series is fixed, so the page costs the same after a thousand requests as after one.
+class Metrics:
+    def __init__(self):
+        self.loop_lag = Histogram("spw_loop_lag_seconds", "How late scheduled jobs started", LATENCY_BUCKETS)
+        self.request = Histogram("spw_request_duration_seconds", "Time to answer a request", LATENCY_BUCKETS,
+                                 "route", ROUTES)
+        self.sensor_read = Histogram("spw_sensor_read_duration_seconds", "Time to read the soil and air sensors",
+                                     LATENCY_BUCKETS + (10000,))
+        self.watering = Histogram("spw_watering_duration_seconds", "How long the pump ran", WATERING_BUCKETS)
+        self.gc_pause = Histogram("spw_gc_pause_seconds", "Duration of a gc.collect()", LATENCY_BUCKETS)
+        self.client_errors = 0
+        self.dht_failures = 0
+        self.clients = 0
+        self.readings = 0
+        self.pumps = 0  # running
+        self.pumps_waiting = 0  # zones that need water waiting for a pump
+        self.subscribers = 0
+        self.events_published = 0
+        self.events_dropped = 0
+        self.boot_ms = 0  # ms from power on until the web server listened
+        self.first_reading_ms = 0  # ms from power on until the first reading was recorded
+        self.clock_ms = 0  # ms from power on until NTP set the clock
+        self.mem_free = gc.mem_free()
+        self.mem_alloc = gc.mem_alloc()
+        cause = machine.reset_cause()
+        self.reset_cause = "unknown"
+        for attribute, name in RESET_CAUSES:
+            if getattr(machine, attribute, None) == cause:
+                self.reset_cause = name
+                break
+
+    def route(self, path):
+        """Index of the route of a request path without its query, the last one for anything unknown.
+        Only the assets match by prefix, as files under /static/"""
+        for i in range(len(ROUTES) - 1):
+            if path == ROUTES[i] or (ROUTES[i] == "/static" and path.startswith("/static/")):
+                return i
+        return len(ROUTES) - 1
+
+    def pieces(self):
+        for histogram in (self.loop_lag, self.request, self.sensor_read, self.watering, self.gc_pause):
+            yield from histogram.pieces()
+        yield "# TYPE spw_client_errors_total counter\nspw_client_errors_total {}\n".format(self.client_errors)
+        yield "# TYPE spw_dht_failures_total counter\nspw_dht_failures_total {}\n".format(self.dht_failures)
+        yield "# TYPE spw_clients gauge\nspw_clients {}\n".format(self.clients)
+        yield "# TYPE spw_readings gauge\nspw_readings {}\n".format(self.readings)
+        yield "# TYPE spw_pumps gauge\nspw_pumps {}\n".format(self.pumps)
+        yield "# TYPE spw_pumps_waiting gauge\nspw_pumps_waiting {}\n".format(self.pumps_waiting)
+        yield "# TYPE spw_sse_subscribers gauge\nspw_sse_subscribers {}\n".format(self.subscribers)
+        yield "# TYPE spw_sse_events_total counter\nspw_sse_events_total {}\n".format(self.events_published)
+        yield "# TYPE spw_sse_dropped_total counter\nspw_sse_dropped_total {}\n".format(self.events_dropped)
+        yield "# TYPE spw_mem_free_bytes gauge\nspw_mem_free_bytes {}\n".format(self.mem_free)
+        yield "# TYPE spw_mem_alloc_bytes gauge\nspw_mem_alloc_bytes {}\n".format(self.mem_alloc)
+        yield "# TYPE spw_boot_seconds gauge\nspw_boot_seconds {}\n".format(seconds(self.boot_ms))
+        yield "# TYPE spw_first_reading_seconds gauge\nspw_first_reading_seconds {}\n".format(seconds(self.first_reading_ms))
+        yield "# TYPE spw_clock_set_seconds gauge\nspw_clock_set_seconds {}\n".format(seconds(self.clock_ms))
+        yield "# TYPE spw_uptime_seconds gauge\nspw_uptime_seconds {}\n".format(ticks_ms() // 1000)
+        yield '# TYPE spw_reset_cause gauge\nspw_reset_cause{{cause="{}"}} 1\n'.format(self.reset_cause)
+
+    def schedule(self, scheduler):
+        """Loop lag is how late the scheduler starts its jobs, every task that hogs the loop shows up there.
+        The regular collection keeps the automatic ones, which happen in the middle of a request, short."""
+        scheduler.lag = self.loop_lag
+        scheduler.every(METRICS_INTERVAL, self.probe)
+        scheduler.every(METRICS_GC_INTERVAL, self.collect)
+
+    async def probe(self):
+        # Keeps lag samples coming between the rare sensor readings, the scheduler did the measuring
+        pass
+
+    async def collect(self):
+        start = ticks_ms()
+        gc.collect()
+        self.gc_pause.observe(ticks_diff(ticks_ms(), start))
+        self.mem_free = gc.mem_free()
+        self.mem_alloc = gc.mem_alloc()
+
+if __name__ == "__main__":
+    print("Test Metrics")
+    metrics = Metrics()
+    for ms in (0, 1, 3, 7, 700, 99999):
+        metrics.request.observe(ms, 1)
+    metrics.request.observe(12, 0)
+    metrics.watering.observe(5000)
+    assert metrics.request.count(1) == 6 and metrics.request.count(0) == 1 and metrics.request.count(2) == 0
+    assert metrics.route("/static/app.js") == 3 and metrics.route("/staticfoo") == 6
+    assert metrics.route("/export.csv") == 5 and metrics.route("/get_data") == 1 and metrics.route("/metrics") == 2 and metrics.route("/") == 0
+    assert metrics.route("/get_dataX") == 6 and metrics.route("/metrics/x") == 6 and metrics.route("/events2") == 6
+    assert metrics.route("other") == 6 and metrics.route("/index.html") == 6
+    text = "".join(metrics.pieces())
+    assert 'spw_request_duration_seconds_bucket{route="/get_data",le="0.005"} 3\n' in text
+    assert 'spw_request_duration_seconds_bucket{route="/get_data",le="+Inf"} 6\n' in text
+    assert 'spw_request_duration_seconds_sum{route="/get_data"} 100.710\n' in text
+    assert "spw_watering_duration_seconds_count 1\n" in text
+    assert 'spw_loop_lag_seconds_bucket{le="0.001"} 0\n' in text
+    # Same series whatever the request volume
+    for i in range(1000):
+        metrics.request.observe(i % 50, i % len(ROUTES))
+    assert "".join(metrics.pieces()).count("\n") == text.count("\n")
+    print(text)
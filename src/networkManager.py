@@ -0,0 +1,93 @@
+import network
+import ntptime
+import uasyncio as asyncio
+from time import time, ticks_ms, ticks_diff
+from constant import *
+from wifi import *
+
+
+def backoff(delay):
+    """Next wait between two retries, doubled up to BOOT_RETRY_MAX"""
+    return min(delay * 2, BOOT_RETRY_MAX)
+
+
+# Brings the station up, keeps it up and sets the clock over NTP as tasks beside the sensors.
+# Every attempt has a timeout and the retries back off exponentially, so a router that is down
+# neither blocks the loop nor resets the board.
+class NetworkManager:
+    def __init__(self):
+        self.__wlan = network.WLAN(network.STA_IF)
+        self.attempts = 0  # associations tried since boot
+
+    @property
+    def ip(self):
+        return self.__wlan.ifconfig()[0]
+
+    def isconnected(self):
+        return self.__wlan.isconnected()
+
+    async def connect(self):
+        """Associate, retrying until it works. The radio is power cycled after MAX_ATTEMPTS failures in a row"""
+        delay = BOOT_RETRY_MIN
+        failures = 0
+        while not await self.__associate():
+            failures += 1
+            print("WiFi not connected, retrying in", delay, "s")
+            if failures % MAX_ATTEMPTS == 0:
+                self.__wlan.active(False)
+            await asyncio.sleep(delay)
+            delay = backoff(delay)
+        print("Connected to WiFi:", self.__wlan.ifconfig())
+
+    async def __associate(self):
+        wlan = self.__wlan
+        self.attempts += 1
+        wlan.active(True)
+        wlan.connect(SSID, PASSWORD)
+        start = ticks_ms()
+        while not wlan.isconnected():
+            if ticks_diff(ticks_ms(), start) >= WIFI_CONNECT_TIMEOUT:
+                wlan.disconnect()
+                return False
+            await asyncio.sleep_ms(WIFI_POLL_INTERVAL)
+        return True
+
+    async def watch(self):
+        """Reconnect whenever the station drops"""
+        while True:
+            await asyncio.sleep(WIFI_CHECK_INTERVAL)
+            if not self.__wlan.isconnected():
+                print("WiFi lost")
+                await self.connect()
+
+    async def sync_time(self):
+        """Set the clock over NTP, retrying until it works. Returns the seconds it jumped.
+        settime() itself blocks for up to ntptime.timeout."""
+        delay = BOOT_RETRY_MIN
+        while True:
+            before = time()
+            start = ticks_ms()
+            try:
+                ntptime.settime()
+                return time() - before - ticks_diff(ticks_ms(), start) // 1000
+            except OSError as e:
+                print("NTP failed:", e, "retrying in", delay, "s")
+            await asyncio.sleep(delay)
+            delay = backoff(delay)
+
+
+if __name__ == "__main__":
+    print("Test NetworkManager")
+    assert backoff(BOOT_RETRY_MIN) == 2 * BOOT_RETRY_MIN and backoff(BOOT_RETRY_MAX) == BOOT_RETRY_MAX
+
+    async def test():
+        manager = NetworkManager()
+        start = ticks_ms()
+        await manager.connect()
+        print("connected to", manager.ip, "after", manager.attempts, "attempts in", ticks_diff(ticks_ms(), start), "ms")
+        jump = await manager.sync_time()
+        assert time() >= VALID_EPOCH
+        print("clock moved by", jump, "s")
+
+    asyncio.run(test())
+    print("OK")
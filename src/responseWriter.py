@@ -0,0 +1,124 @@
+import uasyncio as asyncio
+from constant import *
+from jsonStream import stream_chunks
+
+FRAME = 6  # chunk size line before the payload: four hex digits and CRLF, CRLF after it
+HEX = b"0123456789abcdef"
+LAST_CHUNK = b"0\r\n\r\n"
+KEEP_ALIVE = f"keep-alive\r\nKeep-Alive: timeout={KEEP_ALIVE_TIMEOUT}"
+
+
+# Sends every response through one preallocated buffer: heads, streamed bodies with their chunk
+# framing written in place around the payload, and files read straight into it. Each full buffer is
+# one write, drained before the buffer is filled again, so at most one buffer waits in a stream and a
+# slow client only holds back its own response; the stream resends what a short write left over.
+# Nothing stays in the buffer across an await, which lets all connections share it.
+class ResponseWriter:
+    def __init__(self, size=CHUNK_SIZE):
+        if not 0 < size <= 0xFFFF:
+            raise ValueError("chunk size must fit four hex digits")
+        self.__buffer = bytearray(FRAME + size + 2)
+        self.__view = memoryview(self.__buffer)
+        self.__payload = self.__view[FRAME:FRAME + size]
+        self.sent = 0  # bytes handed to the streams
+
+    @property
+    def size(self):
+        return len(self.__payload)
+
+    async def send(self, writer, data):
+        """Write bytes and wait until the stream took them"""
+        writer.write(data)
+        self.sent += len(data)
+        await asyncio.wait_for(writer.drain(), REQUEST_TIMEOUT)
+
+    async def send_head(self, writer, status, keep_alive, headers=""):
+        """Status line and headers, headers being complete "Name: value\\r\\n" lines"""
+        await self.send_pieces(writer, ("HTTP/1.1 ", status, "\r\n", headers, "Connection: ",
+                                        KEEP_ALIVE if keep_alive else "close", "\r\n\r\n"))
+
+    async def send_pieces(self, writer, pieces, chunked=False):
+        """str or bytes pieces packed into the buffer, one write per full buffer"""
+        buffer = self.__buffer
+        for chunk in stream_chunks(pieces, self.__payload):
+            n = len(chunk)
+            if chunked:
+                for digit in range(4):
+                    buffer[3 - digit] = HEX[(n >> (4 * digit)) & 15]
+                buffer[4] = buffer[FRAME + n] = 13
+                buffer[5] = buffer[FRAME + n + 1] = 10
+                chunk = self.__view[:FRAME + n + 2]
+            await self.send(writer, chunk)
+        if chunked:
+            await self.send(writer, LAST_CHUNK)
+
+    async def send_file(self, writer, path):
+        """A file as it is, read into the buffer"""
+        payload = self.__payload
+        with open(path, "rb") as f:
+            while True:
+                n = f.readinto(payload)
+                if not n:
+                    break
+                await self.send(writer, payload if n == len(payload) else payload[:n])
+
+
+if __name__ == "__main__":
+    print("Test ResponseWriter")
+
+    class Stream:
+        """Takes at most limit bytes per write like a full socket, the rest waits for drain"""
+
+        def __init__(self, limit):
+            self.limit = limit
+            self.data = bytearray()
+            self.pending = b""
+            self.writes = 0
+
+        def write(self, data):
+            self.writes += 1
+            self.pending = bytes(data)
+
+        async def drain(self):
+            while self.pending:
+                self.data += self.pending[:self.limit]
+                self.pending = self.pending[self.limit:]
+                await asyncio.sleep(0)
+
+    def dechunk(body):
+        decoded = b""
+        while True:
+            line, _, body = body.partition(b"\r\n")
+            n = int(line, 16)
+            if n == 0:
+                assert body == b"\r\n"
+                return decoded
+            decoded += body[:n]
+            assert body[n:n + 2] == b"\r\n"
+            body = body[n + 2:]
+
+    pieces = ["héllo ", b"world ", "x" * 700] + [str(i) + "," for i in range(300)]
+    expected = b"".join(piece.encode("utf-8") if isinstance(piece, str) else piece for piece in pieces)
+
+    async def test():
+        other = Stream(7)
+        for size in (1, 13, 64, 512):
+            response = ResponseWriter(size)
+            stream = Stream(5)
+            # Two responses at once on the same buffer
+            await asyncio.gather(response.send_pieces(stream, pieces, True), response.send_pieces(other, pieces, False))
+            assert dechunk(bytes(stream.data)) == expected, size
+            assert bytes(other.data) == expected
+            other.data = bytearray()
+            assert stream.writes == (len(expected) + size - 1) // size + 1
+        stream = Stream(1000)
+        await response.send_head(stream, "200 OK", True, "Content-Length: 0\r\n")
+        head = "HTTP/1.1 200 OK\r\nContent-Length: 0\r\nConnection: " + KEEP_ALIVE + "\r\n\r\n"
+        assert bytes(stream.data) == head.encode()
+        stream = Stream(100)
+        await response.send_file(stream, __file__)
+        with open(__file__, "rb") as f:
+            assert bytes(stream.data) == f.read()
+
+    asyncio.run(test())
+    print("OK")
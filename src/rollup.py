@@ -0,0 +1,190 @@
+import os
+import struct
+from array import array
+from constant import *
+from historyBuffer import to_fixed
+
+SERIES = ("soil_moisture", "air_humidity", "air_temperature")
+BUCKET_SIZE = 4 + len(SERIES) * (2 + 2 + 4) + 2 + 2  # bytes of one bucket: start, min, max, sum, count, water
+# magic, version, last_epoch, then the capacity of every tier; a file saved with other capacities is discarded
+MAGIC = b"SPWR"
+VERSION = 1
+HEADER = "<4sBI"
+
+
+# Fixed-size ring of time buckets keeping min/max/sum/count per series and the number of waterings.
+# Values are HISTORY_SCALE fixed point like in HistoryBuffer.
+class RollupTier:
+    def __init__(self, name, seconds, capacity):
+        self.name = name
+        self.seconds = seconds
+        self.capacity = capacity
+        self.__start = array('I', [0] * capacity)
+        self.__min = [array('h', [0] * capacity) for _ in SERIES]
+        self.__max = [array('h', [0] * capacity) for _ in SERIES]
+        self.__sum = [array('i', [0] * capacity) for _ in SERIES]
+        self.__count = array('H', [0] * capacity)
+        self.__water = array('H', [0] * capacity)
+        self.__head = 0
+        self.__length = 0
+
+    def __len__(self):
+        return self.__length
+
+    def __index(self, i):
+        if i < 0:
+            i += self.__length
+        if not 0 <= i < self.__length:
+            raise IndexError("rollup index out of range")
+        return (self.__head + i) % self.capacity
+
+    def add(self, epoch, values, water):
+        """Fold a reading into its bucket, returns True when a new bucket was started"""
+        start = epoch - epoch % self.seconds
+        if self.__length and start <= self.__start[self.__index(-1)]:
+            # Same bucket, or the clock went back: fold into the newest one
+            i = self.__index(-1)
+            for s, value in enumerate(values):
+                if value < self.__min[s][i]:
+                    self.__min[s][i] = value
+                if value > self.__max[s][i]:
+                    self.__max[s][i] = value
+                self.__sum[s][i] += value
+            if self.__count[i] < 65535:
+                self.__count[i] += 1
+            if water:
+                self.__water[i] += 1
+            return False
+        if self.__length < self.capacity:
+            i = (self.__head + self.__length) % self.capacity
+            self.__length += 1
+        else:
+            i = self.__head
+            self.__head = (self.__head + 1) % self.capacity
+        self.__start[i] = start
+        for s, value in enumerate(values):
+            self.__min[s][i] = value
+            self.__max[s][i] = value
+            self.__sum[s][i] = value
+        self.__count[i] = 1
+        self.__water[i] = 1 if water else 0
+        return True
+
+    def epoch(self, i):
+        return self.__start[self.__index(i)]
+
+    def mean(self, s, i):
+        i = self.__index(i)
+        return round(self.__sum[s][i] / self.__count[i] / HISTORY_SCALE, 2)
+
+    def minimum(self, s, i):
+        return self.__min[s][self.__index(i)] / HISTORY_SCALE
+
+    def maximum(self, s, i):
+        return self.__max[s][self.__index(i)] / HISTORY_SCALE
+
+    def water(self, i):
+        return self.__water[self.__index(i)]
+
+    def columns(self):
+        return [self.__start, self.__count, self.__water] + self.__min + self.__max + self.__sum
+
+    def file_size(self):
+        return 4 + self.capacity * BUCKET_SIZE
+
+    def save(self, f):
+        f.write(struct.pack("<HH", self.__head, self.__length))
+        for column in self.columns():
+            f.write(column)
+
+    def load(self, f):
+        head, length = struct.unpack("<HH", f.read(4))
+        if head >= self.capacity or length > self.capacity:
+            raise ValueError("rollup tier out of range")
+        self.__head, self.__length = head, length
+        for column in self.columns():
+            f.readinto(column)
+
+
+# Hourly and daily tiers next to the raw history, with a fixed memory budget each
+class Rollup:
+    def __init__(self):
+        self.tiers = (RollupTier("hour", 3600, ROLLUP_HOURS), RollupTier("day", 86400, ROLLUP_DAYS))
+        self.last_epoch = 0
+
+    def tier(self, name):
+        for tier in self.tiers:
+            if tier.name == name:
+                return tier
+        return None
+
+    def add(self, epoch, values, water):
+        """Returns True when a new day was started"""
+        self.last_epoch = epoch
+        new_bucket = False
+        for tier in self.tiers:
+            new_bucket = tier.add(epoch, values, water)
+        return new_bucket
+
+    def add_reading(self, data):
+        return self.add(int(data.epoch), (to_fixed(data.soil_moisture), to_fixed(data.air_humidity),
+                                          to_fixed(data.air_temperature)), data.water)
+
+    def header(self):
+        return struct.pack(HEADER + "H" * len(self.tiers), MAGIC, VERSION, self.last_epoch,
+                           *[tier.capacity for tier in self.tiers])
+
+    def save(self, path):
+        # Written aside and renamed, so a reset mid-write keeps the previous file whole
+        with open(path + ".tmp", "wb") as f:
+            f.write(self.header())
+            for tier in self.tiers:
+                tier.save(f)
+        os.rename(path + ".tmp", path)
+
+    def load(self, path):
+        try:
+            header_size = len(self.header())
+            if os.stat(path)[6] != header_size + sum(tier.file_size() for tier in self.tiers):
+                raise ValueError("wrong size")
+            with open(path, "rb") as f:
+                fields = struct.unpack(HEADER + "H" * len(self.tiers), f.read(header_size))
+                if fields[0] != MAGIC or fields[1] != VERSION or list(fields[3:]) != [tier.capacity for tier in self.tiers]:
+                    raise ValueError("saved with other tier sizes")
+                self.last_epoch = fields[2]
+                for tier in self.tiers:
+                    tier.load(f)
+        except (OSError, ValueError) as e:
+            print("Rollup not loaded:", e)
+            self.__init__()
+
+
+if __name__ == "__main__":
+    print("Test Rollup")
+    rollup = Rollup()
+    hour = rollup.tier("hour")
+    day = rollup.tier("day")
+    for i in range(ROLLUP_HOURS * 3600 // 600 + 12):
+        rollup.add(86400 * 10 + i * 600, (i % 6 * 100, 5000, -i), i % 6 == 0)
+    assert len(hour) == ROLLUP_HOURS and len(day) == ROLLUP_HOURS // 24 + 1
+    assert hour.minimum(0, -1) == 0 and hour.maximum(0, -1) == 5 and hour.mean(0, -1) == 2.5
+    assert hour.water(-1) == 1 and day.water(0) == 24 and day.mean(1, 0) == 50
+    assert day.epoch(1) - day.epoch(0) == 86400
+    rollup.save("rollup.test")
+    copy = Rollup()
+    assert "rollup.test.tmp" not in os.listdir()
+    copy.load("rollup.test")
+    assert copy.last_epoch == rollup.last_epoch and copy.tier("hour").mean(2, 5) == hour.mean(2, 5)
+    # Saved with other ROLLUP_HOURS or ROLLUP_DAYS, or torn: rebuilt from the history instead
+    with open("rollup.test", "r+b") as f:
+        f.seek(struct.calcsize(HEADER))
+        f.write(struct.pack("<HH", ROLLUP_DAYS, ROLLUP_HOURS))
+    copy.load("rollup.test")
+    assert copy.last_epoch == 0 and len(copy.tier("hour")) == 0
+    rollup.save("rollup.test")
+    with open("rollup.test", "ab") as f:
+        f.write(b"x")
+    copy.load("rollup.test")
+    assert copy.last_epoch == 0 and len(copy.tier("day")) == 0
+    os.remove("rollup.test")
+    print("OK")
@@ -0,0 +1,150 @@
+from heapq import heappush, heappop
+from time import ticks_ms, ticks_diff
+import uasyncio as asyncio
+
+
+# Timer heap: jobs are coroutine functions started at a deadline in ms of the scheduler clock,
+# once or every interval. A single task sleeps exactly until the earliest deadline, so nothing
+# wakes up just to check the time. A repeating job never runs twice at once: a deadline that
+# comes while the previous run is still going is skipped.
+class Scheduler:
+    def __init__(self):
+        self.__heap = []
+        self.__seq = 0  # keeps jobs with the same deadline in insertion order
+        self.__ticks = ticks_ms()
+        self.__now = 0
+        self.__changed = asyncio.Event()
+        self.lag = None  # histogram, given how late each job started
+        self.skipped = 0  # deadlines of repeating jobs dropped because the previous run had not finished
+
+    def now(self):
+        """Monotonic ms since the scheduler was created, ticks_ms without the wrap around"""
+        ticks = ticks_ms()
+        self.__now += ticks_diff(ticks, self.__ticks)
+        self.__ticks = ticks
+        return self.__now
+
+    def at(self, deadline, job, interval=0):
+        """Start job() at deadline, and every interval ms after it when given. Returns the entry to cancel it"""
+        self.__seq += 1
+        entry = [deadline, self.__seq, job, interval, False]  # the last field is True while the job runs
+        heappush(self.__heap, entry)
+        if self.__heap[0] is entry:
+            # Sooner than what the loop sleeps for
+            self.__changed.set()
+        return entry
+
+    def after(self, delay, job):
+        return self.at(self.now() + delay, job)
+
+    def every(self, interval, job, deadline=None):
+        """Start job() every interval ms, from deadline or one interval from now"""
+        return self.at(self.now() + interval if deadline is None else deadline, job, interval)
+
+    def cancel(self, entry):
+        # Left in the heap and skipped when it comes up
+        if entry is not None:
+            entry[2] = None
+
+    def pending(self):
+        return sum(1 for entry in self.__heap if entry[2] is not None)
+
+    async def run(self):
+        heap = self.__heap
+        while True:
+            while heap and heap[0][2] is None:
+                heappop(heap)
+            self.__changed.clear()
+            if not heap:
+                await self.__changed.wait()
+                continue
+            delay = heap[0][0] - self.now()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.__changed.wait(), delay / 1000)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            if heap[0][0] > self.now() or heap[0][2] is None:
+                continue
+            entry = heappop(heap)
+            deadline, _, job, interval, _ = entry
+            now = self.now()
+            if self.lag is not None:
+                self.lag.observe(max(0, now - deadline))
+            if interval:
+                # Next run counted from this deadline, so a repeating job does not drift.
+                # The same entry goes back in, cancel() keeps working on it.
+                entry[0] = max(deadline + interval, now)
+                self.__seq += 1
+                entry[1] = self.__seq
+                heappush(heap, entry)
+            if entry[4]:
+                self.skipped += 1
+                continue
+            asyncio.create_task(self.__run(entry, job))
+
+    async def __run(self, entry, job):
+        entry[4] = True
+        try:
+            await job()
+        finally:
+            entry[4] = False
+
+
+if __name__ == "__main__":
+    print("Test Scheduler")
+
+    async def test():
+        scheduler = Scheduler()
+        fired = []
+        task = asyncio.create_task(scheduler.run())
+
+        def job(name):
+            async def run():
+                fired.append((name, scheduler.now()))
+            return run
+
+        scheduler.after(300, job("c"))
+        scheduler.after(100, job("a"))
+        cancelled = scheduler.after(200, job("x"))
+        await asyncio.sleep_ms(50)
+        # Added while the loop sleeps until "a": it must wake up earlier
+        scheduler.after(20, job("first"))
+        scheduler.after(200, job("b"))
+        scheduler.cancel(cancelled)
+        assert scheduler.pending() == 4
+        await asyncio.sleep_ms(400)
+        assert [name for name, _ in fired] == ["first", "a", "b", "c"], fired
+        for (name, at), expected in zip(fired, (70, 100, 250, 300)):
+            assert expected <= at < expected + 50, (name, at)
+
+        # A repeating job runs from its previous deadline, so it does not drift
+        ticks = []
+
+        async def repeat():
+            ticks.append(scheduler.now())
+        entry = scheduler.every(50, repeat)
+        await asyncio.sleep_ms(275)
+        scheduler.cancel(entry)
+        await asyncio.sleep_ms(100)
+        assert len(ticks) == 5 and ticks[-1] - ticks[0] < 225, ticks
+        assert scheduler.pending() == 0
+
+        # A run longer than the interval makes the next deadlines wait for it instead of overlapping
+        running = [0, 0]
+
+        async def slow():
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+            await asyncio.sleep_ms(120)
+            running[0] -= 1
+        entry = scheduler.every(50, slow)
+        await asyncio.sleep_ms(500)
+        scheduler.cancel(entry)
+        await asyncio.sleep_ms(150)
+        assert running == [0, 1] and scheduler.skipped >= 5, (running, scheduler.skipped)
+        task.cancel()
+
+    asyncio.run(test())
+    print("Scheduler OK")
@@ -1,32 +1,107 @@
 from machine import Pin, ADC
 import dht
 from constant import *
-from time import  sleep, localtime
+from historyBuffer import format_timestamp
+from array import array
+from time import  sleep, time, ticks_ms, ticks_diff
+import uasyncio as asyncio
 
 # Data storage structure
 class Data:
-    def __init__(self,  soil_moisture=0, air_humidity=0, air_temperature=0, water=False):
-        self.timestamp = f"{DAY[localtime()[6]]}/{localtime()[3]:02d}:{localtime()[4]:02d}:{localtime()[5]:02d}"
+    def __init__(self,  soil_moisture=0, air_humidity=0, air_temperature=0, water=False, epoch=None):
+        self.epoch = time() if epoch is None else epoch
         self.soil_moisture = soil_moisture
         self.air_humidity = air_humidity
         self.air_temperature = air_temperature
         self.water = water
+    @property
+    def timestamp(self):
+        return format_timestamp(self.epoch)
     def __repr__(self):
         return str(self)
     def __str__(self):
         return f"timestamp: {self.timestamp}, soil_moisture: {self.soil_moisture}, air_humidity: {self.air_humidity}, air_temperature: {self.air_temperature}"
 
-# Class to manage sensors
+def trimmed_mean(samples, trim):
+    """Mean of the samples without the trim lowest and trim highest ones"""
+    ordered = sorted(samples)
+    kept = ordered[trim:len(ordered) - trim] or ordered
+    return sum(kept) / len(kept)
+
+
+# Class to manage sensors: the DHT11 of the room and the soil sensor of every zone
 class SensorManager:
-    def __init__(self, dht_pin=DHT_PIN, soil_pin=SOIL_SENSOR_PIN):
+    def __init__(self, dht_pin=DHT_PIN, soil=None):
+        """soil: (ADC pin, multiplexer channel or None) per zone, ZONES by default"""
+        if soil is None:
+            soil = [(zone[1], zone[2]) for zone in ZONES]
         self.dht_sensor = dht.DHT11(Pin(dht_pin))
-        self.soil_sensor = ADC(Pin(soil_pin))
+        adcs = {}
+        for pin, _ in soil:
+            if pin not in adcs:
+                adcs[pin] = ADC(Pin(pin))
+        self.soil_sensors = [adcs[pin] for pin, _ in soil]
+        self.soil_channels = [channel for _, channel in soil]
+        self.soil_sensor = self.soil_sensors[0]
+        self.__mux = [Pin(pin, Pin.OUT) for pin in SOIL_MUX_PINS]
+        self.__samples = array('H', [0] * (SOIL_SAMPLES * len(soil)))
+        self.__air = (0, 0)  # last good DHT reading
+        self.__last_dht = ticks_ms() - DHT_MIN_INTERVAL
+        self.dht_failures = 0
 
     def read_sensors(self):
         self.dht_sensor.measure()
         return Data(self._map(self.soil_sensor.read_u16(), SOIL_SENSOR_DRY, SOIL_SENSOR_WET, 0, 100),
                     self.dht_sensor.humidity(), self.dht_sensor.temperature())
 
+    async def acquire(self):
+        """Non-blocking reading of every zone: oversampled soil moisture and one DHT read, that never raises,
+        shared by all of them"""
+        soil_moisture = await self.read_soil()
+        air_humidity, air_temperature = await self.read_air()
+        return [Data(moisture, air_humidity, air_temperature) for moisture in soil_moisture]
+
+    def select(self, channel):
+        for bit, pin in enumerate(self.__mux):
+            pin.value((channel >> bit) & 1)
+
+    async def read_soil(self):
+        """Soil moisture of every zone. One batched pass: each round takes a sample of every zone, so the
+        burst lasts SOIL_SAMPLES rounds whatever the number of zones"""
+        samples = self.__samples
+        sensors = self.soil_sensors
+        channels = self.soil_channels
+        zones = len(sensors)
+        for i in range(SOIL_SAMPLES):
+            for zone in range(zones):
+                if channels[zone] is not None:
+                    self.select(channels[zone])
+                samples[zone * SOIL_SAMPLES + i] = sensors[zone].read_u16()
+            await asyncio.sleep_ms(SOIL_SAMPLE_SPACING)
+        # The outliers are trimmed before averaging
+        return [self._map(round(trimmed_mean(samples[zone * SOIL_SAMPLES:(zone + 1) * SOIL_SAMPLES], SOIL_TRIM)),
+                          SOIL_SENSOR_DRY, SOIL_SENSOR_WET, 0, 100) for zone in range(zones)]
+
+    async def read_air(self):
+        # The DHT11 needs DHT_MIN_INTERVAL between reads, failed reads are retried with backoff
+        delay = DHT_RETRY_DELAY
+        for attempt in range(DHT_RETRIES):
+            wait = DHT_MIN_INTERVAL - ticks_diff(ticks_ms(), self.__last_dht)
+            if wait > 0:
+                await asyncio.sleep_ms(wait)
+            self.__last_dht = ticks_ms()
+            try:
+                self.dht_sensor.measure()
+                self.__air = (self.dht_sensor.humidity(), self.dht_sensor.temperature())
+                return self.__air
+            except OSError as e:
+                self.dht_failures += 1
+                print("DHT read failed:", e)
+                await asyncio.sleep_ms(delay)
+                delay *= 2
+        # Keep the last good values instead of raising into the sensors loop
+        return self.__air
+
     def _map(self, value, in_min, in_max, out_min, out_max):
         return (value - in_min) * (out_max - out_min) // (in_max - in_min) + out_min
     
@@ -34,14 +109,26 @@ class SensorManager:
 if __name__ == "__main__":
     print("Test SensorManager")
     sensor = SensorManager()
-    relay = machine.Pin("GP22")
-    
-    while True:
-        air_humidity, air_temperature, soil_humidity = sensor.read_sensors()
-        print(air_humidity, air_temperature, soil_humidity)
-        sleep(1)
-        if soil_humidity<50:
-            relay.value(1)
-        else:
-            relay.value(0)
-            
\ No newline at end of file
+
+    def variance(values):
+        mean = sum(values) / len(values)
+        return sum((value - mean) ** 2 for value in values) / len(values)
+
+    async def test():
+        # Single ADC samples against the trimmed bursts on the same sensor
+        single = []
+        burst = []
+        worst = 0
+        for _ in range(30):
+            single.append(sensor._map(sensor.soil_sensor.read_u16(), SOIL_SENSOR_DRY, SOIL_SENSOR_WET, 0, 100))
+            start = ticks_ms()
+            burst.append((await sensor.read_soil())[0])
+            worst = max(worst, ticks_diff(ticks_ms(), start))
+        print("single sample variance:", variance(single), "burst variance:", variance(burst))
+        print("burst duration:", worst, "ms")
+        assert variance(burst) <= variance(single)
+        for _ in range(5):
+            print(await sensor.acquire(), "DHT failures:", sensor.dht_failures)
+            await asyncio.sleep(1)
+
+    asyncio.run(test())
@@ -33,6 +33,10 @@ class SSD1306(framebuf.FrameBuffer):
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        self.view = memoryview(self.buffer)
+        # Columns drawn in every page since the last show(), a page is clean while lo > hi
+        self.dirty_lo = bytearray(b"\xff" * self.pages)
+        self.dirty_hi = bytearray(self.pages)
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
         self.init_display()
 
@@ -86,20 +90,105 @@ class SSD1306(framebuf.FrameBuffer):
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
+    def mark(self, x, y, w, h):
+        """Flag a rectangle as changed, show() only sends the flagged windows"""
+        x0 = max(x, 0)
+        x1 = min(x + w, self.width) - 1
+        y0 = max(y, 0)
+        y1 = min(y + h, self.height) - 1
+        if x1 < x0 or y1 < y0:
+            return
+        for page in range(y0 >> 3, (y1 >> 3) + 1):
+            if x0 < self.dirty_lo[page]:
+                self.dirty_lo[page] = x0
+            if x1 > self.dirty_hi[page]:
+                self.dirty_hi[page] = x1
+
+    def invalidate(self):
+        self.mark(0, 0, self.width, self.height)
+
+    # Drawing primitives, wrapped to track the dirty windows
+    def fill(self, c):
+        super().fill(c)
+        self.invalidate()
+
+    def pixel(self, x, y, c=None):
+        if c is None:
+            return super().pixel(x, y)
+        super().pixel(x, y, c)
+        self.mark(x, y, 1, 1)
+
+    def hline(self, x, y, w, c):
+        super().hline(x, y, w, c)
+        self.mark(x, y, w, 1)
+
+    def vline(self, x, y, h, c):
+        super().vline(x, y, h, c)
+        self.mark(x, y, 1, h)
+
+    def line(self, x1, y1, x2, y2, c):
+        super().line(x1, y1, x2, y2, c)
+        self.mark(min(x1, x2), min(y1, y2), abs(x2 - x1) + 1, abs(y2 - y1) + 1)
+
+    def rect(self, x, y, w, h, c, *fill):
+        super().rect(x, y, w, h, c, *fill)
+        self.mark(x, y, w, h)
+
+    def fill_rect(self, x, y, w, h, c):
+        super().fill_rect(x, y, w, h, c)
+        self.mark(x, y, w, h)
+
+    def ellipse(self, x, y, xr, yr, c, *args):
+        super().ellipse(x, y, xr, yr, c, *args)
+        self.mark(x - xr, y - yr, 2 * xr + 1, 2 * yr + 1)
+
+    def poly(self, x, y, coords, c, *fill):
+        super().poly(x, y, coords, c, *fill)
+        self.invalidate()
+
+    def text(self, s, x, y, c=1):
+        super().text(s, x, y, c)
+        self.mark(x, y, 8 * len(s), 8)
+
+    def scroll(self, xstep, ystep):
+        super().scroll(xstep, ystep)
+        self.invalidate()
+
+    def blit(self, fbuf, x, y, *args):
+        super().blit(fbuf, x, y, *args)
+        self.invalidate()
+
     def show(self):
-        x0 = 0
-        x1 = self.width - 1
-        if self.width == 64:
-            # displays with width of 64 pixels are shifted by 32
-            x0 += 32
-            x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        # Send only the changed windows: consecutive dirty pages share one column/page window
+        offset = 32 if self.width == 64 else 0  # displays with width of 64 pixels are shifted by 32
+        page = 0
+        while page < self.pages:
+            if self.dirty_lo[page] > self.dirty_hi[page]:
+                page += 1
+                continue
+            first = page
+            x0 = self.dirty_lo[page]
+            x1 = self.dirty_hi[page]
+            while page + 1 < self.pages and self.dirty_lo[page + 1] <= self.dirty_hi[page + 1]:
+                page += 1
+                x0 = min(x0, self.dirty_lo[page])
+                x1 = max(x1, self.dirty_hi[page])
+            self.write_cmd(SET_COL_ADDR)
+            self.write_cmd(x0 + offset)
+            self.write_cmd(x1 + offset)
+            self.write_cmd(SET_PAGE_ADDR)
+            self.write_cmd(first)
+            self.write_cmd(page)
+            if x0 == 0 and x1 == self.width - 1:
+                self.write_data(self.view[first * self.width:(page + 1) * self.width])
+            else:
+                # The RAM pointer wraps inside the window, so the page slices go one after another
+                for p in range(first, page + 1):
+                    self.write_data(self.view[p * self.width + x0:p * self.width + x1 + 1])
+            for p in range(first, page + 1):
+                self.dirty_lo[p] = 0xFF
+                self.dirty_hi[p] = 0
+            page += 1
 
 
 class SSD1306_I2C(SSD1306):
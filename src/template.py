@@ -0,0 +1,44 @@
+# Page template split once into static bytes segments and named slots.
+# Only the slots are formatted per request, the static segments are sent as they are.
+class Template:
+    def __init__(self, source, static={}, open_mark="{{", close_mark="}}"):
+        """Split source at {{name}} slots; slots found in static are resolved now"""
+        self.segments = []
+        self.slots = []
+        text = ""
+        end = 0
+        while True:
+            start = source.find(open_mark, end)
+            if start < 0:
+                break
+            text += source[end:start]
+            end = source.index(close_mark, start)
+            name = source[start + len(open_mark):end].strip()
+            end += len(close_mark)
+            if name in static:
+                text += str(static[name])
+            else:
+                self.segments.append(text.encode("utf-8"))
+                self.slots.append(name)
+                text = ""
+        self.segments.append((text + source[end:]).encode("utf-8"))
+
+    def render(self, values):
+        """Yield the static segments (bytes) interleaved with the slot values (str)"""
+        segments = self.segments
+        for i, slot in enumerate(self.slots):
+            yield segments[i]
+            yield str(values[slot])
+        yield segments[-1]
+
+    def size(self):
+        return sum(len(segment) for segment in self.segments)
+
+
+if __name__ == "__main__":
+    print("Test Template")
+    page = Template("<p>{{a}} and {{ b }}</p>{{c}}{}{{a}}", {"c": "fixed"})
+    assert page.slots == ["a", "b", "a"]
+    assert page.segments == [b"<p>", b" and ", b"</p>fixed{}", b""]
+    assert "".join(p if isinstance(p, str) else p.decode() for p in page.render({"a": 1, "b": "x"})) == "<p>1 and x</p>fixed{}1"
+    print("OK")
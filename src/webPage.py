@@ -0,0 +1,115 @@
+from constant import *
+from template import Template
+from assets import ASSETS
+
+# Limits never change at run time, they are baked into the static segments
+LIMITS = {
+    "MIN_NEEDED_SOIL_MOISTURE": MIN_NEEDED_SOIL_MOISTURE,
+    "MAX_NEEDED_SOIL_MOISTURE": MAX_NEEDED_SOIL_MOISTURE,
+    "MIN_READING_INTERVAL": MIN_READING_INTERVAL,
+    "MAX_READING_INTERVAL": MAX_READING_INTERVAL,
+    "MIN_TIME_WATER": MIN_TIME_WATER,
+    "MAX_TIME_WATER": MAX_TIME_WATER,
+    "MIN_MAX_READINGS": MIN_MAX_READINGS,
+    "MAX_MAX_READINGS": MAX_MAX_READINGS,
+}
+
+
+def asset_url(path, fallback=None):
+    """URL of a built asset, versioned by its ETag so the browser may cache it forever"""
+    if path not in ASSETS:
+        return fallback
+    return path + "?v=" + ASSETS[path][3].strip('"')
+
+
+# Asset URLs are fixed at build time too. Without a flashed copy of Chart.js
+# (tools/buildAssets.py --fetch) the page falls back to the CDN.
+URLS = {
+    "chart_url": asset_url("/static/chart.min.js", "https://cdn.jsdelivr.net/npm/chart.js@3.7.1/dist/chart.min.js"),
+    "style_url": asset_url("/static/style.css"),
+    "app_url": asset_url("/static/app.js"),
+}
+STATIC = dict(LIMITS)
+STATIC.update(URLS)
+# So are the zones, the selector is hidden with a single pot
+STATIC["zone_options"] = "".join("<option value='{}'>{}</option>".format(i, ZONES[i][0]) for i in range(len(ZONES)))
+STATIC["zone_style"] = "" if len(ZONES) > 1 else "display:none"
+
+# Split once at import, only the {{slots}} are rendered per request
+PAGE = Template("""<html>
+    <head>
+        <meta charset='utf-8'>
+        <link rel='stylesheet' href='{{style_url}}'>
+        <script src='{{chart_url}}'></script>
+    </head>
+    <body data-zone='{{zone}}'>
+        <h1>SmartPlantWatering</h1>
+        <h2>Maximum duration of the history: {{history_duration}}</h2>
+        <select id='zone' style='{{zone_style}}' onchange="location.search = '?zone=' + this.value">{{zone_options}}</select>
+        
+         <!------------------------------------ Form ------------------------------>
+        <form method='GET' action=''>
+            <input type='hidden' name='zone' value='{{zone}}'>
+            <label for='humidity'>Required soli moisture % of {{zone_name}}:</label>
+            <input type='number' id='humidity' name='humidity' min='{{MIN_NEEDED_SOIL_MOISTURE}}' max='{{MAX_NEEDED_SOIL_MOISTURE}}' required value='{{needed_soil_moisture}}'>
+            
+            <label for='period'>Sampling period in seconds:</label>
+            <input type='number' id='period' name='period' min='{{MIN_READING_INTERVAL}}' max='{{MAX_READING_INTERVAL}}' required value='{{reading_interval}}'>
+            
+            <label for='time_water'>Watering time seconds of {{zone_name}}:</label>
+            <input type='number' id='time_water' name='time_water' min='{{MIN_TIME_WATER}}' max='{{MAX_TIME_WATER}}' required value='{{time_water}}'>
+            
+            <label for='max_reading'>Maximum readings:</label>
+            <input type='number' id='max_reading' name='max_reading' min='{{MIN_MAX_READINGS}}' max='{{MAX_MAX_READINGS}}' required value='{{max_reading}}'><br>
+            
+            <label for="start_ban_time">Beginning of restricted time:</label>
+            <input type="time" id="start_ban_time" name="start_ban_time" required value='{{start_ban_time}}'>
+
+            <label for="finish_ban_time">End of restricted time:</label>
+            <input type="time" id="finish_ban_time" name="finish_ban_time" required value='{{finish_ban_time}}'>
+            
+            <input type='submit' value='Actualizar'>
+        </form>
+        
+        <!------------------------------------ Weekly watering data table ------------------------------>
+        <h3>Watering by Day of the Week</h3>
+        <table id='waterTable' border='1'>
+            <thead>
+                <tr>
+                    <th>Monday</th>
+                    <th>Tuesday</th>
+                    <th>Wednesday</th>
+                    <th>Thursday</th>
+                    <th>Friday</th>
+                    <th>Saturday</th>
+                    <th>Sunday</th>
+                    <th>Last Watering</th> 
+                </tr>
+            </thead>
+            <tbody>
+                <tr>
+                    <td>{{water_week_0}}</td>
+                    <td>{{water_week_1}}</td>
+                    <td>{{water_week_2}}</td>
+                    <td>{{water_week_3}}</td>
+                    <td>{{water_week_4}}</td>
+                    <td>{{water_week_5}}</td>
+                    <td>{{water_week_6}}</td>
+                    <td>{{last_water}}</td>
+                </tr>
+            </tbody>
+        </table>
+        
+        <!------------------------------------------- Graphic -------------------------->
+        <select id='resolution' onchange='lastSeq = -1; refresh();'>
+            <option value='raw'>Every reading</option>
+            <option value='hour'>Hourly average</option>
+            <option value='day'>Daily average</option>
+        </select>
+        <p id='status'></p>
+        <canvas id='myChart' style='width:100%; height:500px;'></canvas>
+        <a href='/export.csv?zone={{zone}}' download>Download the history (CSV)</a>
+        <script src='{{app_url}}'></script>
+    </body>
+</html>
+""", STATIC)
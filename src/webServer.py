@@ -1,66 +1,89 @@
-import network
-import socket
-import json
+import uasyncio as asyncio
 from constant import *
-from wifi import *
 from sensorManager import Data
-from time import sleep, time, localtime
-from machine import reset
-from collections import deque
-import gc
+from zone import Zone
+from jsonStream import history_pieces, rollup_pieces
+from responseWriter import ResponseWriter
+from binStream import packed_pieces
+from decimate import lttb
+from csvStream import csv_pieces
+from webPage import PAGE
+from httpRequest import HttpError, RequestReader
+from assets import ASSETS
+from metrics import Metrics
+from eventHub import EventHub
+from banWindow import BanWindow
+from time import time, localtime, ticks_ms, ticks_diff
+
+SSE_HELLO = f"retry: {SSE_RETRY}\n\n".encode()
 
 # Class for managing the web server
 class WebServer:
-    def __init__(self):
+    def __init__(self, zones=None):
         self.__max_reading = MAX_READINGS
-        self.__readings = deque([], self.max_reading)
-        self.__needed_soil_moisture = NEEDED_SOIL_MOISTURE
+        # Thresholds, watering time and history are per zone, the rest of the settings is shared
+        self.zones = zones if zones is not None else [Zone(i, *ZONES[i]) for i in range(len(ZONES))]
         self.__reading_interval = READING_INTERVAL
-        self.__time_water = TIME_WATER
-        self.__last_water = ""
         self.__finish_ban_time = FINISH_BAN_TIME
         self.__start_ban_time = START_BAN_TIME
+        self.__ban_window = BanWindow(START_BAN_TIME, FINISH_BAN_TIME)
+        self.on_reading_interval = None  # called when the reading interval changes
+        self.response = ResponseWriter()  # one send buffer for every connection
+        self.metrics = Metrics()
+        self.events = EventHub(len(self.zones))
+        self.restore()
+        self.server = None
+        self.clients = 0  # open connections
+        self.on_clients = None  # called with the number of open connections when it changes
+
+    async def start(self, host='0.0.0.0', port=WEB_PORT):
+        # Every client gets its own task, so a slow browser never blocks the sensors loop.
+        # A failed bind raises OSError, the caller retries
+        self.server = await asyncio.start_server(self.handle_client, host, port, backlog=5)
+        print("Web server started on port", port)
+        return self.server
 
-        # Connect to WiFi
-        self.__wlan = network.WLAN(network.STA_IF)
-        self.__wlan.active(True)
-        print("Connect to WiFi...")
-        self.__wlan.connect(SSID, PASSWORD)
-        
-        attempts = 0
-        while not self.__wlan.isconnected():
-            print("Trying to connect...")
-            sleep(1)
-            attempts += 1
-    
-        if attempts >= MAX_ATTEMPTS:
-            print("Unable to connect. Rebooting...")
-            machine.reset()
-            
-        print("Connected to WiFi:", self.__wlan.ifconfig())
-
-        # Start server
-        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        try:
-            self.server.bind(('0.0.0.0', 80))
-            self.server.listen(5)
-            self.server.settimeout(0.5)
-            #self.server.setblocking(False)
-            print("Web server started on http://{}".format(self.__wlan.ifconfig()[0]))
-        except OSError as e:
-            print("Error while starting the server:", e)
+    def __del__(self):
+        if self.server is not None:
             self.server.close()
-            reset()
 
-    def __del__(self):
-        self.server.close()
+    def restore(self):
+        # Settings and history survive a reset through the flash logs, zone 0 holds the shared settings
+        for zone in self.zones:
+            config = zone.log.load_config()
+            if config is not None:
+                needed_soil_moisture, reading_interval, time_water, max_reading, finish_ban, start_ban = config
+                zone.needed_soil_moisture = needed_soil_moisture
+                zone.time_water = time_water
+                if zone.index == 0:
+                    self.reading_interval = reading_interval
+                    self.max_reading = max_reading
+                    self.finish_ban_time = f"{finish_ban // 60:02d}:{finish_ban % 60:02d}"
+                    self.start_ban_time = f"{start_ban // 60:02d}:{start_ban % 60:02d}"
+            zone.restore()
+        self.save_config()
+
+    def config(self, zone):
+        return (int(zone.needed_soil_moisture), int(self.reading_interval), int(zone.time_water), self.max_reading,
+                self.time_to_seconds(self.finish_ban_time) // 60, self.time_to_seconds(self.start_ban_time) // 60)
+
+    def save_config(self):
+        # A zone whose settings did not change does not touch the flash
+        for zone in self.zones:
+            zone.log.save_config(self.config(zone))
+
+    def flush_log(self):
+        for zone in self.zones:
+            zone.flush_log()
+
+    def zone(self, index):
+        """Zone of a query parameter, the first one when it is missing or wrong"""
+        if index is not None and index.isdigit() and int(index) < len(self.zones):
+            return self.zones[int(index)]
+        return self.zones[0]
         
         
 ###########################GETTERS/SETTERS###################
-    @property
-    def readings(self):
-        return self.__readings
-    
     @property
     def max_reading(self):
         return self.__max_reading
@@ -69,22 +92,8 @@ class WebServer:
         if isinstance(value, (int)) and value > 0:
             if  self.max_reading != value and MIN_MAX_READINGS <= value <= MAX_MAX_READINGS:
                 self.__max_reading = value
-                self.__readings = deque(self.__readings, self.__max_reading)
-        
-    @property
-    def last_water(self):
-        return self.__last_water
-    @last_water.setter
-    def last_water(self, value:str):
-        self.__last_water = value
-        
-    @property
-    def needed_soil_moisture(self):
-        return self.__needed_soil_moisture
-    @needed_soil_moisture.setter
-    def needed_soil_moisture(self, value):
-        if isinstance(value, (int, float)) and MIN_NEEDED_SOIL_MOISTURE <= value <= MAX_NEEDED_SOIL_MOISTURE:
-            self.__needed_soil_moisture = value
+                for zone in self.zones:
+                    zone.readings.resize(self.__max_reading)
         
     @property
     def finish_ban_time(self):
@@ -95,6 +104,7 @@ class WebServer:
             time_parts = value.split(":")
             if len(time_parts) == 2 and 0 <= int(time_parts[0]) <= 23 and 0 <= int(time_parts[1]) <= 59:
                 self.__finish_ban_time = value
+                self.__ban_window = BanWindow(self.start_ban_time, value)
         
     @property
     def start_ban_time(self):
@@ -105,6 +115,11 @@ class WebServer:
             time_parts = value.split(":")
             if len(time_parts) == 2 and 0 <= int(time_parts[0]) <= 23 and 0 <= int(time_parts[1]) <= 59:
                 self.__start_ban_time = value
+                self.__ban_window = BanWindow(value, self.finish_ban_time)
+
+    @property
+    def ban_window(self):
+        return self.__ban_window
 
     @property
     def reading_interval(self):
@@ -112,46 +127,22 @@ class WebServer:
     @reading_interval.setter
     def reading_interval(self, value):
         if isinstance(value, (int, float)) and MIN_READING_INTERVAL <= value <= MAX_READING_INTERVAL:
+            changed = value != self.__reading_interval
             self.__reading_interval = value
-
-
-    @property
-    def time_water(self):
-        return self.__time_water
-
-    @time_water.setter
-    def time_water(self, value):
-        if isinstance(value, (int, float)) and MIN_TIME_WATER <= value <= MAX_TIME_WATER:
-            self.__time_water = value
+            if changed and self.on_reading_interval is not None:
+                self.on_reading_interval()
 
 ########################################################################################
             
-    def get_IP(self):
-        return self.__wlan.ifconfig()[0]
-
-    def add_reading(self, reading:Data):
-        self.__readings.append(reading)
-        
-    def get_water_week(self):
-        water_week = [0]*7
-        for read in self.readings:
-            if read.water:
-                water_week[DAY.index(read.timestamp[0:3])]+=1
-        return water_week
+    def add_reading(self, zone, reading:Data):
+        zone.add_reading(reading)
+        # Same JSON as /get_data?zone=<zone>&since=<previous seq>, the page merges both the same way
+        self.events.publish("reading", "".join(history_pieces(zone.readings, zone.water_week(), zone.last_water,
+                                                              len(zone.readings) - 1, zone.index)))
+
+    def publish_watering(self, zone, seconds):
+        self.events.publish("water", f'{{"zone": {zone.index}, "seconds": {seconds}}}')
         
-    def get_query_params(self, request):
-        """Extract URL parameters (query string)"""
-        params = {}
-        if '?' in request:
-            # Split the parameters
-            query_string = request.split('?')[1].split(' ')[0].split('\r')[0]
-            for param in query_string.split('&'):
-                # Save into diccionary
-                if '=' in param:
-                    key, value = param.split('=')
-                    params[key] = value
-        return params
-    
     def convert_seconds_to_time(self, seconds):
         days = seconds // 86400
         hours = (seconds % 86400) // 3600
@@ -163,21 +154,87 @@ class WebServer:
         hours, minutes = map(int, time_str.split(":"))
         return hours * 3600 + minutes * 60
 
-############################WEB THINGS##############################
-    def handle_request(self, client):
-        print("Client connected")
-        request = client.recv(1024).decode("utf-8")
-        print("Request received:", request)
+    async def send_stream(self, writer, content_type, pieces, keep_alive, headers=""):
+        """200 response whose length is unknown up front: chunked when the connection stays open,
+        otherwise the body simply ends with the connection"""
+        framing = "Transfer-Encoding: chunked\r\n" if keep_alive else ""
+        await self.response.send_head(writer, "200 OK", keep_alive,
+                                      f"Content-Type: {content_type}\r\n{headers}{framing}")
+        await self.response.send_pieces(writer, pieces, keep_alive)
 
-        if "GET /get_data" in request:
+############################WEB THINGS##############################
+    def count_client(self, delta):
+        self.clients += delta
+        self.metrics.clients = self.clients
+        if self.on_clients is not None:
+            self.on_clients(self.clients)
+
+    async def handle_client(self, reader, writer):
+        # One connection serves up to KEEP_ALIVE_MAX requests, a polling dashboard pays one handshake
+        self.count_client(1)
+        requests = RequestReader(reader)
+        served = 0
+        try:
+            while served < KEEP_ALIVE_MAX:
+                try:
+                    # The first request must come quickly, then the connection may idle between polls
+                    request = await requests.read(REQUEST_TIMEOUT if served == 0 else KEEP_ALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if request is None:
+                    break
+                served += 1
+                # An event stream keeps the connection to itself until it ends
+                keep_alive = request.keep_alive and served < KEEP_ALIVE_MAX and request.path != "/events"
+                await self.handle_request(request, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except HttpError as e:
+            print("Bad request:", e.status)
+            self.metrics.client_errors += 1
+            try:
+                await self.response.send_head(writer, e.status, False, "Content-Length: 0\r\n")
+            except Exception:
+                pass
+        except Exception as e:
+            # A broken client only loses its own connection
+            print("Client error:", e)
+            self.metrics.client_errors += 1
+        finally:
+            self.count_client(-1)
+            writer.close()
+            await writer.wait_closed()
+
+    async def handle_request(self, request, writer, keep_alive=False):
+        start = ticks_ms()
+        print("Request received:", request.method, request.target)
+        if request.method != "GET" and request.method != "POST":
+            raise HttpError("405 Method Not Allowed")
+        params = request.params
+        zone = self.zone(params.get('zone'))
+        route = self.metrics.route(request.path)
+        if route == 1:
             # AJAX handle
-            self.handle_ajax_request(client)
+            await self.handle_ajax_request(writer, zone, params.get('since'), params.get('resolution'), keep_alive,
+                                           params.get('format') == "bin", params.get('from'), params.get('to'),
+                                           params.get('points'))
+        elif route == 2:
+            await self.handle_metrics_request(writer, keep_alive)
+        elif route == 3:
+            await self.handle_static_request(writer, request.path, request.header("If-None-Match"), keep_alive)
+        elif route == 4:
+            # Lives as long as the subscriber, its duration is not a request time
+            await self.handle_events_request(writer)
+            return
+        elif route == 5:
+            await self.handle_export_request(writer, zone, params.get('from'), params.get('to'), params.get('source'),
+                                             keep_alive)
+        elif route == 6:
+            await self.response.send_head(writer, "404 Not Found", keep_alive, "Content-Length: 0\r\n")
         else:
-            params = self.get_query_params(request)
-
             humidity = params.get('humidity')
             if humidity is not None and humidity.isdigit():
-                self.needed_soil_moisture = int(humidity)
+                zone.needed_soil_moisture = int(humidity)
                 
             period = params.get('period')
             if period is not None and period.isdigit():
@@ -185,7 +242,7 @@ class WebServer:
 
             time_water = params.get('time_water')
             if time_water is not None and time_water.isdigit():
-                self.time_water = int(time_water)
+                zone.time_water = int(time_water)
 
             max_reading = params.get('max_reading')
             if max_reading is not None and max_reading.isdigit():
@@ -193,300 +250,135 @@ class WebServer:
 
             finish_ban_time = params.get('finish_ban_time')
             if finish_ban_time is not None:
-                self.finish_ban_time = finish_ban_time.replace("%3A",":")
+                self.finish_ban_time = finish_ban_time
 
             start_ban_time = params.get('start_ban_time')
             if start_ban_time is not None:
-                self.start_ban_time = start_ban_time.replace("%3A",":")
+                self.start_ban_time = start_ban_time
+
+            # Only a submitted form touches the flash
+            if params:
+                self.save_config()
                    
-            self.handle_html_response(client)
+            await self.handle_html_response(writer, zone, keep_alive)
+        self.metrics.request.observe(ticks_diff(ticks_ms(), start), route)
+
+    async def handle_html_response(self, writer, zone, keep_alive=False):
+        # The chart fills itself from /get_data, the page only carries the settings and the week table
+        water_week = zone.water_week()
+        values = {
+            "history_duration": self.convert_seconds_to_time(self.reading_interval * self.max_reading),
+            "zone": zone.index,
+            "zone_name": zone.name,
+            "needed_soil_moisture": zone.needed_soil_moisture,
+            "reading_interval": self.reading_interval,
+            "time_water": zone.time_water,
+            "max_reading": self.max_reading,
+            "start_ban_time": self.start_ban_time,
+            "finish_ban_time": self.finish_ban_time,
+            "last_water": zone.last_water,
+        }
+        for i in range(7):
+            values[f"water_week_{i}"] = water_week[i]
 
-    def handle_html_response(self, client):
-        gc.collect()
-        #Data
-        if len(self.readings) == 0:
-            timestamps, soil_moisture, air_humidity, air_temperature = 0,0,0,0
-        else:
-            timestamps = f'"{self.readings[0].timestamp}"'
-            soil_moisture = str(self.readings[0].soil_moisture) 
-            air_humidity = str(self.readings[0].air_humidity) 
-            air_temperature = str(self.readings[0].air_temperature)
-        water_week = self.get_water_week()
-        
         #HTML Response
-        response =  f"""
-HTTP/1.1 200 OK
-Content-Type: text/html\r\n
-<html>
-    <head>
-        <meta charset='utf-8'>
-        <script src='https://cdn.jsdelivr.net/npm/chart.js@3.7.1/dist/chart.min.js'></script>
-        <script src='https://code.jquery.com/jquery-3.6.0.min.js'></script>
-        <style>
-            {{
-                margin: 0;
-                padding: 0;
-                box-sizing: border-box;
-            }}
-
-            body {{
-                font-family: Arial, sans-serif;
-                line-height: 1.6;
-                background-color: #f4f4f9;
-                color: #333;
-                padding: 20px;
-            }}
-
-            h1, h2, h3 {{
-                color: #4CAF50;
-                text-align: center;
-            }}
-
-            h1 {{
-                font-size: 2.5em;
-                margin-bottom: 10px;
-            }}
-
-            h2 {{
-                font-size: 1.5em;
-                margin-bottom: 20px;
-            }}
-
-            form {{
-                background: #fff;
-                padding: 20px;
-                border-radius: 8px;
-                box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-                max-width: 600px;
-                margin: 0 auto 20px;
-            }}
-
-            form label {{
-                display: block;
-                font-size: 1em;
-                margin-bottom: 8px;
-            }}
-
-            form input[type="number"],
-            form input[type="time"] {{
-                width: calc(100% - 20px);
-                padding: 10px;
-                margin-bottom: 15px;
-                border: 1px solid #ccc;
-                border-radius: 5px;
-            }}
-
-            form input[type="submit"] {{
-                background-color: #4CAF50;
-                color: white;
-                border: none;
-                padding: 10px 15px;
-                border-radius: 5px;
-                cursor: pointer;
-                font-size: 1em;
-            }}
-
-            form input[type="submit"]:hover {{
-                background-color: #45a049;
-            }}
-
-
-            table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 30px 0;
-            }}
-
-            th, td {{
-                padding: 12px 15px;
-                text-align: center;
-                border: 1px solid #ddd;
-            }}
-
-            th {{
-                background-color: #4CAF50;
-                color: white;
-            }}
-
-            tbody tr:nth-child(even) {{
-                background-color: #f9f9f9;
-            }}
-
-            tbody tr:hover {{
-                background-color: #f1f1f1;
-            }}
-
-            @media (max-width: 768px) {{
-                h1 {{
-                    font-size: 2em;
-                }}
-
-                h2 {{
-                    font-size: 1.2em;
-                }}
-
-                form {{
-                    width: 100%;
-                    padding: 15px;
-                }}
-
-                table {{
-                    font-size: 14px;
-                }}
-            }}
-        </style>
-    </head>
-    <body>
-        <h1>SmartPlantWatering</h1>
-        <h2>Maximum duration of the history: {self.convert_seconds_to_time(self.reading_interval * self.max_reading)}</h2>
-        
-         <!------------------------------------ Form ------------------------------>
-        <form method='GET' action=''>
-            <label for='humidity'>Required soli moisture %:</label>
-            <input type='number' id='humidity' name='humidity' min='{MIN_NEEDED_SOIL_MOISTURE}' max='{MAX_NEEDED_SOIL_MOISTURE}' required value='{self.needed_soil_moisture}'>
-            
-            <label for='period'>Sampling period in seconds:</label>
-            <input type='number' id='period' name='period' min='{MIN_READING_INTERVAL}' max='{MAX_READING_INTERVAL}' required value='{self.reading_interval}'>
-            
-            <label for='time_water'>Watering time seconds:</label>
-            <input type='number' id='time_water' name='time_water' min='{MIN_TIME_WATER}' max='{MAX_TIME_WATER}' required value='{self.time_water}'>
-            
-            <label for='max_reading'>Maximum readings:</label>
-            <input type='number' id='max_reading' name='max_reading' min='{MIN_MAX_READINGS}' max='{MAX_MAX_READINGS}' required value='{self.max_reading}'><br>
-            
-            <label for="start_ban_time">Beginning of restricted time:</label>
-            <input type="time" id="start_ban_time" name="start_ban_time" required value='{self.start_ban_time}'>
-
-            <label for="finish_ban_time">End of restricted time:</label>
-            <input type="time" id="finish_ban_time" name="finish_ban_time" required value='{self.finish_ban_time}'>
-            
-            <input type='submit' value='Actualizar'>
-        </form>
-        
-        <!------------------------------------ Weekly watering data table ------------------------------>
-        <h3>Watering by Day of the Week</h3>
-        <table id='waterTable' border='1'>
-            <thead>
-                <tr>
-                    <th>Monday</th>
-                    <th>Tuesday</th>
-                    <th>Wednesday</th>
-                    <th>Thursday</th>
-                    <th>Friday</th>
-                    <th>Saturday</th>
-                    <th>Sunday</th>
-                    <th>Last Watering</th> 
-                </tr>
-            </thead>
-            <tbody>
-                <tr>
-                    <td>{water_week[0]}</td>
-                    <td>{water_week[1]}</td>
-                    <td>{water_week[2]}</td>
-                    <td>{water_week[3]}</td>
-                    <td>{water_week[4]}</td>
-                    <td>{water_week[5]}</td>
-                    <td>{water_week[6]}</td>
-                    <td>{self.last_water}</td>
-                </tr>
-            </tbody>
-        </table>
-        
-        <!------------------------------------------- Graphic -------------------------->
-        <canvas id='myChart' style='width:100%; height:500px;'></canvas>
-        <script>
-            var ctx = document.getElementById('myChart').getContext('2d');
-            var myChart = new Chart(ctx, {{
-                type: 'line',
-                data: {{
-                    labels: ['{timestamps}'],
-                    datasets: [
-                        {{
-                            label: 'Dirt Humidity (%)',
-                            data: [{soil_moisture}],
-                            borderColor: 'rgba(75, 192, 192, 1)',
-                            borderWidth: 1
-                        }},
-                        {{
-                            label: 'Air Humidity (%)',
-                            data: [{air_humidity}],
-                            borderColor: 'rgba(153, 102, 255, 1)',
-                            borderWidth: 1
-                        }},
-                        {{
-                            label: 'Air Temperature (°C)',
-                            data: [{air_temperature}],
-                            borderColor: 'rgba(255, 159, 64, 1)',
-                            borderWidth: 1
-                        }}
-                    ]
-                }},
-                options: {{
-                    scales: {{
-                        y: {{
-                            beginAtZero: true
-                        }}
-                    }}
-                }}
-            }});
-
-            
-            function updateChart() {{
-                $.get('/get_data', function(data) {{
-                    myChart.data.labels = data.timestamps;
-                    myChart.data.datasets[0].data = data.soil_moisture;
-                    myChart.data.datasets[1].data = data.air_humidity;
-                    myChart.data.datasets[2].data = data.air_temperature;
-                    myChart.update();
-                    
-                    var waterWeekHtml = '';
-                    for (var i = 0; i < 7; i++) {{
-                        waterWeekHtml += '<td>' + data.water_week[i] + '</td>';
-                    }}
-                    waterWeekHtml += '<td>' + data.last_water + '</td>';
-                    
-                    $('#waterTable tbody').html('<tr>' + waterWeekHtml + '</tr>');
-                    
-                }});
-            }}
-            setInterval(updateChart, 3000);
-        </script>
-    </body>
-</html>
-"""
-        
-        chunk_size = 512  
-        for i in range(0, len(response), CHUNK_SIZE):
-            client.send(response[i:i+CHUNK_SIZE].encode("utf-8"))
-
-        #client.send(response.encode("utf-8"))
-        client.close()
+        await self.send_stream(writer, "text/html", PAGE.render(values), keep_alive)
         print("HTML response sent")
-        del response
-        gc.collect()
 
-    def handle_ajax_request(self, client):
-        gc.collect()
+    async def handle_ajax_request(self, writer, zone, since=None, resolution=None, keep_alive=False, packed=False,
+                                  start_epoch=None, end_epoch=None, points=None):
         print("AJAX request received")
-        data = {
-            "timestamps": [reading.timestamp for reading in self.readings],
-            "soil_moisture": [reading.soil_moisture for reading in self.readings],
-            "air_humidity": [reading.air_humidity for reading in self.readings],
-            "air_temperature": [reading.air_temperature for reading in self.readings],
-            "water_week": self.get_water_week(),
-            "last_water": self.last_water
-        }
-        
-        response = "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n" + json.dumps(data)
-        
-        for i in range(0, len(response), CHUNK_SIZE):
-            client.send(response[i:i+CHUNK_SIZE].encode("utf-8"))
-        client.close()
-        print("response JSON sent")
-        
-        del response
-        gc.collect()
-
+        tier = zone.rollup.tier(resolution)
+        content_type = "application/json"
+        if tier is not None:
+            # Long ranges come from the small pre-aggregated hourly or daily arrays
+            pieces = rollup_pieces(tier, zone.water_week(), zone.last_water, zone.index)
+        else:
+            readings = zone.readings
+            start = 0
+            if start_epoch is not None or end_epoch is not None or points is not None:
+                # ?from=&to=&points=: a range of epochs thinned to what the chart can show, waterings kept
+                first = 0
+                stop = len(readings)
+                if start_epoch is not None and start_epoch.isdigit():
+                    first = readings.bisect(int(start_epoch))
+                if end_epoch is not None and end_epoch.isdigit():
+                    stop = max(first, readings.bisect(int(end_epoch) + 1))
+                readings = lttb(readings, first, stop, int(points) if points is not None and points.isdigit() else 0)
+            elif since is not None and since.isdigit():
+                # With ?since=<seq> only the newer readings are sent, unless the page fell behind the history
+                start = readings.index_after(int(since)) or 0
+            if packed:
+                # ?format=bin: the columns as they are stored, a quarter of the JSON. The scratch is the
+                # response's own, a piece may still be in it while the send buffer drains
+                content_type = "application/octet-stream"
+                pieces = packed_pieces(readings, zone.water_week(), zone.last_water, start, zone.index)
+            else:
+                pieces = history_pieces(readings, zone.water_week(), zone.last_water, start, zone.index)
+        # The body is encoded straight into the send buffer, peak memory does not grow with the history
+        await self.send_stream(writer, content_type, pieces, keep_alive)
+        print("response sent")
+
+    async def handle_export_request(self, writer, zone, start_epoch=None, end_epoch=None, source=None,
+                                    keep_alive=False):
+        print("CSV export requested")
+        start = int(start_epoch) if start_epoch is not None and start_epoch.isdigit() else 0
+        end = int(end_epoch) if end_epoch is not None and end_epoch.isdigit() else 0xFFFFFFFF
+        if source == "log":
+            # ?source=log: every reading still on flash, up to twice the history
+            zone.log.flush()
+            rows = zone.log.records()
+        else:
+            readings = zone.readings
+            rows = readings.rows(readings.bisect(start), readings.bisect(end + 1))
+        # One line at a time through the send buffer, a whole history costs no more memory than a line
+        await self.send_stream(writer, "text/csv", csv_pieces(rows, zone.index, start, end), keep_alive,
+                               f'Content-Disposition: attachment; filename="zone{zone.index}.csv"\r\n')
+        print("CSV sent")
+
+    async def handle_static_request(self, writer, path, if_none_match=None, keep_alive=False):
+        asset = ASSETS.get(path)
+        if asset is None:
+            await self.response.send_head(writer, "404 Not Found", keep_alive, "Content-Length: 0\r\n")
+            return
+        name, content_type, size, etag = asset
+        if if_none_match is not None and etag in if_none_match:
+            # The browser already has this version, a reload costs one header
+            await self.response.send_head(writer, "304 Not Modified", keep_alive, f"ETag: {etag}\r\n")
+            return
+        await self.response.send_head(writer, "200 OK", keep_alive,
+                                      f"Content-Type: {content_type}\r\nContent-Encoding: gzip\r\n"
+                                      f"Content-Length: {size}\r\nCache-Control: public, max-age={STATIC_MAX_AGE}, immutable\r\n"
+                                      f"ETag: {etag}\r\n")
+        # Pre-compressed on the host, streamed from flash through the send buffer
+        await self.response.send_file(writer, STATIC_DIR + "/" + name)
+
+    async def handle_events_request(self, writer):
+        subscriber = self.events.subscribe()
+        if subscriber is None:
+            await self.response.send_head(writer, "503 Service Unavailable", False, "Retry-After: 60\r\nContent-Length: 0\r\n")
+            return
+        try:
+            await self.response.send_head(writer, "200 OK", False, "Content-Type: text/event-stream\r\nCache-Control: no-cache\r\n")
+            await self.response.send(writer, SSE_HELLO)
+            while not subscriber.dropped:
+                try:
+                    await asyncio.wait_for(subscriber.ready.wait(), SSE_PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    # A comment keeps an idle stream open through proxies and finds clients that went away
+                    await self.response.send(writer, b": ping\n\n")
+                    continue
+                # The queued events go out together in as few writes as the buffer allows
+                await self.response.send_pieces(writer, subscriber.pop())
+        finally:
+            self.events.unsubscribe(subscriber)
+
+    async def handle_metrics_request(self, writer, keep_alive=False):
+        self.metrics.readings = sum(len(zone.readings) for zone in self.zones)
+        self.metrics.subscribers = len(self.events.subscribers)
+        self.metrics.events_published = self.events.published
+        self.metrics.events_dropped = self.events.dropped
+        await self.send_stream(writer, "text/plain; version=0.0.4", self.metrics.pieces(), keep_alive)
 
 if __name__ == "__main__":
     print("Test WebServer")
@@ -494,20 +386,22 @@ if __name__ == "__main__":
 
     web_server = WebServer()
     for i in range(20):
-        web_server.add_reading(Data(i, i*2, i*4))
+        for zone in web_server.zones:
+            web_server.add_reading(zone, Data(i, i*2, i*4))
         
     print("Web server created and waiting for connections...")
 
-    while True:
-        try:
-            client, addr = web_server.server.accept()
-            print("Client connected from:", addr)
-            web_server.handle_request(client)
-            web_server.add_reading(Data(web_server.needed_soil_moisture, web_server.reading_interval, web_server.time_water))
-        except OSError:
-            sleep(1)
-        except Exception as e:
-            print("Server error:", e)
-            web_server.__del__()
-            raise
-        
+    async def fake_sensors():
+        while True:
+            await asyncio.sleep(1)
+            zone = web_server.zones[0]
+            web_server.add_reading(zone, Data(zone.needed_soil_moisture, web_server.reading_interval, zone.time_water))
+
+    async def test():
+        from networkManager import NetworkManager
+        await NetworkManager().connect()
+        server = await web_server.start()
+        asyncio.create_task(fake_sensors())
+        await server.wait_closed()
+
+    asyncio.run(test())
@@ -0,0 +1,161 @@
+import uasyncio as asyncio
+from constant import *
+from relayManager import RelayManager
+from historyBuffer import HistoryBuffer, format_timestamp, to_fixed
+from flashLog import FlashLog, RECORD_SIZE
+from rollup import Rollup, SERIES, BUCKET_SIZE
+
+
+def zone_bytes(max_reading):
+    """Heap taken by one zone: history columns, hourly and daily rollup buckets, log batch and soil samples"""
+    history = max_reading * (4 + 2 * len(SERIES) + 2)
+    return history + BUCKET_SIZE * (ROLLUP_HOURS + ROLLUP_DAYS) + RECORD_SIZE * LOG_BATCH + SOIL_SAMPLES * 2
+
+
+# One pot: its soil sensor channel, relay, thresholds and history. Everything a zone owns is
+# allocated here with a fixed size, so the heap grows by zone_bytes() per zone and nothing else.
+# Zone 0 keeps the log and rollup file of the single pot firmware, the others get a directory each.
+class Zone:
+    def __init__(self, index, name, soil_pin, mux_channel, relay_pin, max_reading=MAX_READINGS, log_dir=LOG_DIR):
+        self.index = index
+        self.name = name
+        self.soil_pin = soil_pin
+        self.mux_channel = mux_channel
+        self.relay = RelayManager(relay_pin)
+        self.__needed_soil_moisture = NEEDED_SOIL_MOISTURE
+        self.__time_water = TIME_WATER
+        self.last_water = ""
+        self.busy = False  # watering or waiting for a pump, its next reading comes from that
+        self.readings = HistoryBuffer(max_reading)
+        self.rollup = Rollup()
+        directory = log_dir if index == 0 else log_dir + "/zone{}".format(index)
+        self.rollup_file = ROLLUP_FILE if directory == LOG_DIR else directory + "/rollup.bin"
+        self.log = FlashLog(directory)
+        self.unstamped = 0  # newest readings taken before the clock was set, kept out of the rollup
+        self.clock_shift = None  # seconds NTP moved the clock by, once it did
+
+    def restore(self):
+        """Load the history and rollup from flash, after the log config"""
+        print("Restored", self.log.restore(self.readings), "readings of", self.name)
+        # The rollup file is saved daily, fold in the restored readings it has not seen yet
+        self.rollup.load(self.rollup_file)
+        readings = self.readings
+        for i in range(len(readings)):
+            if readings.epoch(i) > self.rollup.last_epoch:
+                self.rollup.add(readings.epoch(i), (to_fixed(readings.soil_moisture(i)), to_fixed(readings.air_humidity(i)),
+                                                    to_fixed(readings.air_temperature(i))), readings.water(i))
+        self.find_last_water(0)
+
+    def find_last_water(self, first):
+        readings = self.readings
+        for i in range(len(readings) - 1, first - 1, -1):
+            if readings.water(i):
+                self.last_water = format_timestamp(readings.epoch(i))
+                break
+
+    def add_reading(self, reading):
+        stamped = True
+        if reading.epoch < VALID_EPOCH:
+            if self.clock_shift is None:
+                stamped = False
+                self.unstamped += 1
+            else:
+                # Taken before the clock was set and recorded after, a watering took that long
+                reading.epoch += self.clock_shift
+                if reading.water:
+                    self.last_water = format_timestamp(reading.epoch)
+        self.readings.append(reading)
+        self.log.append(reading)
+        if stamped and self.rollup.add_reading(reading):
+            self.rollup.save(self.rollup_file)
+
+    def restamp(self, delta):
+        """Once NTP set the clock, move the readings taken before by the delta seconds it jumped
+        and fold them into the rollup"""
+        self.clock_shift = delta
+        readings = self.readings
+        first = max(0, len(readings) - self.unstamped)
+        self.unstamped = 0
+        readings.restamp(first, delta)
+        self.log.restamp(delta)
+        new_day = False
+        for i in range(first, len(readings)):
+            if self.rollup.add(readings.epoch(i), (readings.fixed(0, i), readings.fixed(1, i), readings.fixed(2, i)),
+                               readings.water(i)):
+                new_day = True
+        if new_day:
+            self.rollup.save(self.rollup_file)
+        self.find_last_water(first)
+
+    def flush_log(self):
+        self.log.flush()
+        self.rollup.save(self.rollup_file)
+
+    def water_week(self):
+        return self.readings.water_week()
+
+    @property
+    def needed_soil_moisture(self):
+        return self.__needed_soil_moisture
+    @needed_soil_moisture.setter
+    def needed_soil_moisture(self, value):
+        if isinstance(value, (int, float)) and MIN_NEEDED_SOIL_MOISTURE <= value <= MAX_NEEDED_SOIL_MOISTURE:
+            self.__needed_soil_moisture = value
+
+    @property
+    def time_water(self):
+        return self.__time_water
+    @time_water.setter
+    def time_water(self, value):
+        if isinstance(value, (int, float)) and MIN_TIME_WATER <= value <= MAX_TIME_WATER:
+            self.__time_water = value
+
+
+# Counting semaphore over the pumps, uasyncio has none. A zone waits here until fewer than
+# MAX_PUMPS pumps run, so the power supply never feeds more at once.
+class PumpPool:
+    def __init__(self, size=MAX_PUMPS):
+        self.size = size
+        self.running = 0
+        self.__released = asyncio.Event()
+
+    async def acquire(self):
+        while self.running >= self.size:
+            self.__released.clear()
+            await self.__released.wait()
+        self.running += 1
+
+    def release(self):
+        self.running -= 1
+        self.__released.set()
+
+
+if __name__ == "__main__":
+    print("Test PumpPool")
+    from time import ticks_ms, ticks_diff
+
+    async def test():
+        pool = PumpPool(2)
+        peak = [0]
+        order = []
+
+        async def pump(name, ms):
+            await pool.acquire()
+            try:
+                peak[0] = max(peak[0], pool.running)
+                order.append(name)
+                await asyncio.sleep_ms(ms)
+            finally:
+                pool.release()
+
+        start = ticks_ms()
+        await asyncio.gather(*[pump(i, 50) for i in range(5)])
+        elapsed = ticks_diff(ticks_ms(), start)
+        assert peak[0] == 2 and pool.running == 0 and sorted(order) == list(range(5)), (peak, order)
+        # Five 50 ms waterings two at a time take three rounds
+        assert 150 <= elapsed < 250, elapsed
+
+    asyncio.run(test())
+    for zones in (1, 4, 8):
+        print(zones, "zones:", zones * zone_bytes(MAX_READINGS), "bytes with", MAX_READINGS, "readings each")
+    print("PumpPool OK")
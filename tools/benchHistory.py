@@ -0,0 +1,75 @@
+# Memory benchmark: deque of Data objects (old history) against the columnar HistoryBuffer
+#   python tools/benchHistory.py 500
+import sys
+sys.path.insert(0, "src")
+sys.path.insert(0, "../src")
+import gc
+from collections import deque
+from time import localtime, time
+from constant import DAY
+from historyBuffer import HistoryBuffer
+
+try:
+    mem_alloc = gc.mem_alloc  # MicroPython
+except AttributeError:
+    import tracemalloc
+    tracemalloc.start()
+
+    def mem_alloc():
+        return tracemalloc.get_traced_memory()[0]
+
+
+# Copy of the Data class used by the deque based history
+class LegacyData:
+    def __init__(self, soil_moisture=0, air_humidity=0, air_temperature=0, water=False):
+        self.timestamp = f"{DAY[localtime()[6]]}/{localtime()[3]:02d}:{localtime()[4]:02d}:{localtime()[5]:02d}"
+        self.soil_moisture = soil_moisture
+        self.air_humidity = air_humidity
+        self.air_temperature = air_temperature
+        self.water = water
+
+
+class Reading:
+    def __init__(self, epoch, soil_moisture, air_humidity, air_temperature, water):
+        self.epoch = epoch
+        self.soil_moisture = soil_moisture
+        self.air_humidity = air_humidity
+        self.air_temperature = air_temperature
+        self.water = water
+
+
+def measure(build):
+    gc.collect()
+    before = mem_alloc()
+    store = build()
+    gc.collect()
+    used = mem_alloc() - before
+    return store, used
+
+
+def bench(size):
+    now = time()
+
+    def build_deque():
+        readings = deque([], size)
+        for i in range(size):
+            readings.append(LegacyData(40 + i % 50 / 3, 55.0 + i % 7, 21.5 + i % 5, i % 11 == 0))
+        return readings
+
+    def build_buffer():
+        readings = HistoryBuffer(size)
+        for i in range(size):
+            readings.append(Reading(now + i, 40 + i % 50 / 3, 55.0 + i % 7, 21.5 + i % 5, i % 11 == 0))
+        return readings
+
+    legacy, legacy_bytes = measure(build_deque)
+    del legacy
+    buffer, buffer_bytes = measure(build_buffer)
+    del buffer
+    print("readings: {} deque: {} B ({} B/reading) buffer: {} B ({} B/reading) ratio: {:.1f}x".format(
+        size, legacy_bytes, legacy_bytes // size, buffer_bytes, buffer_bytes // size, legacy_bytes / buffer_bytes))
+
+
+if __name__ == "__main__":
+    for size in [int(arg) for arg in sys.argv[1:]] or [100, 336, 500]:
+        bench(size)
@@ -0,0 +1,273 @@
+# Benchmark suite of the web server against the history size: wall time, bytes allocated, largest free
+# block after the request and response size of handle_html_response, handle_ajax_request (JSON, packed
+# and thinned to POINTS), water_week and add_reading. CPython runs on the sim stand-ins, the MicroPython
+# unix port on the stubs below.
+#   python tools/benchSuite.py bench.json                 sweep 1..500, results as JSON
+#   python tools/benchSuite.py bench.json 1,100,336       chosen history sizes
+#   python tools/benchSuite.py compare before.json after.json
+import sys
+import gc
+import json
+import os
+
+SIZES = (1, 10, 50, 100, 200, 336, 500)
+REPEAT = 5
+POINTS = 200  # chart width asked by ajax_points
+LOG_DIR = "/tmp/spw-bench"
+MICROPYTHON = sys.implementation.name == "micropython"
+
+# Just enough of the hardware for WebServer and Data on the unix port
+STUBS = {
+    "machine": """class Pin:
+    IN = 0
+    OUT = 1
+    def __init__(self, *args, **kwargs):
+        pass
+    def value(self, value=None):
+        return 0
+    def on(self):
+        pass
+    def off(self):
+        pass
+class ADC(Pin):
+    def read_u16(self):
+        return 0
+class I2C(Pin):
+    pass
+def reset():
+    raise SystemExit("reset")
+""",
+    "dht": """class DHT11:
+    def __init__(self, pin):
+        pass
+""",
+}
+
+if MICROPYTHON:
+    from time import ticks_us, ticks_diff
+    ALLOC = "gc.mem_alloc delta"
+
+    def start_alloc():
+        gc.collect()
+        gc.disable()
+        return gc.mem_alloc()
+
+    def stop_alloc(start):
+        used = gc.mem_alloc() - start
+        gc.enable()
+        return used
+
+    def largest_free():
+        # The heap cannot be walked from Python: bisect the biggest bytearray that still fits
+        gc.collect()
+        low, high = 0, gc.mem_free()
+        while low < high:
+            size = (low + high + 1) // 2
+            try:
+                block = bytearray(size)
+                del block
+                low = size
+            except MemoryError:
+                high = size - 1
+        gc.collect()
+        return low
+else:
+    import tracemalloc
+    from time import perf_counter
+    ALLOC = "tracemalloc peak"
+
+    def ticks_us():
+        return int(perf_counter() * 1000000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+    def start_alloc():
+        gc.collect()
+        tracemalloc.start()
+        return 0
+
+    def stop_alloc(start):
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    def largest_free():
+        # CPython takes its memory from the OS, there is no fixed heap to fragment
+        return None
+
+
+def clear_directory(directory):
+    try:
+        os.mkdir(directory)
+    except OSError:
+        pass
+    for name in os.listdir(directory):
+        if name.endswith(".bin") or name.endswith(".hdr") or name.endswith(".tmp"):
+            os.remove(directory + "/" + name)
+
+
+def setup():
+    """Put the firmware and the hardware stand-ins on the path and point the flash log at LOG_DIR"""
+    sys.path.insert(0, "src")
+    sys.path.insert(0, "../src")
+    if MICROPYTHON:
+        stubs = LOG_DIR + "-stubs"
+        clear_directory(stubs)
+        for name in STUBS:
+            with open(stubs + "/" + name + ".py", "w") as f:
+                f.write(STUBS[name])
+        sys.path.insert(0, stubs)
+        import constant
+        constant.LOG_DIR = LOG_DIR
+        constant.ROLLUP_FILE = LOG_DIR + "/rollup.bin"
+        clear_directory(LOG_DIR)
+        import uasyncio as asyncio
+        return asyncio.run
+    sys.path.insert(0, ".")
+    sys.path.insert(0, "..")
+    import sim
+    clear_directory(LOG_DIR)
+    sim.install(log_dir=LOG_DIR)
+    loop = sim.new_loop()
+    return loop.run_until_complete
+
+
+class Sink:
+    """Stream writer that only counts the bytes"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+    async def drain(self):
+        pass
+
+
+def fill(web_server, size, epoch, interval):
+    from sensorManager import Data
+    web_server.max_reading = size
+    readings = web_server.zones[0].readings
+    readings.clear()
+    for i in range(size):
+        readings.append(Data(40 + i % 30, 50 + i % 20, 20 + i % 10, i % 24 == 0, epoch))
+        epoch += interval
+    return epoch
+
+
+def measure(run, operation):
+    """Median wall time over REPEAT runs, allocations of one more run, then the largest free block"""
+    times = []
+    for _ in range(REPEAT):
+        start = ticks_us()
+        run(operation())
+        times.append(ticks_diff(ticks_us(), start))
+    times.sort()
+    # Separate run, tracemalloc slows CPython down
+    alloc = start_alloc()
+    size = run(operation())
+    alloc = stop_alloc(alloc)
+    return times[len(times) // 2], alloc, largest_free(), size
+
+
+def bench(sizes):
+    run = setup()
+    import webServer
+    import flashLog
+    import rollup
+    import zone as zoneModule
+    from sensorManager import Data
+    # Console output is not what is measured
+    webServer.print = flashLog.print = rollup.print = zoneModule.print = lambda *args: None
+    web_server = webServer.WebServer()
+    zone = web_server.zones[0]
+    interval = web_server.reading_interval
+    clock = [1760000000]
+
+    async def html():
+        writer = Sink()
+        await web_server.handle_html_response(writer, zone)
+        return writer.size
+
+    async def ajax():
+        writer = Sink()
+        await web_server.handle_ajax_request(writer, zone)
+        return writer.size
+
+    async def ajax_bin():
+        writer = Sink()
+        await web_server.handle_ajax_request(writer, zone, packed=True)
+        return writer.size
+
+    async def ajax_points():
+        writer = Sink()
+        await web_server.handle_ajax_request(writer, zone, points=str(POINTS))
+        return writer.size
+
+    async def ajax_since():
+        writer = Sink()
+        await web_server.handle_ajax_request(writer, zone, str(zone.readings.last_seq - 1))
+        return writer.size
+
+    async def water_week():
+        zone.water_week()
+        return 0
+
+    async def add_reading():
+        clock[0] += interval
+        web_server.add_reading(zone, Data(45, 55, 21, False, clock[0]))
+        return 0
+
+    operations = (("html", html), ("ajax", ajax), ("ajax_bin", ajax_bin), ("ajax_points", ajax_points),
+                  ("ajax_since", ajax_since), ("water_week", water_week), ("add_reading", add_reading))
+    results = []
+    for size in sizes:
+        clock[0] = fill(web_server, size, clock[0], interval)
+        for name, operation in operations:
+            time_us, alloc, free, response = measure(run, operation)
+            results.append({"op": name, "size": size, "time_us": time_us, "alloc": alloc,
+                            "largest_free": free, "response": response})
+            print("{:>12} {:>4} readings {:>8} us {:>8} B allocated {:>8} B largest free {:>7} B sent".format(
+                name, size, time_us, alloc, "-" if free is None else free, response))
+    web_server.flush_log()
+    return {
+        "implementation": sys.implementation.name,
+        "version": ".".join(str(v) for v in sys.implementation.version[:3]),
+        "platform": sys.platform,
+        "repeat": REPEAT,
+        "alloc": ALLOC,
+        "results": results,
+    }
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    old = {}
+    for row in before["results"]:
+        old[(row["op"], row["size"])] = row
+    print("{:>12} {:>5} {:>17} {:>17} {:>15}".format("op", "size", "time us", "alloc B", "sent B"))
+    for row in after["results"]:
+        previous = old.get((row["op"], row["size"]))
+        if previous is None:
+            continue
+        columns = []
+        for key in ("time_us", "alloc", "response"):
+            columns.append("{}->{}".format(previous[key], row[key]))
+        print("{:>12} {:>5} {:>17} {:>17} {:>15}".format(row["op"], row["size"], *columns))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 and sys.argv[1] == "compare":
+        compare(sys.argv[2], sys.argv[3])
+    else:
+        output = sys.argv[1] if len(sys.argv) > 1 else "bench.json"
+        sizes = [int(size) for size in sys.argv[2].split(",")] if len(sys.argv) > 2 else SIZES
+        report = bench(sizes)
+        with open(output, "w") as f:
+            json.dump(report, f)
+        print("Results written to", output)
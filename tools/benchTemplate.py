@@ -0,0 +1,104 @@
+# Benchmark of the HTML page: one big formatted string (before) against the precompiled template (after)
+#   python tools/benchTemplate.py 200
+import sys
+sys.path.insert(0, "src")
+sys.path.insert(0, "../src")
+import gc
+from constant import CHUNK_SIZE
+from jsonStream import stream_chunks
+from webPage import PAGE
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1000000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+try:
+    mem_alloc = gc.mem_alloc  # MicroPython, allocations between two collections
+
+    def start_alloc():
+        gc.collect()
+        gc.disable()
+        return mem_alloc()
+
+    def stop_alloc(start):
+        used = mem_alloc() - start
+        gc.enable()
+        return used
+except AttributeError:
+    import tracemalloc
+
+    def start_alloc():
+        gc.collect()
+        tracemalloc.start()
+        return 0
+
+    def stop_alloc(start):
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+VALUES = {
+    "history_duration": "07:00:00:00",
+    "needed_soil_moisture": 50,
+    "reading_interval": 1800,
+    "time_water": 5,
+    "max_reading": 336,
+    "start_ban_time": "23:30",
+    "finish_ban_time": "09:00",
+    "last_water": "Mon/10:00:00",
+}
+for day in range(7):
+    VALUES["water_week_{}".format(day)] = day
+
+
+def sink(chunk):
+    return len(chunk)
+
+
+def before():
+    # Same work as the old f-string: build the whole page, then slice and encode each chunk
+    first = None
+    response = "".join(p if isinstance(p, str) else p.decode("utf-8") for p in PAGE.render(VALUES))
+    for i in range(0, len(response), CHUNK_SIZE):
+        sink(response[i:i + CHUNK_SIZE].encode("utf-8"))
+        if first is None:
+            first = ticks_us()
+    return first
+
+
+def after(buffer=bytearray(CHUNK_SIZE)):
+    first = None
+    for chunk in stream_chunks(PAGE.render(VALUES), buffer):
+        sink(chunk)
+        if first is None:
+            first = ticks_us()
+    return first
+
+
+def bench(name, render, iterations):
+    render()
+    total = first = 0
+    for _ in range(iterations):
+        start = ticks_us()
+        first_chunk = render()
+        total += ticks_diff(ticks_us(), start)
+        first += ticks_diff(first_chunk, start)
+    start = start_alloc()
+    render()
+    allocated = stop_alloc(start)
+    print("{:7} total: {:7.1f} us  first chunk: {:7.1f} us  allocated: {:6} B".format(
+        name, total / iterations, first / iterations, allocated))
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print("page: {} static bytes, {} slots".format(PAGE.size(), len(PAGE.slots)))
+    bench("before", before, iterations)
+    bench("after", after, iterations)
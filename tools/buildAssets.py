@@ -0,0 +1,71 @@
+# Build the static assets served from flash: minify web/*.css and web/*.js, gzip them into src/static
+# and write src/assets.py with their content type, size and ETag. Run it after editing anything in web/.
+#   python tools/buildAssets.py            assets found in web/
+#   python tools/buildAssets.py --fetch    also download Chart.js into web/ first
+# Without web/chart.min.js the page keeps loading Chart.js from the CDN.
+import gzip
+import hashlib
+import os
+import re
+import sys
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join(ROOT, "web")
+TARGET = os.path.join(ROOT, "src", "static")
+MANIFEST = os.path.join(ROOT, "src", "assets.py")
+CHART_URL = "https://cdn.jsdelivr.net/npm/chart.js@3.7.1/dist/chart.min.js"
+TYPES = {".css": "text/css", ".js": "application/javascript"}
+
+
+def minify_css(text):
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    return re.sub(r"\s*([{};:,>])\s*", r"\1", text).replace(";}", "}").strip()
+
+
+def minify_js(text):
+    # Conservative: whole-line comments, indentation and blank lines only, no renaming
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("//"):
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def build(name):
+    with open(os.path.join(SOURCE, name), encoding="utf-8") as f:
+        text = f.read()
+    extension = os.path.splitext(name)[1]
+    if not name.endswith(".min.js"):
+        text = minify_css(text) if extension == ".css" else minify_js(text)
+    data = text.encode("utf-8")
+    # mtime=0 keeps the archive, and so the ETag, the same for the same input
+    packed = gzip.compress(data, 9, mtime=0)
+    with open(os.path.join(TARGET, name + ".gz"), "wb") as f:
+        f.write(packed)
+    etag = '"{}"'.format(hashlib.sha1(packed).hexdigest()[:16])
+    print("{:16} {:7} B -> {:7} B gzip  {}".format(name, len(data), len(packed), etag))
+    return "/static/" + name, name + ".gz", TYPES[extension], len(packed), etag
+
+
+def main(fetch):
+    if fetch:
+        urllib.request.urlretrieve(CHART_URL, os.path.join(SOURCE, "chart.min.js"))
+    os.makedirs(TARGET, exist_ok=True)
+    for name in os.listdir(TARGET):
+        if name.endswith(".gz"):
+            os.remove(os.path.join(TARGET, name))
+    assets = [build(name) for name in sorted(os.listdir(SOURCE)) if os.path.splitext(name)[1] in TYPES]
+    with open(MANIFEST, "w", newline="\n") as f:
+        f.write("# Generated by tools/buildAssets.py from web/, do not edit\n")
+        f.write("# URL path: (file in STATIC_DIR, content type, gzip size, ETag)\n")
+        f.write("ASSETS = {\n")
+        for path, file, content_type, size, etag in assets:
+            f.write("    {!r}: ({!r}, {!r}, {}, {!r}),\n".format(path, file, content_type, size, etag))
+        f.write("}\n")
+
+
+if __name__ == "__main__":
+    main("--fetch" in sys.argv[1:])
@@ -0,0 +1,107 @@
+# Load test for the web server: many dashboards polling at the same time
+# Runs on CPython or the MicroPython unix port against a device or a local server
+#   python tools/loadTest.py 192.168.1.50 80 25 30 /get_data [keepalive]
+import sys
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+try:
+    from time import ticks_ms, ticks_add, ticks_diff
+except ImportError:
+    from time import perf_counter
+
+    def ticks_ms():
+        return int(perf_counter() * 1000)
+
+    def ticks_add(ticks, delta):
+        return ticks + delta
+
+    def ticks_diff(a, b):
+        return a - b
+
+
+async def read_response(reader):
+    """Read one response, True when the server keeps the connection open"""
+    headers = {}
+    status = await reader.readline()
+    if not status:
+        raise OSError("connection closed")
+    while True:
+        line = (await reader.readline()).decode().strip()
+        if not line:
+            break
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip().lower()
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int((await reader.readline()).decode().strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    else:
+        while await reader.read(1024):
+            pass
+        return False
+    return headers.get("connection") != "close"
+
+
+async def poller(host, port, path, deadline, keep_alive, latencies, errors, connections):
+    request = "GET {} HTTP/1.1\r\nHost: {}\r\nConnection: {}\r\n\r\n".format(
+        path, host, "keep-alive" if keep_alive else "close").encode()
+    writer = None
+    while ticks_diff(deadline, ticks_ms()) > 0:
+        start = ticks_ms()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+                connections[0] += 1
+            writer.write(request)
+            await writer.drain()
+            if not await read_response(reader):
+                writer.close()
+                await writer.wait_closed()
+                writer = None
+            latencies.append(ticks_diff(ticks_ms(), start))
+        except (OSError, EOFError):
+            errors[0] += 1
+            writer = None
+            await asyncio.sleep(0.1)
+    if writer is not None:
+        writer.close()
+        await writer.wait_closed()
+
+
+def percentile(values, p):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, len(values) * p // 100)]
+
+
+async def run(host, port, clients, seconds, path, keep_alive=False):
+    latencies = []
+    errors = [0]
+    connections = [0]
+    # ticks_ms wraps on MicroPython, the deadline only works through ticks_add and ticks_diff
+    deadline = ticks_add(ticks_ms(), seconds * 1000)
+    await asyncio.gather(*[poller(host, port, path, deadline, keep_alive, latencies, errors, connections)
+                           for _ in range(clients)])
+    latencies.sort()
+    print("clients: {} requests: {} errors: {} connections opened: {}".format(
+        clients, len(latencies), errors[0], connections[0]))
+    print("p50: {} ms p99: {} ms max: {} ms".format(percentile(latencies, 50), percentile(latencies, 99),
+                                                   latencies[-1] if latencies else 0))
+    return latencies
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    host = args[0] if len(args) > 0 else "127.0.0.1"
+    port = int(args[1]) if len(args) > 1 else 80
+    clients = int(args[2]) if len(args) > 2 else 20
+    seconds = int(args[3]) if len(args) > 3 else 10
+    path = args[4] if len(args) > 4 else "/get_data"
+    keep_alive = len(args) > 5 and args[5] == "keepalive"
+    asyncio.run(run(host, port, clients, seconds, path, keep_alive))
@@ -0,0 +1,198 @@
+var ctx = document.getElementById('myChart').getContext('2d');
+var myChart = new Chart(ctx, {
+    type: 'line',
+    data: {
+        labels: [],
+        datasets: [
+            {
+                label: 'Dirt Humidity (%)',
+                data: [],
+                borderColor: 'rgba(75, 192, 192, 1)',
+                borderWidth: 1
+            },
+            {
+                label: 'Air Humidity (%)',
+                data: [],
+                borderColor: 'rgba(153, 102, 255, 1)',
+                borderWidth: 1
+            },
+            {
+                label: 'Air Temperature (°C)',
+                data: [],
+                borderColor: 'rgba(255, 159, 64, 1)',
+                borderWidth: 1
+            }
+        ]
+    },
+    options: {
+        scales: {
+            y: {
+                beginAtZero: true
+            }
+        }
+    }
+});
+
+// Sequence number of the newest reading in the chart, -1 asks for the whole history
+var lastSeq = -1;
+// The page shows one zone, readings of the others are ignored
+var zone = Number(document.body.dataset.zone);
+document.getElementById('zone').value = zone;
+var resolution = document.getElementById('resolution');
+var statusLine = document.getElementById('status');
+
+// Decoder of /get_data?format=bin, the layout is described in src/binStream.py
+var DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'];
+var HEADER_SIZE = 34;
+
+function two(n) {
+    return (n < 10 ? '0' : '') + n;
+}
+
+// Same labels as the JSON: weekday and time of the device clock, which runs on UTC
+function label(epoch) {
+    var d = new Date(epoch * 1000);
+    return DAYS[(d.getUTCDay() + 6) % 7] + '/' + two(d.getUTCHours()) + ':' + two(d.getUTCMinutes()) + ':' + two(d.getUTCSeconds());
+}
+
+function decode(buffer) {
+    var view = new DataView(buffer);
+    if (view.getUint8(4) != 1) {
+        throw new Error('unknown history format ' + view.getUint8(4));
+    }
+    var n = view.getUint16(16, true);
+    var scale = view.getUint16(18, true);
+    var data = {
+        timestamps: [], soil_moisture: [], air_humidity: [], air_temperature: [], water: [], water_week: [],
+        full: (view.getUint8(5) & 1) == 1, zone: view.getUint8(6),
+        seq: view.getUint32(8, true), count: view.getUint32(12, true)
+    };
+    for (var d = 0; d < 7; d++) {
+        data.water_week.push(view.getUint16(20 + 2 * d, true));
+    }
+    var offset = HEADER_SIZE + view.getUint8(7);
+    data.last_water = String.fromCharCode.apply(null, new Uint8Array(buffer, HEADER_SIZE, view.getUint8(7)));
+    var epoch = 0;
+    for (var i = 0; i < n; i++, offset += 4) {
+        epoch = (epoch + view.getUint32(offset, true)) % 4294967296;
+        data.timestamps.push(label(epoch));
+    }
+    ['soil_moisture', 'air_humidity', 'air_temperature'].forEach(function(key) {
+        for (var i = 0; i < n; i++, offset += 2) {
+            data[key].push(view.getInt16(offset, true) / scale);
+        }
+    });
+    for (var i = 0; i < n; i++) {
+        data.water.push((view.getUint8(offset + (i >> 3)) >> (i & 7) & 1) == 1);
+    }
+    return data;
+}
+
+function apply(data) {
+    var chart = myChart.data;
+    var series = [chart.labels, chart.datasets[0].data, chart.datasets[1].data, chart.datasets[2].data];
+    var fresh = [data.timestamps, data.soil_moisture, data.air_humidity, data.air_temperature];
+    for (var s = 0; s < series.length; s++) {
+        if (data.full) {
+            series[s].length = 0;
+        }
+        Array.prototype.push.apply(series[s], fresh[s]);
+        // Drop the readings the device has already evicted
+        if (series[s].length > data.count) {
+            series[s].splice(0, series[s].length - data.count);
+        }
+    }
+    if (data.full || data.timestamps.length > 0) {
+        myChart.update();
+    }
+    lastSeq = data.seq === undefined ? -1 : data.seq;
+
+    var waterWeekHtml = '';
+    for (var i = 0; i < 7; i++) {
+        waterWeekHtml += '<td>' + data.water_week[i] + '</td>';
+    }
+    waterWeekHtml += '<td>' + data.last_water + '</td>';
+
+    document.querySelector('#waterTable tbody').innerHTML = '<tr>' + waterWeekHtml + '</tr>';
+}
+
+// One request at a time: two sent with the same since would both be appended
+var fetching = false;
+var again = false;
+
+function fetched() {
+    fetching = false;
+    if (again) {
+        again = false;
+        refresh();
+    }
+}
+
+// The hourly and daily views are whole pre-aggregated arrays, the raw view only asks for what it lacks, packed
+function refresh() {
+    if (fetching) {
+        again = true;
+        return;
+    }
+    fetching = true;
+    var raw = resolution.value == 'raw';
+    // A whole history comes thinned to about one reading per pixel of the chart, waterings kept
+    var url = '/get_data?zone=' + zone + '&format=bin' + (lastSeq < 0 ? '&points=' + ctx.canvas.clientWidth : '&since=' + lastSeq);
+    if (!raw) {
+        url = '/get_data?zone=' + zone + '&resolution=' + resolution.value;
+    }
+    fetch(url).then(function(response) {
+        return raw ? response.arrayBuffer().then(decode) : response.json();
+    }).then(function(data) {
+        // A reading pushed meanwhile may already be in the chart: only a delta continuing it is appended
+        if (data.full || data.seq - data.timestamps.length == lastSeq) {
+            apply(data);
+        } else {
+            again = true;
+        }
+    }).then(fetched, fetched);
+}
+
+// Fallback when the device refuses the event stream: poll, the aggregated views every minute
+var polls = 0;
+function startPolling() {
+    setInterval(function() {
+        if (resolution.value == 'raw' || polls++ % 20 == 0) {
+            refresh();
+        }
+    }, 3000);
+}
+
+// The device pushes every new reading, the page makes no request while nothing changes
+if (window.EventSource) {
+    var source = new EventSource('/events');
+    // Also after a reconnect: fetch whatever was missed meanwhile
+    source.onopen = refresh;
+    source.addEventListener('reading', function(event) {
+        var data = JSON.parse(event.data);
+        if (data.zone != zone) {
+            return;
+        }
+        statusLine.textContent = '';
+        if (resolution.value == 'raw' && (data.full || data.seq == lastSeq + 1)) {
+            apply(data);
+        } else {
+            refresh();
+        }
+    });
+    source.addEventListener('water', function(event) {
+        var data = JSON.parse(event.data);
+        if (data.zone == zone) {
+            statusLine.textContent = 'Watering for ' + data.seconds + ' s';
+        }
+    });
+    source.onerror = function() {
+        if (source.readyState == EventSource.CLOSED) {
+            refresh();
+            startPolling();
+        }
+    };
+} else {
+    refresh();
+    startPolling();
+}